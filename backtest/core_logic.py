@@ -0,0 +1,387 @@
+"""
+回測核心邏輯。
+
+交易規則：
+    * 同一時間最多持有一個部位 (contracts 口)，空手時才會依訊號進場。
+    * 訊號 >= long_threshold 做多；有設定 short_threshold 時，訊號 <= short_threshold 做空。
+    * 第 i 筆 Tick 出現訊號，於第 i + entry_delay 筆成交 (必須在同一交易時段內，否則放棄該訊號)。
+    * 出場條件 (先發生者)：停利、停損 (以進場 Tick 價格 ± 點數為觸發價，於觸發的那筆 Tick 成交)、
+      最長持有時間、交易時段最後一筆、資料結束。
+    * 成交價含不利方向 slippage_ticks 個跳動點的滑價；
+      成本 = 每口每邊手續費 + 期交稅 (成交金額 × tax_rate，進出各一次)。
+
+模擬以「交易」為迴圈單位：每筆交易的出場位置以 NumPy 在分段 (長度指數成長) 的價格區間上
+向量化搜尋，下一次進場以 searchsorted 直接跳到出場後的第一個訊號，不會逐筆 Tick 執行 Python。
+參數掃描 (run_sweep) 將價格、訊號等陣列放入共享記憶體，由多個程序分批評估參數組合；
+相同進場閾值的組合共用訊號位置的計算。
+"""
+import dataclasses
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import TICK_SIZE
+from utils.performance_metrics import summarize_trades
+from utils.shared_memory import attach_array, share_array
+from utils.trading_session import NS_PER_DAY, index_to_ns
+
+EXIT_TAKE_PROFIT = 1
+EXIT_STOP_LOSS = -1
+EXIT_TIME = 0
+EXIT_SESSION_END = 2
+EXIT_REASONS = {
+    EXIT_TAKE_PROFIT: 'take_profit',
+    EXIT_STOP_LOSS: 'stop_loss',
+    EXIT_TIME: 'time',
+    EXIT_SESSION_END: 'session_end',
+}
+INITIAL_SEARCH = 256
+
+
+@dataclasses.dataclass(frozen=True)
+class BacktestConfig:
+    """
+    回測參數。
+
+    Attributes:
+        long_threshold: 做多的訊號門檻 (訊號 >= 門檻時進場；None 表示不做多)。
+        short_threshold: 做空的訊號門檻 (訊號 <= 門檻時進場；None 表示不做空)。
+        stop_loss: 停損點數 (None 表示不停損)。
+        take_profit: 停利點數 (None 表示不停利)。
+        max_holding: 最長持有時間 (e.g., '5min'；None 表示持有到時段結束)，需要時間戳。
+        entry_delay: 訊號出現後延遲幾筆 Tick 成交 (預設 1，避免以產生訊號的那筆價格成交)。
+        slippage_ticks: 每次成交的滑價跳動點數。
+        tick_size: 最小跳動點。
+        contracts: 每次交易口數。
+        multiplier: 契約乘數 (大台 200、小台 50 元/點)。
+        fee_per_contract: 每口每邊手續費。
+        tax_rate: 期交稅率 (每邊，成交金額的比例)。
+    """
+    long_threshold: Optional[float] = 0.5
+    short_threshold: Optional[float] = None
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+    max_holding: Optional[str] = None
+    entry_delay: int = 1
+    slippage_ticks: float = 1.0
+    tick_size: float = TICK_SIZE
+    contracts: int = 1
+    multiplier: float = 200.0
+    fee_per_contract: float = 0.0
+    tax_rate: float = 2e-5
+
+
+class Trades(NamedTuple):
+    """
+    逐筆交易紀錄 (每個欄位長度相同)。
+
+    Attributes:
+        entry_index / exit_index: 進出場 Tick 的位置。
+        side: 1 為多單、-1 為空單。
+        entry_price / exit_price: 含滑價的成交價。
+        pnl: 扣除手續費與期交稅後的損益 (金額)。
+        reason: 出場原因 (見 EXIT_REASONS)。
+    """
+    entry_index: np.ndarray
+    exit_index: np.ndarray
+    side: np.ndarray
+    entry_price: np.ndarray
+    exit_price: np.ndarray
+    pnl: np.ndarray
+    reason: np.ndarray
+
+    def to_frame(self, timestamp: Optional[np.ndarray] = None) -> pd.DataFrame:
+        df = pd.DataFrame(self._asdict())
+        df['reason'] = df['reason'].map(EXIT_REASONS)
+        if timestamp is not None:
+            df.insert(0, 'entry_time', pd.to_datetime(timestamp[self.entry_index]))
+            df.insert(1, 'exit_time', pd.to_datetime(timestamp[self.exit_index]))
+        return df
+
+
+class BacktestResult(NamedTuple):
+    config: BacktestConfig
+    trades: Trades
+    metrics: dict
+
+    @property
+    def equity(self) -> np.ndarray:
+        """逐筆交易後的累積損益。"""
+        return np.cumsum(self.trades.pnl)
+
+
+class _Market(NamedTuple):
+    """回測所需的共用陣列 (sweep 時價格、訊號與時間戳放在共享記憶體)。"""
+    price: np.ndarray
+    signal: np.ndarray
+    timestamp: Optional[np.ndarray]
+    session_starts: np.ndarray
+    session_day: Optional[np.ndarray]
+    all_days: Optional[np.ndarray]
+
+    def session_last(self, i: int) -> int:
+        """第 i 筆所在交易時段的最後一筆位置。"""
+        k = np.searchsorted(self.session_starts, i, side='right')
+        return int(self.session_starts[k]) - 1 if k < len(self.session_starts) else len(self.price) - 1
+
+    def trade_days(self, exit_index: np.ndarray) -> Optional[np.ndarray]:
+        """出場所屬的交易日 (用於計算日夏普比率)。"""
+        if self.session_day is not None:
+            return self.session_day[np.searchsorted(self.session_starts, exit_index, side='right') - 1]
+        if self.timestamp is not None:
+            return self.timestamp[exit_index] // NS_PER_DAY
+        return None
+
+
+def _prepare(price, signal, timestamp=None, session_id=None) -> _Market:
+    if timestamp is None and isinstance(price, pd.Series) and isinstance(price.index, pd.DatetimeIndex):
+        timestamp = index_to_ns(price.index)
+    price = np.ascontiguousarray(np.asarray(price, dtype=np.float64))
+    signal = np.ascontiguousarray(np.asarray(signal, dtype=np.float64))
+    if len(signal) != len(price):
+        raise ValueError("signal 與 price 的長度必須相同")
+    if timestamp is not None:
+        timestamp = np.ascontiguousarray(np.asarray(timestamp, dtype=np.int64))
+
+    session_day = None
+    all_days = None
+    if session_id is not None and len(price):
+        session_id = np.asarray(session_id, dtype=np.int64)
+        session_starts = np.flatnonzero(np.r_[True, session_id[1:] != session_id[:-1]])
+        # session_id = 交易日 (天數) * 2 + 是否為夜盤
+        session_day = session_id[session_starts] // 2
+        all_days = np.unique(session_day)
+    else:
+        session_starts = np.zeros(1, dtype=np.int64)
+        if timestamp is not None and len(timestamp):
+            all_days = np.unique(timestamp // NS_PER_DAY)
+    return _Market(price, signal, timestamp, session_starts, session_day, all_days)
+
+
+def _candidates(signal: np.ndarray, config: BacktestConfig) -> tuple:
+    """回傳 (出現進場訊號的位置, 對應的方向)。"""
+    long_mask = signal >= config.long_threshold if config.long_threshold is not None else np.zeros(len(signal), bool)
+    if config.short_threshold is not None:
+        short_mask = signal <= config.short_threshold
+        mask = long_mask | short_mask
+    else:
+        mask = long_mask
+    positions = np.flatnonzero(mask)
+    sides = np.where(long_mask[positions], 1, -1).astype(np.int8)
+    return positions, sides
+
+
+def _find_exit(price: np.ndarray, entry: int, last: int, upper: float, lower: float) -> int:
+    """
+    回傳 price[entry+1 : last+1] 中第一筆 >= upper 或 <= lower 的位置；都未觸及時回傳 -1。
+    搜尋區間由 INITIAL_SEARCH 筆開始每次放大 4 倍，成本與實際持有筆數成正比。
+    """
+    pos = entry + 1
+    width = INITIAL_SEARCH
+    while pos <= last:
+        stop = min(pos + width, last + 1)
+        segment = price[pos:stop]
+        hit = (segment >= upper) | (segment <= lower)
+        k = int(hit.argmax())
+        if hit[k]:
+            return pos + k
+        pos = stop
+        width *= 4
+    return -1
+
+
+def _simulate(market: _Market, positions: np.ndarray, sides: np.ndarray, config: BacktestConfig) -> Trades:
+    price = market.price
+    timestamp = market.timestamp
+    n = len(price)
+    take_profit = math.inf if config.take_profit is None else config.take_profit
+    stop_loss = math.inf if config.stop_loss is None else config.stop_loss
+    hold_ns = None
+    if config.max_holding is not None:
+        if timestamp is None:
+            raise ValueError("max_holding 需要提供時間戳")
+        hold_ns = pd.Timedelta(config.max_holding).value
+
+    entries, exits, trade_sides, reasons = [], [], [], []
+    c, m = 0, len(positions)
+    while c < m:
+        signal_at = int(positions[c])
+        entry = signal_at + config.entry_delay
+        last = market.session_last(signal_at)
+        if entry > last:
+            c += 1
+            continue
+        limit_reason = EXIT_SESSION_END
+        if hold_ns is not None:
+            horizon = int(np.searchsorted(timestamp, timestamp[entry] + hold_ns, side='right')) - 1
+            if horizon < last:
+                last, limit_reason = horizon, EXIT_TIME
+
+        side = int(sides[c])
+        base = price[entry]
+        if side > 0:
+            upper, lower = base + take_profit, base - stop_loss
+        else:
+            upper, lower = base + stop_loss, base - take_profit
+        exit_at = _find_exit(price, entry, last, upper, lower)
+        if exit_at < 0:
+            exit_at, reason = last, limit_reason
+        elif (price[exit_at] >= upper) == (side > 0):
+            reason = EXIT_TAKE_PROFIT
+        else:
+            reason = EXIT_STOP_LOSS
+
+        entries.append(entry)
+        exits.append(exit_at)
+        trade_sides.append(side)
+        reasons.append(reason)
+        # 下一個進場訊號：出場那筆 (含) 之後的第一個訊號
+        c = int(np.searchsorted(positions, exit_at, side='left'))
+        if exit_at >= n - 1:
+            break
+
+    entry_index = np.asarray(entries, dtype=np.int64)
+    exit_index = np.asarray(exits, dtype=np.int64)
+    side = np.asarray(trade_sides, dtype=np.int8)
+    slippage = config.slippage_ticks * config.tick_size
+    entry_price = price[entry_index] + side * slippage
+    exit_price = price[exit_index] - side * slippage
+    notional = config.multiplier * config.contracts
+    pnl = (side * (exit_price - entry_price) * notional
+           - 2 * config.fee_per_contract * config.contracts
+           - config.tax_rate * (entry_price + exit_price) * notional)
+    return Trades(entry_index, exit_index, side, entry_price, exit_price, pnl,
+                  np.asarray(reasons, dtype=np.int8))
+
+
+def _evaluate(market: _Market, config: BacktestConfig, candidates=None) -> BacktestResult:
+    if candidates is None:
+        candidates = _candidates(market.signal, config)
+    trades = _simulate(market, *candidates, config)
+    metrics = summarize_trades(trades.pnl, market.trade_days(trades.exit_index), market.all_days)
+    return BacktestResult(config, trades, metrics)
+
+
+def run_backtest(
+    price,
+    signal,
+    config: BacktestConfig = BacktestConfig(),
+    timestamp: Optional[np.ndarray] = None,
+    session_id: Optional[np.ndarray] = None
+) -> BacktestResult:
+    """
+    依訊號對 Tick 價格執行單一參數組合的回測。
+
+    Args:
+        price: 依時間排序的成交價 (陣列，或以 DatetimeIndex 為索引的 Series)。
+        signal: 與 price 對齊的訊號 (e.g., create_up_down_label 的 0/1、模型的上漲機率)；NaN 不進場。
+        config: 回測參數。
+        timestamp: 可選的 int64 奈秒時間戳 (max_holding 與日夏普比率需要)；
+            price 為帶 DatetimeIndex 的 Series 時自動取得。
+        session_id: 可選的交易時段編號 (見 utils.trading_session.session_ids)；
+            提供時部位不會跨越時段持有，夏普比率以交易日損益計算。
+
+    Returns:
+        BacktestResult (config, trades, metrics)。
+    """
+    return _evaluate(_prepare(price, signal, timestamp, session_id), config)
+
+
+def _sweep_chunk(task: tuple) -> list:
+    """worker：評估一批參數組合，相同進場閾值的組合共用訊號位置。"""
+    items, specs, session_starts, session_day, all_days = task
+    handles, arrays = {}, {}
+    try:
+        for name, spec in specs.items():
+            handles[name], arrays[name] = attach_array(spec)
+        market = _Market(arrays['price'], arrays['signal'], arrays.get('timestamp'),
+                         session_starts, session_day, all_days)
+        candidate_cache = {}
+        results = []
+        for position, config in items:
+            key = (config.long_threshold, config.short_threshold)
+            if key not in candidate_cache:
+                candidate_cache[key] = _candidates(market.signal, config)
+            results.append((position, _evaluate(market, config, candidate_cache[key]).metrics))
+        return results
+    finally:
+        for shm in handles.values():
+            shm.close()
+
+
+def run_sweep(
+    price,
+    signal,
+    grid: dict,
+    base: BacktestConfig = BacktestConfig(),
+    timestamp: Optional[np.ndarray] = None,
+    session_id: Optional[np.ndarray] = None,
+    n_workers: Optional[int] = None,
+    chunk_size: int = 32
+) -> pd.DataFrame:
+    """
+    以參數網格批次回測 (所有組合的笛卡兒積)。
+
+    Args:
+        price / signal / timestamp / session_id: 見 run_backtest。
+        grid: {BacktestConfig 欄位名稱: 候選值列表}，e.g.,
+            {'long_threshold': [0.55, 0.6], 'stop_loss': [10, 20], 'take_profit': [20, 40]}。
+        base: 未列在 grid 中的參數。
+        n_workers: 程序數 (預設為 CPU 核心數；1 表示在目前程序中執行)。
+        chunk_size: 每個工作單位的組合數。
+
+    Returns:
+        DataFrame：每列一個參數組合 (依 grid 展開順序)，包含參數欄位與績效指標。
+    """
+    fields = {f.name for f in dataclasses.fields(BacktestConfig)}
+    unknown = set(grid) - fields
+    if unknown:
+        raise ValueError(f"未知的回測參數: {sorted(unknown)}")
+    names = list(grid)
+    configs = [dataclasses.replace(base, **dict(zip(names, values)))
+               for values in itertools.product(*(grid[name] for name in names))]
+    market = _prepare(price, signal, timestamp, session_id)
+
+    # 相同進場閾值的組合排在一起，讓同一批次共用訊號位置
+    def threshold_key(i):
+        config = configs[i]
+        return (str(config.long_threshold), str(config.short_threshold))
+    order = sorted(range(len(configs)), key=threshold_key)
+    chunks = [[(i, configs[i]) for i in order[a:a + chunk_size]] for a in range(0, len(order), chunk_size)]
+
+    n_workers = n_workers or os.cpu_count() or 1
+    metrics = [None] * len(configs)
+    if n_workers == 1:
+        candidate_cache = {}
+        for i in order:
+            config = configs[i]
+            key = (config.long_threshold, config.short_threshold)
+            if key not in candidate_cache:
+                candidate_cache[key] = _candidates(market.signal, config)
+            metrics[i] = _evaluate(market, config, candidate_cache[key]).metrics
+    else:
+        shms, specs = [], {}
+        try:
+            for name in ('price', 'signal', 'timestamp'):
+                array = getattr(market, name)
+                if array is not None:
+                    shm, specs[name] = share_array(array)
+                    shms.append(shm)
+            tasks = [(chunk, specs, market.session_starts, market.session_day, market.all_days)
+                     for chunk in chunks]
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                for results in pool.map(_sweep_chunk, tasks):
+                    for i, result in results:
+                        metrics[i] = result
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+    params = pd.DataFrame([{name: getattr(config, name) for name in names} for config in configs])
+    return pd.concat([params, pd.DataFrame(metrics)], axis=1)
@@ -0,0 +1,99 @@
+"""
+依模型預測 (或任何訊號欄位) 執行回測的腳本。
+
+輸入的 Parquet 需包含 timestamp、價格欄位與訊號欄位；只保留交易時段內的 Tick，
+部位不會跨越交易時段持有。
+
+Example:
+    # 單一參數
+    python -m backtest.run_backtest data/test_predictions.parquet --signal-column score \\
+        --long-threshold 0.6 --short-threshold 0.4 --stop-loss 20 --take-profit 40 --max-holding 10min
+
+    # 參數掃描 (grid 為 JSON，未列出的參數使用命令列的值)
+    python -m backtest.run_backtest data/test_predictions.parquet --signal-column score \\
+        --grid '{"long_threshold": [0.55, 0.6, 0.65], "stop_loss": [10, 20, 40], "take_profit": [20, 40, 80]}' \\
+        --output sweep.csv
+"""
+import argparse
+import json
+
+import numpy as np
+
+from backtest.core_logic import BacktestConfig, run_backtest, run_sweep
+from utils.data_loader import TIMESTAMP_COLUMN, load_ticks
+from utils.trading_session import SESSION_OUTSIDE, classify_sessions, session_ids
+
+
+def load_signals(paths, price_column: str = 'close', signal_column: str = 'signal', start=None, end=None) -> tuple:
+    """
+    讀取價格與訊號，回傳依時間排序、只含交易時段的 (timestamp, price, signal, session_id)。
+    """
+    df = load_ticks(paths, [price_column, signal_column], start, end)
+    ts = df[TIMESTAMP_COLUMN].to_numpy()
+    order = np.argsort(ts, kind='stable')
+    ts = ts[order]
+    session, trading_day = classify_sessions(ts)
+    keep = session != SESSION_OUTSIDE
+    price = df[price_column].to_numpy(dtype=np.float64)[order][keep]
+    signal = df[signal_column].to_numpy(dtype=np.float64)[order][keep]
+    return ts[keep], price, signal, session_ids(session[keep], trading_day[keep])
+
+
+def _optional_float(value: str):
+    return None if value.lower() == 'none' else float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tick 訊號回測')
+    parser.add_argument('paths', nargs='+', help='Parquet 檔案路徑')
+    parser.add_argument('--price-column', default='close')
+    parser.add_argument('--signal-column', default='signal')
+    parser.add_argument('--start', default=None, help='起始時間 (含)')
+    parser.add_argument('--end', default=None, help='結束時間 (不含)')
+    parser.add_argument('--long-threshold', type=_optional_float, default=0.5)
+    parser.add_argument('--short-threshold', type=_optional_float, default=None)
+    parser.add_argument('--stop-loss', type=_optional_float, default=None, help='停損點數')
+    parser.add_argument('--take-profit', type=_optional_float, default=None, help='停利點數')
+    parser.add_argument('--max-holding', default=None, help="最長持有時間 (e.g., '10min')")
+    parser.add_argument('--entry-delay', type=int, default=1)
+    parser.add_argument('--slippage-ticks', type=float, default=1.0)
+    parser.add_argument('--contracts', type=int, default=1)
+    parser.add_argument('--multiplier', type=float, default=200.0)
+    parser.add_argument('--fee', type=float, default=0.0, help='每口每邊手續費')
+    parser.add_argument('--tax-rate', type=float, default=2e-5)
+    parser.add_argument('--grid', default=None, help='參數掃描的 JSON 網格')
+    parser.add_argument('--workers', type=int, default=None, help='參數掃描的程序數')
+    parser.add_argument('--output', default=None, help='輸出 CSV (單一回測為逐筆交易，掃描為各組合績效)')
+    args = parser.parse_args(argv)
+
+    config = BacktestConfig(
+        long_threshold=args.long_threshold,
+        short_threshold=args.short_threshold,
+        stop_loss=args.stop_loss,
+        take_profit=args.take_profit,
+        max_holding=args.max_holding,
+        entry_delay=args.entry_delay,
+        slippage_ticks=args.slippage_ticks,
+        contracts=args.contracts,
+        multiplier=args.multiplier,
+        fee_per_contract=args.fee,
+        tax_rate=args.tax_rate,
+    )
+    ts, price, signal, sid = load_signals(args.paths, args.price_column, args.signal_column, args.start, args.end)
+    print(f"載入 {len(price)} 筆交易時段內的 Tick。")
+
+    if args.grid:
+        results = run_sweep(price, signal, json.loads(args.grid), config, ts, sid, n_workers=args.workers)
+        print(results.sort_values('sharpe', ascending=False).head(20).to_string(index=False))
+        if args.output:
+            results.to_csv(args.output, index=False)
+    else:
+        result = run_backtest(price, signal, config, ts, sid)
+        for name, value in result.metrics.items():
+            print(f"{name}: {value}")
+        if args.output:
+            result.trades.to_frame(ts).to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
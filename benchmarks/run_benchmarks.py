@@ -0,0 +1,300 @@
+"""
+資料管線各階段的效能測試。
+
+以 utils.synthetic_ticks 產生固定 seed 的合成 Tick (寫成 Parquet)，依序量測：
+    load → clean → sessions → features / labels / EDA (eda_analyzer 的日波動率、收盤價走勢圖與價量直方圖)
+每個階段記錄耗時 (repeat 次取最小值)、尖峰記憶體 (另以 tracemalloc 執行一次)、輸入/輸出筆數，
+並計算相鄰資料量之間的縮放指數 (log(耗時比) / log(筆數比)，1.0 為線性)。
+結果寫成 JSON，可與既有的 baseline 比較，超過容忍度的退步會列出並可讓程式以非零狀態結束。
+
+Example:
+    python -m benchmarks.run_benchmarks --sizes 1M 10M 50M --output results.json
+    python -m benchmarks.run_benchmarks --sizes 1M --baseline benchmarks/baseline.json --fail-on-regression
+    python -m benchmarks.run_benchmarks --sizes 1M --trace trace.jsonl
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from features.feature_engineering import calculate_bollinger_bands, calculate_ema, calculate_rsi, calculate_sma
+from features.feature_set import FeatureSet
+from features.labeling import create_forward_labels, create_triple_barrier_labels, create_up_down_label
+from utils.bar_builder import build_bars
+from utils.data_cleaner import clean_data, process_time_series
+from utils.data_loader import load_ticks
+from utils.eda_analyzer import analyze_daily_volatility, plot_daily_close_price
+from utils.histograms import price_volume_histograms
+from utils.instrumentation import tracing
+from utils.synthetic_ticks import write_synthetic_parquet
+
+DEFAULT_SIZES = ('1M', '10M', '50M')
+LABEL_WINDOW = '5min'
+LABEL_THRESHOLD = 0.001
+INDICATOR_WINDOW = 20
+
+
+class Stage(NamedTuple):
+    """
+    Attributes:
+        name: 階段名稱。
+        source: 輸入在 context 中的鍵。
+        run: 以輸入為參數的函數。
+        target: 輸出存回 context 的鍵 (None 表示不保留)。
+        copy_input: 函數會修改輸入時為 True (複製在計時之外進行)。
+    """
+    name: str
+    source: str
+    run: Callable
+    target: Optional[str] = None
+    copy_input: bool = False
+
+
+def _legacy_features(df: pd.DataFrame) -> pd.DataFrame:
+    close = df['close']
+    result = calculate_bollinger_bands(close, INDICATOR_WINDOW)
+    result['SMA'] = calculate_sma(close, INDICATOR_WINDOW)
+    result['EMA'] = calculate_ema(close, INDICATOR_WINDOW)
+    result['RSI'] = calculate_rsi(close, 14)
+    return result
+
+
+def _feature_set(df: pd.DataFrame):
+    feature_set = FeatureSet(sma=[INDICATOR_WINDOW], ema=[INDICATOR_WINDOW], rsi=[14], bb=[INDICATOR_WINDOW])
+    return feature_set.compute(df['close']).values
+
+
+def _eda_volatility(df: pd.DataFrame) -> float:
+    # analyze_daily_volatility 會印出結果，量測時不輸出
+    with contextlib.redirect_stdout(io.StringIO()):
+        return analyze_daily_volatility(df)
+
+
+STAGES = (
+    Stage('load', 'path', load_ticks, 'raw'),
+    Stage('clean', 'raw', clean_data, 'cleaned'),
+    Stage('sessions', 'cleaned', process_time_series, 'ticks', copy_input=True),
+    Stage('features_legacy', 'ticks', _legacy_features),
+    Stage('features', 'ticks', _feature_set),
+    Stage('labels_up_down', 'ticks', lambda df: create_up_down_label(df['close'], LABEL_WINDOW, LABEL_THRESHOLD)),
+    Stage('labels_forward', 'ticks', lambda df: create_forward_labels(
+        df['close'], [LABEL_WINDOW], [LABEL_THRESHOLD], df['session_id'].to_numpy()).labels),
+    Stage('labels_triple_barrier', 'ticks', lambda df: create_triple_barrier_labels(
+        df['close'], LABEL_WINDOW, LABEL_THRESHOLD, LABEL_THRESHOLD, session_id=df['session_id'].to_numpy()).labels),
+    Stage('eda_volatility', 'ticks', _eda_volatility),
+    Stage('eda_close_chart', 'ticks', lambda df: plot_daily_close_price(df, show=False)),
+    Stage('eda_histograms', 'ticks', price_volume_histograms),
+    Stage('bars_1min', 'ticks', lambda df: build_bars(df, 'time', '1min')),
+)
+STAGE_NAMES = tuple(stage.name for stage in STAGES)
+
+
+def parse_size(value: str) -> int:
+    """'1M'、'500K'、'2000000' 轉為筆數。"""
+    value = value.strip().upper()
+    scale = {'K': 1_000, 'M': 1_000_000, 'G': 1_000_000_000}
+    if value[-1] in scale:
+        return int(float(value[:-1]) * scale[value[-1]])
+    return int(value)
+
+
+def _rows(value) -> Optional[int]:
+    if isinstance(value, str):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _measure(stage: Stage, data, repeat: int, memory: bool) -> tuple:
+    """回傳 (輸出, 最短耗時秒數, 尖峰記憶體 bytes 或 None)。"""
+    best = math.inf
+    output = None
+    for _ in range(repeat):
+        argument = data.copy() if stage.copy_input else data
+        started = time.perf_counter()
+        output = stage.run(argument)
+        best = min(best, time.perf_counter() - started)
+        del argument
+
+    peak = None
+    if memory:
+        argument = data.copy() if stage.copy_input else data
+        tracemalloc.start()
+        try:
+            stage.run(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        del argument
+    return output, best, peak
+
+
+def run_size(n_ticks: int, stages=STAGE_NAMES, repeat: int = 1, memory: bool = True,
+             seed: int = 0, workdir: Optional[str] = None) -> list:
+    """
+    以 n_ticks 筆合成資料執行指定階段，回傳每個階段一筆的結果 dict。
+    後續階段所需的輸入 (e.g., features 需要 sessions 的輸出) 即使未被選取也會先計算 (不記錄)。
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        path = os.path.join(tmp, f'synthetic_{n_ticks}.parquet')
+        started = time.perf_counter()
+        written = write_synthetic_parquet(path, n_ticks, seed=seed)
+        print(f"[{n_ticks:,}] 產生 {written:,} 筆合成資料 ({time.perf_counter() - started:.1f}s)", flush=True)
+
+        needed = set(stages)
+        for stage in reversed(STAGES):
+            if stage.name in needed or (stage.target and stage.target in needed):
+                needed.add(stage.source)
+
+        context = {'path': path}
+        for stage in STAGES:
+            if stage.name not in stages and stage.target not in needed:
+                continue
+            data = context[stage.source]
+            record = stage.name in stages
+            output, seconds, peak = _measure(stage, data, repeat if record else 1, memory and record)
+            if stage.target:
+                context[stage.target] = output
+            if not record:
+                continue
+            rows_in = written if stage.source == 'path' else _rows(data)
+            result = {
+                'stage': stage.name,
+                'ticks': n_ticks,
+                'rows_in': rows_in,
+                'rows_out': _rows(output),
+                'seconds': seconds,
+                'peak_mb': None if peak is None else peak / 2 ** 20,
+                'ns_per_row': seconds * 1e9 / rows_in if rows_in else None,
+            }
+            results.append(result)
+            memory_text = '' if peak is None else f", peak {result['peak_mb']:.0f} MB"
+            print(f"  {stage.name:<22} {seconds:8.3f}s{memory_text}", flush=True)
+            del output
+    return results
+
+
+def scaling_exponents(results: list) -> list:
+    """相鄰資料量之間的縮放指數：log(t2 / t1) / log(n2 / n1)。"""
+    frame = pd.DataFrame(results)
+    rows = []
+    for stage, group in frame.groupby('stage', sort=False):
+        group = group.sort_values('ticks')
+        for (_, a), (_, b) in zip(group.iterrows(), group.iloc[1:].iterrows()):
+            if a['seconds'] > 0 and b['ticks'] > a['ticks']:
+                rows.append({'stage': stage, 'from': int(a['ticks']), 'to': int(b['ticks']),
+                             'exponent': math.log(b['seconds'] / a['seconds']) / math.log(b['ticks'] / a['ticks'])})
+    return rows
+
+
+def _metadata(seed: int, repeat: int) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2, min_seconds: float = 0.25,
+            scaling_tolerance: float = 0.15) -> pd.DataFrame:
+    """
+    比較本次結果與 baseline。
+
+    Args:
+        current / baseline: run_benchmarks 輸出的 JSON 內容。
+        tolerance: 耗時與記憶體允許的相對增加量 (0.2 表示 20%)。
+        min_seconds: 兩者耗時皆低於此值時不判定耗時退步 (量測雜訊)。
+        scaling_tolerance: 縮放指數允許的增加量。
+
+    Returns:
+        每個 (stage, ticks) 一列的比較表，regression 欄位標記退步。
+    """
+    keys = ['stage', 'ticks']
+    now = pd.DataFrame(current['results'])
+    before = pd.DataFrame(baseline['results'])
+    table = now.merge(before, on=keys, how='inner', suffixes=('', '_baseline'))
+    table['time_ratio'] = table['seconds'] / table['seconds_baseline']
+    table['memory_ratio'] = table['peak_mb'] / table['peak_mb_baseline']
+    slow = (table['time_ratio'] > 1 + tolerance) & (table['seconds'].clip(lower=table['seconds_baseline']) >= min_seconds)
+    heavy = table['memory_ratio'] > 1 + tolerance
+
+    scaling_now = pd.DataFrame(current.get('scaling', []), columns=['stage', 'from', 'to', 'exponent'])
+    scaling_before = pd.DataFrame(baseline.get('scaling', []), columns=['stage', 'from', 'to', 'exponent'])
+    scaling = scaling_now.merge(scaling_before, on=['stage', 'from', 'to'], suffixes=('', '_baseline'))
+    scaling = scaling.rename(columns={'to': 'ticks'})[['stage', 'ticks', 'exponent', 'exponent_baseline']]
+    table = table.merge(scaling, on=keys, how='left')
+    steeper = (table['exponent'] - table['exponent_baseline']) > scaling_tolerance
+
+    table['regression'] = slow | heavy | steeper.fillna(False)
+    columns = ['stage', 'ticks', 'seconds', 'seconds_baseline', 'time_ratio', 'peak_mb', 'peak_mb_baseline',
+               'memory_ratio', 'exponent', 'exponent_baseline', 'regression']
+    return table[columns]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='資料管線效能測試')
+    parser.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help="資料量 (e.g., 1M 10M 50M)")
+    parser.add_argument('--stages', nargs='+', default=list(STAGE_NAMES), choices=STAGE_NAMES)
+    parser.add_argument('--repeat', type=int, default=1, help='每個階段重複次數 (取最短耗時)')
+    parser.add_argument('--no-memory', action='store_true', help='不量測尖峰記憶體')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=None, help='暫存合成 Parquet 的目錄')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='要比較的 baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--trace', default=None,
+                        help='同時以 utils.instrumentation 將各函數的量測寫入此 JSON Lines 檔')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tracing(args.trace) if args.trace else contextlib.nullcontext():
+        for size in sorted(parse_size(s) for s in args.sizes):
+            results.extend(run_size(size, args.stages, args.repeat, not args.no_memory, args.seed, args.workdir))
+    report = {'meta': _metadata(args.seed, args.repeat), 'results': results, 'scaling': scaling_exponents(results)}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        table = compare(report, baseline, args.tolerance)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(table.to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+        regressions = table[table['regression']]
+        if len(regressions):
+            print(f"\n{len(regressions)} 項退步超過容忍度：{', '.join(regressions['stage'] + '@' + regressions['ticks'].astype(str))}")
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
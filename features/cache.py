@@ -0,0 +1,351 @@
+"""
+特徵/標註計算結果的快取。
+
+快取鍵 = 輸入資料指紋 (交易時段編號 + 內容雜湊) + 函數名稱 + 函數原始碼雜湊 + 參數。
+結果存放兩層：
+    記憶體：LRU，依位元組預算淘汰。
+    磁碟：pandas 物件存成 Parquet、NumPy 陣列存成 .npy，其他物件以 pickle 儲存；
+          超過磁碟預算時依最後存取時間淘汰。
+函數原始碼 (或指定的 code_version) 改變時，舊的快取不會再被命中，並可用
+invalidate_stale() 清除。
+"""
+import dataclasses
+import datetime
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+INDEX_NAME = 'index.json'
+SERIES_COLUMN = '__value__'
+
+
+def _hash_array(hasher, values: np.ndarray):
+    values = np.ascontiguousarray(values)
+    if values.dtype == object:
+        hasher.update(pd.util.hash_array(values.astype(str)).tobytes())
+    else:
+        hasher.update(str(values.dtype).encode())
+        hasher.update(values.view(np.uint8).reshape(-1) if values.size else b'')
+
+
+# 以 repr 雜湊的純量型態 (repr 完整且不截斷)
+_SCALAR_TYPES = (type(None), bool, int, float, complex, str, bytes, np.generic, np.dtype,
+                 pd.Timestamp, pd.Timedelta, datetime.date, datetime.time, datetime.timedelta)
+
+
+def _hash_value(hasher, data):
+    if isinstance(data, pd.Series):
+        hasher.update(b'series')
+        _hash_array(hasher, data.index.to_numpy())
+        _hash_array(hasher, data.to_numpy())
+    elif isinstance(data, pd.DataFrame):
+        hasher.update(b'frame')
+        if 'session_id' in data.columns:
+            hasher.update(np.unique(data['session_id'].to_numpy()).tobytes())
+        _hash_array(hasher, data.index.to_numpy())
+        for name in data.columns:
+            hasher.update(str(name).encode())
+            _hash_array(hasher, data[name].to_numpy())
+    elif isinstance(data, pd.Index):
+        hasher.update(b'index')
+        _hash_array(hasher, data.to_numpy())
+    elif isinstance(data, np.ndarray):
+        hasher.update(b'array')
+        hasher.update(str(data.shape).encode())
+        _hash_array(hasher, data)
+    elif isinstance(data, _SCALAR_TYPES):
+        hasher.update(f'{type(data).__qualname__}:{data!r}'.encode())
+    elif isinstance(data, (list, tuple, set, frozenset)):
+        items = sorted(data, key=repr) if isinstance(data, (set, frozenset)) else data
+        hasher.update(f'{type(data).__qualname__}:{len(items)}'.encode())
+        for item in items:
+            _hash_value(hasher, item)
+    elif isinstance(data, dict):
+        hasher.update(f'dict:{len(data)}'.encode())
+        for name in sorted(data, key=repr):
+            _hash_value(hasher, name)
+            _hash_value(hasher, data[name])
+    elif dataclasses.is_dataclass(data) and not isinstance(data, type):
+        hasher.update(f'{type(data).__module__}.{type(data).__qualname__}'.encode())
+        for field in dataclasses.fields(data):
+            hasher.update(field.name.encode())
+            _hash_value(hasher, getattr(data, field.name))
+    else:
+        raise TypeError(f"無法計算 {type(data).__name__} 的資料指紋")
+
+
+def data_fingerprint(data) -> str:
+    """
+    計算輸入資料的指紋。
+
+    pandas 物件會納入索引與所有欄位內容；若含 'session_id' 欄位，另外記錄涵蓋的交易時段編號，
+    讓不同時段組合的資料即使內容雜湊碰撞也不會共用快取。序列、dict 與 dataclass 逐一雜湊其元素；
+    不支援的型態會引發 TypeError (repr 可能被截斷，不能作為指紋)。
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    _hash_value(hasher, data)
+    return hasher.hexdigest()
+
+
+def code_fingerprint(func: Callable) -> str:
+    """函數原始碼的雜湊 (取不到原始碼時以完整名稱代替)。"""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f'{func.__module__}.{func.__qualname__}'
+    return hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class FeatureCache:
+    """
+    特徵/標註計算的兩層快取。
+
+    Args:
+        root: 磁碟快取目錄。
+        memory_bytes: 記憶體層的位元組預算。
+        disk_bytes: 磁碟層的位元組預算 (None 表示不限制)。
+        code_version: 額外的版本字串；改變時所有既有快取失效。
+
+    Example:
+        cache = FeatureCache('./cache')
+        rsi = cache.call(calculate_rsi, df['close'], window=14)
+        cached_label = cache.wrap(create_up_down_label)
+        label = cached_label(df['close'], window='5min', threshold=0.001)
+        print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        root: str,
+        memory_bytes: int = 512 * 1024 ** 2,
+        disk_bytes: Optional[int] = None,
+        code_version: str = ''
+    ):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.code_version = code_version
+        os.makedirs(root, exist_ok=True)
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._index = self._load_index()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                       'memory_evictions': 0, 'disk_evictions': 0}
+
+    # ------------------------------------------------------------------
+    # 索引
+    # ------------------------------------------------------------------
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, INDEX_NAME)
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    # ------------------------------------------------------------------
+    # 快取鍵
+    # ------------------------------------------------------------------
+    def _function_name(self, func: Callable) -> str:
+        return f'{func.__module__}.{func.__qualname__}'
+
+    def _code_hash(self, func: Callable) -> str:
+        return f'{code_fingerprint(func)}:{self.code_version}'
+
+    def make_key(self, func: Callable, args: tuple, kwargs: dict) -> str:
+        """由函數、原始碼版本與所有參數組成快取鍵。"""
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(self._function_name(func).encode())
+        hasher.update(self._code_hash(func).encode())
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        for name, value in bound.arguments.items():
+            hasher.update(name.encode())
+            hasher.update(data_fingerprint(value).encode())
+        return hasher.hexdigest()
+
+    # ------------------------------------------------------------------
+    # 記憶體層
+    # ------------------------------------------------------------------
+    def _remember(self, key: str, value, nbytes: int):
+        if nbytes > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_used -= self._memory.pop(key)[1]
+        self._memory[key] = (value, nbytes)
+        self._memory_used += nbytes
+        while self._memory_used > self.memory_bytes:
+            _, (_, evicted_bytes) = self._memory.popitem(last=False)
+            self._memory_used -= evicted_bytes
+            self._stats['memory_evictions'] += 1
+
+    # ------------------------------------------------------------------
+    # 磁碟層
+    # ------------------------------------------------------------------
+    def _write(self, key: str, value) -> tuple:
+        if isinstance(value, pd.Series):
+            name = value.name
+            frame = value.to_frame(SERIES_COLUMN)
+            path = os.path.join(self.root, f'{key}.parquet')
+            frame.to_parquet(path)
+            return path, 'series', None if name is None else str(name)
+        if isinstance(value, pd.DataFrame):
+            path = os.path.join(self.root, f'{key}.parquet')
+            value.to_parquet(path)
+            return path, 'frame', None
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            path = os.path.join(self.root, f'{key}.npy')
+            np.save(path, value)
+            return path, 'array', None
+        path = os.path.join(self.root, f'{key}.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path, 'pickle', None
+
+    def _read(self, entry: dict):
+        path = os.path.join(self.root, entry['file'])
+        kind = entry['kind']
+        if kind == 'series':
+            series = pd.read_parquet(path)[SERIES_COLUMN]
+            series.name = entry.get('name')
+            return series
+        if kind == 'frame':
+            return pd.read_parquet(path)
+        if kind == 'array':
+            return np.load(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _remove_entry(self, key: str, memory: bool = True):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            path = os.path.join(self.root, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        if memory and key in self._memory:
+            self._memory_used -= self._memory.pop(key)[1]
+
+    def _enforce_disk_budget(self):
+        if self.disk_bytes is None:
+            return
+        total = sum(entry['bytes'] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+            if total <= self.disk_bytes:
+                break
+            total -= self._index[key]['bytes']
+            self._remove_entry(key, memory=False)
+            self._stats['disk_evictions'] += 1
+
+    # ------------------------------------------------------------------
+    # 公開介面
+    # ------------------------------------------------------------------
+    def call(self, func: Callable, *args, **kwargs):
+        """呼叫 func(*args, **kwargs)，若相同輸入與參數已計算過則直接回傳快取結果。"""
+        key = self.make_key(func, args, kwargs)
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._stats['memory_hits'] += 1
+            return self._memory[key][0]
+
+        entry = self._index.get(key)
+        if entry is not None and os.path.exists(os.path.join(self.root, entry['file'])):
+            value = self._read(entry)
+            entry['last_access'] = time.time()
+            self._save_index()
+            self._remember(key, value, _nbytes(value))
+            self._stats['disk_hits'] += 1
+            return value
+
+        self._stats['misses'] += 1
+        value = func(*args, **kwargs)
+        self._remember(key, value, _nbytes(value))
+        path, kind, name = self._write(key, value)
+        if self.disk_bytes is not None and os.path.getsize(path) > self.disk_bytes:
+            # 單一結果已超過磁碟預算，只保留在記憶體層
+            os.remove(path)
+            return value
+        now = time.time()
+        self._index[key] = {
+            'function': self._function_name(func),
+            'code': self._code_hash(func),
+            'file': os.path.basename(path),
+            'kind': kind,
+            'name': name,
+            'bytes': os.path.getsize(path),
+            'created': now,
+            'last_access': now,
+        }
+        self._enforce_disk_budget()
+        self._save_index()
+        return value
+
+    def wrap(self, func: Callable) -> Callable:
+        """回傳帶快取的 func 版本。"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+    def invalidate_stale(self, funcs) -> int:
+        """
+        刪除指定函數中原始碼 (或 code_version) 已變動的舊快取。
+
+        Args:
+            funcs: 目前版本的函數列表。
+
+        Returns:
+            刪除的項目數。
+        """
+        current = {self._function_name(f): self._code_hash(f) for f in funcs}
+        stale = [key for key, entry in self._index.items()
+                 if entry['function'] in current and entry['code'] != current[entry['function']]]
+        for key in stale:
+            self._remove_entry(key)
+        self._save_index()
+        return len(stale)
+
+    def clear(self):
+        """清除所有快取。"""
+        for key in list(self._index):
+            self._remove_entry(key)
+        self._memory.clear()
+        self._memory_used = 0
+        self._save_index()
+
+    def stats(self) -> dict:
+        """回傳命中/未命中/淘汰次數與目前用量。"""
+        stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['memory_bytes'] = self._memory_used
+        stats['memory_entries'] = len(self._memory)
+        stats['disk_bytes'] = sum(entry['bytes'] for entry in self._index.values())
+        stats['disk_entries'] = len(self._index)
+        return stats
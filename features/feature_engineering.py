@@ -1,5 +1,8 @@
 import pandas as pd
 
+from utils.instrumentation import instrument
+
+@instrument()
 def calculate_sma(data: pd.Series, window: int) -> pd.Series:
     """
     計算簡單移動平均 (Simple Moving Average, SMA)。
@@ -13,6 +16,7 @@ def calculate_sma(data: pd.Series, window: int) -> pd.Series:
     """
     return data.rolling(window=window).mean()
 
+@instrument()
 def calculate_ema(data: pd.Series, window: int) -> pd.Series:
     """
     計算指數移動平均 (Exponential Moving Average, EMA)。
@@ -26,6 +30,7 @@ def calculate_ema(data: pd.Series, window: int) -> pd.Series:
     """
     return data.ewm(span=window, adjust=False).mean()
 
+@instrument()
 def calculate_rsi(data: pd.Series, window: int = 14) -> pd.Series:
     """
     計算相對強弱指數 (Relative Strength Index, RSI)。
@@ -48,6 +53,7 @@ def calculate_rsi(data: pd.Series, window: int = 14) -> pd.Series:
     rsi = 100 - (100 / (1 + rs))
     return rsi
 
+@instrument()
 def calculate_bollinger_bands(data: pd.Series, window: int = 20, num_std_dev: int = 2) -> pd.DataFrame:
     """
     計算布林通道 (Bollinger Bands, BB)。
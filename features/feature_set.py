@@ -0,0 +1,287 @@
+"""
+多窗口技術指標的批次特徵矩陣。
+
+FeatureSet 描述「指標 × 窗口」的組合，一次計算到預先配置的 float32 二維陣列：
+所有 SMA / 布林通道窗口共用同一次累積和 (分成小子塊、各自減去子塊平均以維持精度)，
+所有 RSI 窗口共用同一次價差計算。
+資料分塊處理 (塊與塊之間保留 max_window - 1 筆重疊並接續 EMA 遞迴狀態)，
+因此暫存記憶體只與 chunk_size 成正比，與總筆數無關。
+輸出與 features/feature_engineering.py 中對應的函數一致 (float32 精度)。
+StreamingFeatures 則是同一組特徵的逐筆版本，供即時推論使用。
+"""
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from features.streaming_indicators import (
+    StreamingBollingerBands,
+    StreamingEMA,
+    StreamingRSI,
+    StreamingSMA,
+    ewm_continue,
+)
+from utils.instrumentation import instrument
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+# SMA / 布林通道累積和的子塊大小 (每個子塊各自平移)
+SHIFT_BLOCK_SIZE = 4096
+
+
+class FeatureMatrix(NamedTuple):
+    """
+    Attributes:
+        values: shape (n, k) 的 float32 陣列。
+        columns: 欄位名稱 (長度 k)。
+        warmup: shape (n,) 的 bool 陣列；True 表示該列仍在指標暖機期 (前 max_window - 1 筆)。
+    """
+    values: np.ndarray
+    columns: list
+    warmup: np.ndarray
+
+    def to_frame(self, index=None) -> pd.DataFrame:
+        """轉為 DataFrame (不複製資料)。"""
+        return pd.DataFrame(self.values, index=index, columns=self.columns, copy=False)
+
+
+class FeatureSet:
+    """
+    技術指標特徵組合。
+
+    Args:
+        sma: SMA 窗口列表。
+        ema: EMA 窗口列表。
+        rsi: RSI 窗口列表。
+        bb: 布林通道窗口列表 (每個窗口產生中軌、上軌、下軌三個欄位)。
+        num_std_dev: 布林通道的標準差倍數。
+
+    Example:
+        fs = FeatureSet(sma=[5, 10, 20], ema=[12, 26], rsi=[14], bb=[20])
+        features = fs.compute(df['close'])
+    """
+
+    def __init__(
+        self,
+        sma: Sequence[int] = (),
+        ema: Sequence[int] = (),
+        rsi: Sequence[int] = (),
+        bb: Sequence[int] = (),
+        num_std_dev: float = 2
+    ):
+        self.sma = list(sma)
+        self.ema = list(ema)
+        self.rsi = list(rsi)
+        self.bb = list(bb)
+        self.num_std_dev = num_std_dev
+
+    @property
+    def columns(self) -> list:
+        names = [f'SMA_{w}' for w in self.sma]
+        names += [f'EMA_{w}' for w in self.ema]
+        names += [f'RSI_{w}' for w in self.rsi]
+        for w in self.bb:
+            names += [f'BB_Middle_{w}', f'BB_Upper_{w}', f'BB_Lower_{w}']
+        return names
+
+    @property
+    def max_window(self) -> int:
+        return max(self.sma + self.ema + self.rsi + self.bb, default=1)
+
+    def halo_rows(self, tolerance: float = 1e-12) -> int:
+        """
+        分段計算時每段需要往前重疊的筆數：滾動窗口需 max_window - 1 筆；
+        EMA/RSI 的遞迴需讓初始狀態的影響衰減到 tolerance 以下 ((1 - alpha) ** rows < tolerance)。
+        """
+        rows = max(self.sma + self.bb, default=1) - 1
+        for w in self.ema + self.rsi:
+            decay = 1.0 - 2.0 / (w + 1.0)
+            if decay > 0:
+                rows = max(rows, int(np.ceil(np.log(tolerance) / np.log(decay))))
+        return rows
+
+    @instrument()
+    def compute(self, data, chunk_size: int = DEFAULT_CHUNK_SIZE, out: Optional[np.ndarray] = None) -> FeatureMatrix:
+        """
+        計算所有特徵。
+
+        Args:
+            data: 收盤價 (pandas Series 或一維陣列)，不可含 NaN。
+            chunk_size: 每塊處理的筆數。
+            out: 可選的預先配置輸出陣列 (shape (n, k)、float32)。
+
+        Returns:
+            FeatureMatrix。
+        """
+        prices = np.asarray(data, dtype=np.float64)
+        n = len(prices)
+        columns = self.columns
+        if out is None:
+            out = np.empty((n, len(columns)), dtype=np.float32)
+        elif out.shape != (n, len(columns)):
+            raise ValueError(f"out 的 shape 必須是 {(n, len(columns))}")
+
+        # 欄位位置
+        col = 0
+        sma_cols = list(range(col, col + len(self.sma)))
+        col += len(self.sma)
+        ema_cols = list(range(col, col + len(self.ema)))
+        col += len(self.ema)
+        rsi_cols = list(range(col, col + len(self.rsi)))
+        col += len(self.rsi)
+        bb_cols = [(col + 3 * i, col + 3 * i + 1, col + 3 * i + 2) for i in range(len(self.bb))]
+
+        rolling_windows = sorted(set(self.sma + self.bb))
+        overlap = max(rolling_windows, default=1) - 1
+        # 子塊至少與重疊長度相同，重疊造成的重複計算不超過一倍
+        shift_block = max(SHIFT_BLOCK_SIZE, overlap)
+        ema_alphas = [2.0 / (w + 1.0) for w in self.ema]
+        rsi_alphas = [2.0 / (w + 1.0) for w in self.rsi]
+        ema_state = [None] * len(self.ema)
+        gain_state = [None] * len(self.rsi)
+        loss_state = [None] * len(self.rsi)
+
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            chunk = prices[start:stop]
+
+            # SMA / 布林通道：共用一次累積和；以較小的子塊各自減去子塊平均，
+            # 讓平方和的量級只取決於子塊內的價格變化，避免價格漂移時的相消誤差
+            if rolling_windows:
+                for block_start in range(start, stop, shift_block):
+                    block_stop = min(block_start + shift_block, stop)
+                    self._rolling_block(prices, block_start, block_stop, overlap, out,
+                                        sma_cols, bb_cols)
+
+            # EMA：各窗口接續上一塊的遞迴狀態
+            for i, (alpha, c) in enumerate(zip(ema_alphas, ema_cols)):
+                ema = ewm_continue(chunk, alpha, ema_state[i])
+                ema_state[i] = ema[-1]
+                out[start:stop, c] = ema
+
+            # RSI：所有窗口共用一次價差計算
+            if self.rsi:
+                previous = prices[start - 1] if start > 0 else chunk[0]
+                delta = np.diff(chunk, prepend=previous)
+                gain = np.where(delta > 0, delta, 0.0)
+                loss = np.where(delta < 0, -delta, 0.0)
+                for i, (alpha, c) in enumerate(zip(rsi_alphas, rsi_cols)):
+                    avg_gain = ewm_continue(gain, alpha, gain_state[i])
+                    avg_loss = ewm_continue(loss, alpha, loss_state[i])
+                    gain_state[i], loss_state[i] = avg_gain[-1], avg_loss[-1]
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        out[start:stop, c] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        warmup = np.arange(n) < self.max_window - 1
+        return FeatureMatrix(out, columns, warmup)
+
+    def _rolling_block(self, prices: np.ndarray, start: int, stop: int, overlap: int, out: np.ndarray,
+                       sma_cols: list, bb_cols: list):
+        """計算 prices[start:stop] 的 SMA 與布林通道 (往前取 overlap 筆作為窗口的起始資料)。"""
+        lead = min(overlap, start)
+        window_data = prices[start - lead:stop]
+        ref = window_data.mean()
+        shifted = window_data - ref
+        csum = np.empty(len(shifted) + 1)
+        csum[0] = 0.0
+        np.cumsum(shifted, out=csum[1:])
+        if self.bb:
+            csq = np.empty(len(shifted) + 1)
+            csq[0] = 0.0
+            np.cumsum(shifted * shifted, out=csq[1:])
+        end = np.arange(lead + 1, len(shifted) + 1)
+        global_row = np.arange(start, stop)
+
+        for w, c in zip(self.sma, sma_cols):
+            out[start:stop, c] = _rolling_mean(csum, end, w, ref, global_row)
+        for w, (mid_c, up_c, low_c) in zip(self.bb, bb_cols):
+            mean = _rolling_mean(csum, end, w, ref, global_row)
+            band = _rolling_std(csum, csq, end, w, global_row) * self.num_std_dev
+            out[start:stop, mid_c] = mean
+            out[start:stop, up_c] = mean + band
+            out[start:stop, low_c] = mean - band
+
+    def streaming(self) -> 'StreamingFeatures':
+        """建立同一組特徵的逐筆計算器。"""
+        return StreamingFeatures(self)
+
+
+class StreamingFeatures:
+    """
+    FeatureSet 的逐筆版本：每筆 Tick 以 O(1) 更新所有指標，輸出欄位順序與 FeatureSet.columns 相同。
+
+    Args:
+        feature_set: 特徵組合。
+
+    Example:
+        features = FeatureSet(sma=[5, 20], rsi=[14]).streaming()
+        features.warm_up(history['close'])
+        row = features.update(price)
+    """
+
+    def __init__(self, feature_set: FeatureSet):
+        self.columns = feature_set.columns
+        self.max_window = feature_set.max_window
+        self._scalars = ([StreamingSMA(w) for w in feature_set.sma]
+                         + [StreamingEMA(w) for w in feature_set.ema]
+                         + [StreamingRSI(w) for w in feature_set.rsi])
+        self._bands = [StreamingBollingerBands(w, feature_set.num_std_dev) for w in feature_set.bb]
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        """最新一筆是否已離開暖機期 (對應 FeatureMatrix.warmup 為 False)。"""
+        return self.count >= self.max_window
+
+    def update(self, price: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        加入一筆價格並回傳最新的特徵列。
+
+        Args:
+            price: 成交價。
+            out: 可選的輸出陣列 (長度為欄位數、float32)，用於避免每筆配置記憶體。
+        """
+        if out is None:
+            out = np.empty(len(self.columns), dtype=np.float32)
+        col = 0
+        for indicator in self._scalars:
+            out[col] = indicator.update(price)
+            col += 1
+        for indicator in self._bands:
+            out[col:col + 3] = indicator.update(price)
+            col += 3
+        self.count += 1
+        return out
+
+    def warm_up(self, prices) -> np.ndarray:
+        """以一段歷史價格批次初始化狀態，回傳這段歷史的特徵矩陣 (n, k)。"""
+        prices = np.asarray(prices, dtype=np.float64)
+        out = np.empty((len(prices), len(self.columns)), dtype=np.float32)
+        if len(prices) == 0:
+            return out
+        col = 0
+        for indicator in self._scalars:
+            out[:, col] = indicator.update_batch(prices)
+            col += 1
+        for indicator in self._bands:
+            out[:, col:col + 3] = indicator.update_batch(prices)
+            col += 3
+        self.count += len(prices)
+        return out
+
+
+def _rolling_mean(csum: np.ndarray, end: np.ndarray, window: int, ref: float, global_row: np.ndarray) -> np.ndarray:
+    start = np.maximum(end - window, 0)
+    mean = (csum[end] - csum[start]) / window + ref
+    mean[global_row < window - 1] = np.nan
+    return mean
+
+
+def _rolling_std(csum: np.ndarray, csq: np.ndarray, end: np.ndarray, window: int, global_row: np.ndarray) -> np.ndarray:
+    start = np.maximum(end - window, 0)
+    window_sum = csum[end] - csum[start]
+    window_sq = csq[end] - csq[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (window_sq - window_sum * window_sum / window) / (window - 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+    std[global_row < window - 1] = np.nan
+    return std
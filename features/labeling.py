@@ -1,5 +1,12 @@
+from typing import NamedTuple, Optional, Sequence, Union
+
+import numpy as np
 import pandas as pd
 
+from utils.instrumentation import instrument
+from utils.trading_session import index_to_ns
+
+@instrument()
 def create_up_down_label(
     data: pd.Series,
     window: str,
@@ -56,3 +63,239 @@ def create_up_down_label(
     # 8. 把 time 設為 index，回傳 label Series
     result = df_merged.set_index('time')['label']
     return result
+
+
+class ForwardLabels(NamedTuple):
+    """
+    多週期、多閾值的前瞻標註結果 (n = Tick 筆數, H = 週期數, K = 閾值數)。
+
+    Attributes:
+        index: 依時間排序後的 DatetimeIndex (長度 n)。
+        windows: 往後看的時間週期 (長度 H)。
+        thresholds: 漲跌幅閾值 (長度 K)。
+        labels: shape (n, H, K) 的 float32 陣列；1: 漲幅 > 閾值, 0: 否, NaN: 無有效未來成交。
+        future_time: shape (n, H) 的 int64 陣列，對應的未來成交時間 (奈秒)；無對應時為 -1。
+        future_price: shape (n, H) 的 float64 陣列，對應的未來成交價；無對應時為 NaN。
+        price_change: shape (n, H) 的 float64 陣列，(future_price - price) / price。
+    """
+    index: pd.DatetimeIndex
+    windows: list
+    thresholds: list
+    labels: np.ndarray
+    future_time: np.ndarray
+    future_price: np.ndarray
+    price_change: np.ndarray
+
+    def label_series(self, window: str, threshold: float) -> pd.Series:
+        """取出單一週期/閾值的標註，格式同 create_up_down_label。"""
+        h = self.windows.index(window)
+        k = self.thresholds.index(threshold)
+        return pd.Series(self.labels[:, h, k], index=self.index, name='label')
+
+
+@instrument()
+def create_forward_labels(
+    data: pd.Series,
+    windows: Sequence[str],
+    thresholds: Sequence[float],
+    session_id: Optional[np.ndarray] = None
+) -> ForwardLabels:
+    """
+    以 np.searchsorted 在排序後的 int64 時間戳上一次計算多個週期的未來成交價，
+    並對多個閾值產生 (n × 週期 × 閾值) 的標註張量。
+
+    未來成交的定義與 create_up_down_label 相同：時間 >= 當前時間 + window 的第一筆成交。
+    當未來時間點超出資料範圍，或 (有提供 session_id 時) 對應的成交已落在下一個交易時段，
+    標註為 NaN。
+
+    Args:
+        data: pandas.Series，index 必須是 DatetimeIndex，內容是收盤價 (price)。
+        windows: 往後看的時間列表 (e.g., ['1min', '5min', '30min'])。
+        thresholds: 漲跌幅閾值列表 (e.g., [0.0005, 0.001])。
+        session_id: 可選，與 data 對齊的交易時段編號 (e.g., process_time_series 輸出的
+            'session_id' 欄位)；提供時標註不會跨越時段收盤。
+
+    Returns:
+        ForwardLabels。
+    """
+    if not isinstance(data.index, pd.DatetimeIndex):
+        raise ValueError("Index 必須是 DatetimeIndex")
+
+    order = None
+    if not data.index.is_monotonic_increasing:
+        order = np.argsort(index_to_ns(data.index), kind='stable')
+        data = data.iloc[order]
+    index = data.index
+    ts = index_to_ns(index)
+    price = data.to_numpy(dtype=np.float64)
+    sessions = None
+    if session_id is not None:
+        sessions = np.asarray(session_id)
+        if order is not None:
+            sessions = sessions[order]
+
+    windows = list(windows)
+    thresholds = list(thresholds)
+    n, num_windows = len(ts), len(windows)
+    future_time = np.full((n, num_windows), -1, dtype=np.int64)
+    future_price = np.full((n, num_windows), np.nan)
+
+    for h, window in enumerate(windows):
+        target = ts + pd.Timedelta(window).value
+        matched = np.searchsorted(ts, target, side='left')
+        valid = matched < n
+        if sessions is not None:
+            valid[valid] &= sessions[matched[valid]] == sessions[valid]
+        rows = np.flatnonzero(valid)
+        future_time[rows, h] = ts[matched[rows]]
+        future_price[rows, h] = price[matched[rows]]
+
+    price_change = (future_price - price[:, None]) / price[:, None]
+    thresholds_arr = np.asarray(thresholds, dtype=np.float64)
+    labels = (price_change[:, :, None] > thresholds_arr[None, None, :]).astype(np.float32)
+    labels[np.isnan(price_change)] = np.nan
+
+    return ForwardLabels(index, windows, thresholds, labels, future_time, future_price, price_change)
+
+
+class TripleBarrierLabels(NamedTuple):
+    """
+    三重屏障標註結果 (n = Tick 筆數)。
+
+    Attributes:
+        index: 依時間排序後的 DatetimeIndex。
+        labels: float32 陣列；1: 先觸及上屏障 (停利), -1: 先觸及下屏障 (停損),
+            0: 兩者皆未觸及而到達時間屏障, NaN: 之後在同一時段內已無成交。
+        hit_time: int64 陣列，觸及屏障的成交時間 (奈秒)；無時為 -1。
+        returns: float64 陣列，觸及屏障時的報酬率 (hit_price - price) / price。
+    """
+    index: pd.DatetimeIndex
+    labels: np.ndarray
+    hit_time: np.ndarray
+    returns: np.ndarray
+
+
+def _first_hit(prices: np.ndarray, start: np.ndarray, stop: np.ndarray, barrier: np.ndarray, upper: bool) -> np.ndarray:
+    """
+    對每筆查詢找出 prices[start:stop+1] 中第一個觸及 barrier 的位置 (上屏障: >=, 下屏障: <=)，
+    未觸及時回傳 stop + 1。
+
+    以 sparse table (區間最大/最小值) 搭配由大到小的二進位跳躍，所有查詢同時向量化處理，
+    每筆查詢只需 O(log k) (k 為時間屏障內的 Tick 數)。
+    """
+    reduce = np.maximum if upper else np.minimum
+    max_span = int((stop - start + 1).max(initial=0))
+    if max_span <= 0:
+        return stop + 1
+
+    levels = [prices]
+    while (1 << len(levels)) <= max_span:
+        half = 1 << (len(levels) - 1)
+        previous = levels[-1]
+        levels.append(reduce(previous[:-half], previous[half:]))
+
+    cur = start.copy()
+    for k in range(len(levels) - 1, -1, -1):
+        width = 1 << k
+        can_jump = cur + width - 1 <= stop
+        rows = np.flatnonzero(can_jump)
+        block = levels[k][cur[rows]]
+        not_hit = block < barrier[rows] if upper else block > barrier[rows]
+        cur[rows[not_hit]] += width
+    return cur
+
+
+@instrument()
+def create_triple_barrier_labels(
+    data: pd.Series,
+    horizon: str,
+    upper: Union[float, np.ndarray],
+    lower: Union[float, np.ndarray],
+    volatility: Optional[np.ndarray] = None,
+    session_id: Optional[np.ndarray] = None,
+    chunk_size: int = 1_000_000
+) -> TripleBarrierLabels:
+    """
+    三重屏障標註：上屏障 (停利)、下屏障 (停損) 與時間屏障 (t + horizon)，
+    依路徑上先觸及的屏障標記。
+
+    屏障價格為 price * (1 + upper) 與 price * (1 - lower)；若提供 volatility，
+    則改為 price * (1 + upper * volatility) 與 price * (1 - lower * volatility)。
+    時間屏障為 t + horizon 之前 (含) 的最後一筆成交；有提供 session_id 時，
+    路徑不會超過該時段的最後一筆成交。
+
+    Args:
+        data: pandas.Series，index 必須是 DatetimeIndex，內容是收盤價 (price)。
+        horizon: 時間屏障長度 (e.g., '30min')。
+        upper: 上屏障報酬率 (純量或與 data 對齊的陣列)。
+        lower: 下屏障報酬率 (正數，純量或陣列)。
+        volatility: 可選，與 data 對齊的波動率陣列，用於縮放上下屏障。
+        session_id: 可選，與 data 對齊的交易時段編號。
+        chunk_size: 每次處理的查詢筆數 (控制 sparse table 的記憶體用量)。
+
+    Returns:
+        TripleBarrierLabels。
+    """
+    if not isinstance(data.index, pd.DatetimeIndex):
+        raise ValueError("Index 必須是 DatetimeIndex")
+
+    n = len(data)
+    upper = np.broadcast_to(np.asarray(upper, dtype=np.float64), (n,))
+    lower = np.broadcast_to(np.asarray(lower, dtype=np.float64), (n,))
+    if volatility is not None:
+        volatility = np.asarray(volatility, dtype=np.float64)
+        upper = upper * volatility
+        lower = lower * volatility
+
+    order = None
+    if not data.index.is_monotonic_increasing:
+        order = np.argsort(index_to_ns(data.index), kind='stable')
+        data = data.iloc[order]
+        upper, lower = upper[order], lower[order]
+    index = data.index
+    ts = index_to_ns(index)
+    price = data.to_numpy(dtype=np.float64)
+
+    # 時間屏障：t + horizon 之前 (含) 的最後一筆，並限制在同一交易時段內
+    vertical = np.searchsorted(ts, ts + pd.Timedelta(horizon).value, side='right') - 1
+    if session_id is not None:
+        sessions = np.asarray(session_id)
+        if order is not None:
+            sessions = sessions[order]
+        session_end = np.r_[np.flatnonzero(sessions[1:] != sessions[:-1]), n - 1]
+        session_last = np.repeat(session_end, np.diff(np.r_[-1, session_end]))
+        vertical = np.minimum(vertical, session_last)
+
+    upper_price = price * (1.0 + upper)
+    lower_price = price * (1.0 - lower)
+    hit = np.full(n, -1, dtype=np.int64)
+    labels = np.full(n, np.nan, dtype=np.float32)
+
+    for a in range(0, n, chunk_size):
+        b = min(a + chunk_size, n)
+        stop = vertical[a:b]
+        window_end = int(stop.max()) + 1
+        start = np.arange(1, b - a + 1)
+        local_stop = stop - a
+        local_prices = price[a:window_end]
+
+        up = _first_hit(local_prices, start, local_stop, upper_price[a:b], upper=True)
+        down = _first_hit(local_prices, start, local_stop, lower_price[a:b], upper=False)
+
+        has_path = local_stop >= start
+        up_first = has_path & (up <= local_stop) & (up <= down)
+        down_first = has_path & (down <= local_stop) & (down < up)
+        timeout = has_path & ~up_first & ~down_first
+
+        chunk_hit = np.where(up_first, up, np.where(down_first, down, local_stop)) + a
+        chunk_labels = np.select([up_first, down_first, timeout], [1.0, -1.0, 0.0], np.nan)
+        hit[a:b] = np.where(has_path, chunk_hit, -1)
+        labels[a:b] = chunk_labels
+
+    valid = hit >= 0
+    hit_time = np.full(n, -1, dtype=np.int64)
+    hit_time[valid] = ts[hit[valid]]
+    returns = np.full(n, np.nan)
+    returns[valid] = (price[hit[valid]] - price[valid]) / price[valid]
+
+    return TripleBarrierLabels(index, labels, hit_time, returns)
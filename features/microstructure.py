@@ -0,0 +1,320 @@
+"""
+Tick 層級的市場微結構特徵 (以時間為窗口)。
+
+每個窗口 w (e.g., '1s'、'10s'、'60s') 在每筆 Tick 上計算 (t - w, t] 內的：
+    IMBALANCE_w : 成交方向不平衡 Σ(sign·v) / Σv，sign 以 tick rule 判斷
+                  (價格上漲為 +1、下跌為 -1、不變沿用前一個方向)。
+    VWAP_DEV_w  : 價格相對窗口 VWAP 的偏離 price / VWAP - 1。
+    RVOL_w      : 成交量加權的已實現波動 sqrt(Σ(v·r²) / Σv)，r 為逐筆對數報酬。
+    TICK_RATE_w : 每秒成交筆數。
+另有 TIME_SINCE_LAST：與前一筆成交的間隔 (秒)。
+窗口內成交量為 0 時 IMBALANCE / VWAP_DEV / RVOL 為 NaN。
+
+批次計算以 searchsorted 求每筆 Tick 的窗口起點 (時間戳已排序，等同雙指標)，窗口總和由
+累積和相減取得，因此每個窗口的成本為 O(n)，與窗口內的筆數無關；資料分塊處理
+(每塊往前重疊 max_window 時間的資料)，暫存記憶體只與 chunk_size 成正比。
+StreamingMicrostructure 為逐筆版本，供即時推論使用。
+"""
+import math
+from collections import deque
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from features.feature_set import FeatureMatrix
+from utils.instrumentation import instrument
+from utils.trading_session import index_to_ns
+
+DEFAULT_WINDOWS = ('1s', '10s', '60s')
+DEFAULT_CHUNK_SIZE = 2_000_000
+NS_PER_SECOND = 1_000_000_000
+
+
+def tick_rule_signs(price: np.ndarray, new_session: Optional[np.ndarray] = None, initial: int = 0) -> np.ndarray:
+    """
+    以 tick rule 判斷每筆成交的方向 (int8：+1 / -1，尚無價格變動時為 0)。
+
+    Args:
+        price: 依時間排序的成交價。
+        new_session: 可選的布林陣列，True 的位置重新開始判斷 (方向歸零)。
+        initial: price[0] 之前最後一個方向 (分塊計算時由前一塊接續)。
+    """
+    n = len(price)
+    change = np.zeros(n, dtype=np.int8)
+    change[1:] = np.sign(np.diff(price))
+    marker = change != 0
+    if new_session is not None:
+        change[new_session] = 0
+        marker |= new_session
+    last = np.maximum.accumulate(np.where(marker, np.arange(n), -1))
+    return np.where(last >= 0, change[np.maximum(last, 0)], np.int8(initial)).astype(np.int8)
+
+
+class MicrostructureFeatures:
+    """
+    微結構特徵組合。
+
+    Args:
+        windows: 時間窗口 (pandas Timedelta 字串，e.g., '1s'、'500ms'、'1min')。
+
+    Example:
+        ms = MicrostructureFeatures(['1s', '10s', '60s'])
+        features = ms.compute(df.index, df['close'], df['volume'], df['session_id'])
+    """
+
+    def __init__(self, windows: Sequence[str] = DEFAULT_WINDOWS):
+        if not windows:
+            raise ValueError("至少需要一個窗口")
+        self.windows = list(windows)
+        self.windows_ns = [pd.Timedelta(w).value for w in self.windows]
+        if min(self.windows_ns) <= 0:
+            raise ValueError("窗口必須大於 0")
+
+    @property
+    def columns(self) -> list:
+        names = []
+        for prefix in ('IMBALANCE', 'VWAP_DEV', 'RVOL', 'TICK_RATE'):
+            names += [f'{prefix}_{w}' for w in self.windows]
+        return names + ['TIME_SINCE_LAST']
+
+    @property
+    def max_window_ns(self) -> int:
+        return max(self.windows_ns)
+
+    @instrument()
+    def compute(
+        self,
+        timestamp,
+        price,
+        volume,
+        session_id=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        out: Optional[np.ndarray] = None
+    ) -> FeatureMatrix:
+        """
+        計算所有特徵。
+
+        Args:
+            timestamp: 依時間排序的時間戳 (DatetimeIndex、datetime64 或 int64 奈秒)。
+            price: 成交價 (不可含 NaN)。
+            volume: 成交量。
+            session_id: 可選的交易時段編號；提供時窗口、報酬、tick rule 與成交間隔都不跨越時段。
+            chunk_size: 每塊處理的筆數。
+            out: 可選的預先配置輸出陣列 (shape (n, k)、float32)。
+
+        Returns:
+            FeatureMatrix；warmup 為 True 表示該筆距資料 (或時段) 開始不足最大窗口的時間。
+        """
+        ts = _as_ns(timestamp)
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        sid = None if session_id is None else np.asarray(session_id)
+        n = len(ts)
+        columns = self.columns
+        if out is None:
+            out = np.empty((n, len(columns)), dtype=np.float32)
+        elif out.shape != (n, len(columns)):
+            raise ValueError(f"out 的 shape 必須是 {(n, len(columns))}")
+        warmup = np.empty(n, dtype=bool)
+        if n == 0:
+            return FeatureMatrix(out, columns, warmup)
+
+        # tick rule 的方向可能沿用很久以前的價格變動，先對整段資料分塊計算 (int8)
+        sign = np.empty(n, dtype=np.int8)
+        carry = 0
+        for a in range(0, n, chunk_size):
+            b = min(a + chunk_size, n)
+            s = max(a - 1, 0)
+            new_session = _new_sessions(sid, s, b)
+            # 重疊的前一筆沿用 carry，不視為新時段
+            new_session[0] = a == 0
+            chunk_sign = tick_rule_signs(price[s:b], new_session, carry)
+            sign[a:b] = chunk_sign[a - s:]
+            carry = int(sign[b - 1])
+
+        for a in range(0, n, chunk_size):
+            b = min(a + chunk_size, n)
+            # 往前重疊最大窗口的資料，並多取一筆作為報酬與成交間隔的前一筆
+            lo = int(np.searchsorted(ts, ts[a] - self.max_window_ns, side='right'))
+            s = max(min(lo, a) - 1, 0)
+            self._compute_block(ts[s:b], price[s:b], volume[s:b], sign[s:b], _new_sessions(sid, s, b),
+                                a - s, out[a:b], warmup[a:b])
+        return FeatureMatrix(out, columns, warmup)
+
+    def _compute_block(self, ts, price, volume, sign, new_session, lead: int, out: np.ndarray, warmup: np.ndarray):
+        """計算 [lead:] 列的特徵 (前 lead 列只作為窗口的歷史資料)；區塊第一列視為新時段的開始。"""
+        n = len(ts)
+        rows = np.arange(lead, n)
+        log_price = np.log(price)
+        returns = np.zeros(n)
+        returns[1:] = np.diff(log_price)
+        returns[new_session] = 0.0
+        gap = np.empty(n)
+        gap[0] = np.nan
+        gap[1:] = np.diff(ts) / NS_PER_SECOND
+        gap[new_session] = np.nan
+
+        ref = price[0]
+        cv = np.concatenate([[0.0], np.cumsum(volume)])
+        csv = np.concatenate([[0.0], np.cumsum(sign * volume)])
+        cpv = np.concatenate([[0.0], np.cumsum(volume * (price - ref))])
+        crv = np.concatenate([[0.0], np.cumsum(volume * returns * returns)])
+        session_first = np.maximum.accumulate(np.where(new_session, np.arange(n), 0))[lead:]
+
+        k = len(self.windows)
+        now = ts[lead:]
+        price_now = price[lead:]
+        # 窗口終點固定為目前這筆，以切片取代索引
+        v_end, sv_end, pv_end, rv_end = cv[lead + 1:], csv[lead + 1:], cpv[lead + 1:], crv[lead + 1:]
+        # 窗口內成交量為 0 時各累積和的差恰為 0，0 / 0 直接得到 NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i, w in enumerate(self.windows_ns):
+                start = np.searchsorted(ts, now - w, side='right')
+                np.maximum(start, session_first, out=start)
+                sum_v = v_end - cv[start]
+                out[:, i] = (sv_end - csv[start]) / sum_v
+                vwap_dev = (pv_end - cpv[start]) / sum_v
+                vwap_dev += ref
+                np.divide(price_now, vwap_dev, out=vwap_dev)
+                vwap_dev -= 1.0
+                out[:, k + i] = vwap_dev
+                sum_rv = rv_end - crv[start]
+                np.maximum(sum_rv, 0.0, out=sum_rv)
+                sum_rv /= sum_v
+                out[:, 2 * k + i] = np.sqrt(sum_rv, out=sum_rv)
+                out[:, 3 * k + i] = (rows + 1 - start) / (w / NS_PER_SECOND)
+        out[:, 4 * k] = gap[lead:]
+        warmup[:] = now - ts[session_first] < self.max_window_ns
+
+    def streaming(self) -> 'StreamingMicrostructure':
+        """建立同一組特徵的逐筆計算器。"""
+        return StreamingMicrostructure(self)
+
+
+def _as_ns(timestamp) -> np.ndarray:
+    if isinstance(timestamp, pd.DatetimeIndex):
+        return index_to_ns(timestamp)
+    values = np.asarray(timestamp)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view(np.int64)
+    return values.astype(np.int64, copy=False)
+
+
+def _new_sessions(sid: Optional[np.ndarray], start: int, stop: int) -> np.ndarray:
+    """區塊 [start, stop) 中每列是否為新時段的開始 (區塊第一列一律為 True)。"""
+    new_session = np.zeros(stop - start, dtype=bool)
+    new_session[0] = True
+    if sid is not None:
+        block = sid[start:stop]
+        new_session[1:] = block[1:] != block[:-1]
+    return new_session
+
+
+class StreamingMicrostructure:
+    """
+    MicrostructureFeatures 的逐筆版本：每個窗口以 deque 保存窗口內的成交並維護累計和，
+    新成交加入時移除已離開窗口的舊成交 (攤銷 O(1))。輸出欄位順序與 MicrostructureFeatures.columns 相同。
+
+    Args:
+        features: 特徵組合。
+
+    Example:
+        ms = MicrostructureFeatures(['1s', '10s']).streaming()
+        row = ms.update(tick.timestamp, tick.price, tick.volume)
+    """
+
+    # 每隔多少筆由 deque 重新計算累計和，避免長時間加減造成的浮點誤差累積
+    REFRESH_EVERY = 100_000
+
+    def __init__(self, features: MicrostructureFeatures):
+        self.columns = features.columns
+        self.windows_ns = list(features.windows_ns)
+        self.max_window_ns = features.max_window_ns
+        self.reset()
+
+    def reset(self):
+        """清除狀態 (e.g., 新時段開始)。"""
+        self._queues = [deque() for _ in self.windows_ns]
+        # 每個窗口的 [Σv, Σsign·v, Σv·(p - ref), Σv·r²]
+        self._sums = [[0.0, 0.0, 0.0, 0.0] for _ in self.windows_ns]
+        self._ref = None
+        self._last_ts = None
+        self._last_price = None
+        self._sign = 0
+        self._session = None
+        self._first_ts = None
+        self._updates = 0
+
+    @property
+    def ready(self) -> bool:
+        """最新一筆是否已離開暖機期 (對應 FeatureMatrix.warmup 為 False)。"""
+        return self._last_ts is not None and self._last_ts - self._first_ts >= self.max_window_ns
+
+    def _refresh(self):
+        for queue, sums in zip(self._queues, self._sums):
+            if queue:
+                values = np.array([entry[1:] for entry in queue])
+                sums[:] = values.sum(axis=0).tolist()
+            else:
+                sums[:] = [0.0, 0.0, 0.0, 0.0]
+        self._updates = 0
+
+    def update(self, timestamp: int, price: float, volume: float, session_id=None,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        加入一筆成交並回傳最新的特徵列。
+
+        Args:
+            timestamp: int64 奈秒時間戳 (需遞增)。
+            price: 成交價。
+            volume: 成交量。
+            session_id: 可選的交易時段編號；與前一筆不同時狀態會重設。
+            out: 可選的輸出陣列 (長度為欄位數、float32)。
+        """
+        if out is None:
+            out = np.empty(len(self.columns), dtype=np.float32)
+        if session_id is not None and session_id != self._session:
+            self.reset()
+            self._session = session_id
+
+        volume = float(volume)
+        if self._last_price is None:
+            self._ref = price
+            self._first_ts = timestamp
+            gap = np.nan
+            ret = 0.0
+        else:
+            gap = (timestamp - self._last_ts) / NS_PER_SECOND
+            ret = math.log(price / self._last_price)
+            if price > self._last_price:
+                self._sign = 1
+            elif price < self._last_price:
+                self._sign = -1
+        entry = (timestamp, volume, self._sign * volume, volume * (price - self._ref), volume * ret * ret)
+        self._last_ts, self._last_price = timestamp, price
+
+        k = len(self.windows_ns)
+        for i, (w, queue, sums) in enumerate(zip(self.windows_ns, self._queues, self._sums)):
+            queue.append(entry)
+            for j in range(4):
+                sums[j] += entry[j + 1]
+            cutoff = timestamp - w
+            while queue[0][0] <= cutoff:
+                old = queue.popleft()
+                for j in range(4):
+                    sums[j] -= old[j + 1]
+            sum_v = sums[0]
+            if sum_v > 0:
+                out[i] = sums[1] / sum_v
+                out[k + i] = price / (self._ref + sums[2] / sum_v) - 1.0
+                out[2 * k + i] = (max(sums[3], 0.0) / sum_v) ** 0.5
+            else:
+                out[i] = out[k + i] = out[2 * k + i] = np.nan
+            out[3 * k + i] = len(queue) / (w / NS_PER_SECOND)
+        out[4 * k] = gap
+
+        self._updates += 1
+        if self._updates >= self.REFRESH_EVERY:
+            self._refresh()
+        return out
@@ -0,0 +1,373 @@
+"""
+技術指標的串流 (逐筆更新) 版本。
+
+每個指標物件維護自身狀態，update() 以 O(1) 處理一筆新 Tick，
+update_batch() 以向量化方式處理一小批 Tick；輸出與 features/feature_engineering.py
+中對應的批次函數在浮點誤差範圍內一致。get_state() / from_state() 可將狀態序列化
+(JSON 相容)，讓程序重啟時接續先前的計算。
+NaN 輸入的處理與 pandas 相同：rolling 指標在窗口內有 NaN 時輸出 NaN、NaN 離開窗口後恢復；
+EMA 略過 NaN (輸出前一個值)，之後的觀測值依間隔的筆數衰減舊值的權重 (ewm 的 ignore_na=False)。
+"""
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+class StreamingIndicator(ABC):
+    """串流指標的共同介面；未實作全部方法的子類別無法建立實例。"""
+
+    @abstractmethod
+    def update(self, value: float):
+        """加入一筆資料並回傳最新的指標值。"""
+
+    @abstractmethod
+    def update_batch(self, values) -> np.ndarray:
+        """依序加入一批資料，回傳每筆對應的指標值。"""
+
+    @abstractmethod
+    def get_state(self) -> dict:
+        """回傳可序列化 (JSON 相容) 的狀態。"""
+
+    @classmethod
+    @abstractmethod
+    def from_state(cls, state: dict) -> 'StreamingIndicator':
+        """由 get_state() 的結果還原指標。"""
+
+
+class _RollingWindow(StreamingIndicator):
+    """以 deque 作為環狀緩衝區，維護最近 window 筆資料的平均與離差平方和 (Welford)。"""
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window 必須 >= 1")
+        self.window = window
+        self.buffer = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 緩衝區中有限值與 NaN 的筆數 (統計量只涵蓋有限值)
+        self.count = 0
+        self.nan_count = 0
+        self._updates_since_refresh = 0
+
+    @property
+    def ready(self) -> bool:
+        """窗口已滿且不含 NaN (對應 rolling(window) 的 min_periods=window)。"""
+        return len(self.buffer) == self.window and self.nan_count == 0
+
+    def _refresh(self):
+        """由緩衝區重新計算統計量，避免長時間累積的浮點誤差。"""
+        values = np.fromiter(self.buffer, dtype=np.float64, count=len(self.buffer))
+        values = values[~np.isnan(values)]
+        self.count = len(values)
+        self.nan_count = len(self.buffer) - self.count
+        if self.count == 0:
+            self.mean, self.m2 = 0.0, 0.0
+        else:
+            self.mean = float(values.mean())
+            self.m2 = float(((values - self.mean) ** 2).sum())
+        self._updates_since_refresh = 0
+
+    def _add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x: float):
+        n = self.count
+        if n == 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.mean = (n * old_mean - x) / (n - 1)
+        self.m2 -= (x - old_mean) * (x - self.mean)
+        if self.m2 < 0.0:
+            self.m2 = 0.0
+        self.count = n - 1
+
+    def _push(self, x: float):
+        buffer = self.buffer
+        finite = x == x
+        if len(buffer) == self.window:
+            old = buffer[0]
+            if old != old:
+                self.nan_count -= 1
+                buffer.append(x)
+                if finite:
+                    self._add(x)
+                else:
+                    self.nan_count += 1
+            elif finite:
+                # 同時移出與加入 (筆數不變) 的 Welford 更新
+                buffer.append(x)
+                n = self.count
+                old_mean = self.mean
+                self.mean = old_mean + (x - old) / n
+                self.m2 += (x - old) * (x - self.mean + old - old_mean)
+                if self.m2 < 0.0:
+                    self.m2 = 0.0
+            else:
+                buffer.append(x)
+                self._remove(old)
+                self.nan_count += 1
+        else:
+            buffer.append(x)
+            if finite:
+                self._add(x)
+            else:
+                self.nan_count += 1
+        self._updates_since_refresh += 1
+        if self._updates_since_refresh >= self.window * 64:
+            self._refresh()
+
+    def _rolling_batch(self, values: np.ndarray) -> tuple:
+        """
+        以「緩衝區 + 新資料」的累積和一次計算整批的滾動平均與 (ddof=1) 標準差。
+        回傳 (mean, std)，窗口未滿或含 NaN 的位置為 NaN。
+        """
+        history = np.fromiter(self.buffer, dtype=np.float64, count=len(self.buffer))
+        combined = np.concatenate([history, values])
+        missing = np.isnan(combined)
+        finite = combined[~missing]
+        ref = finite[0] if len(finite) else 0.0
+        shifted = np.where(missing, 0.0, combined - ref)
+        csum = np.concatenate([[0.0], np.cumsum(shifted)])
+        csq = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+        cnan = np.concatenate([[0], np.cumsum(missing)])
+
+        w = self.window
+        end = np.arange(len(history) + 1, len(combined) + 1)
+        start = np.maximum(end - w, 0)
+        count = end - start
+        window_sum = csum[end] - csum[start]
+        window_sq = csq[end] - csq[start]
+        mean = window_sum / count + ref
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = (window_sq - window_sum * window_sum / count) / (count - 1)
+        std = np.sqrt(np.maximum(var, 0.0))
+        # 窗口未滿或含 NaN 的位置為 NaN
+        warm = (count < w) | (cnan[end] > cnan[start])
+        mean[warm] = np.nan
+        std[warm] = np.nan
+
+        self.buffer.extend(values.tolist())
+        self._refresh()
+        return mean, std
+
+    def _base_state(self) -> dict:
+        return {'window': self.window, 'buffer': list(self.buffer)}
+
+    def _load_buffer(self, buffer):
+        self.buffer.extend(float(x) for x in buffer)
+        self._refresh()
+
+
+class StreamingSMA(_RollingWindow):
+    """
+    串流簡單移動平均，對應 calculate_sma (rolling(window).mean())。
+
+    Args:
+        window: 計算 SMA 的窗口大小。
+    """
+
+    def update(self, value: float) -> float:
+        self._push(float(value))
+        return self.mean if self.ready else math.nan
+
+    def update_batch(self, values) -> np.ndarray:
+        mean, _ = self._rolling_batch(np.asarray(values, dtype=np.float64))
+        return mean
+
+    def get_state(self) -> dict:
+        return self._base_state()
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StreamingSMA':
+        indicator = cls(state['window'])
+        indicator._load_buffer(state['buffer'])
+        return indicator
+
+
+class StreamingBollingerBands(_RollingWindow):
+    """
+    串流布林通道，對應 calculate_bollinger_bands (樣本標準差, ddof=1)。
+    滑動窗口的變異數以 Welford 演算法更新。
+
+    Args:
+        window: 計算移動平均和標準差的窗口大小 (預設為 20)。
+        num_std_dev: 標準差的倍數 (預設為 2)。
+    """
+
+    def __init__(self, window: int = 20, num_std_dev: float = 2):
+        super().__init__(window)
+        self.num_std_dev = num_std_dev
+
+    def update(self, value: float) -> tuple:
+        """回傳 (中軌, 上軌, 下軌)。"""
+        self._push(float(value))
+        if not self.ready or self.window < 2:
+            return (self.mean if self.ready else math.nan), math.nan, math.nan
+        band = math.sqrt(self.m2 / (self.window - 1)) * self.num_std_dev
+        return self.mean, self.mean + band, self.mean - band
+
+    def update_batch(self, values) -> np.ndarray:
+        """回傳 shape 為 (n, 3) 的陣列，欄位依序為中軌、上軌、下軌。"""
+        mean, std = self._rolling_batch(np.asarray(values, dtype=np.float64))
+        band = std * self.num_std_dev
+        return np.column_stack([mean, mean + band, mean - band])
+
+    def get_state(self) -> dict:
+        state = self._base_state()
+        state['num_std_dev'] = self.num_std_dev
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StreamingBollingerBands':
+        indicator = cls(state['window'], state['num_std_dev'])
+        indicator._load_buffer(state['buffer'])
+        return indicator
+
+
+def ewm_continue(values: np.ndarray, alpha: float, previous, gap: int = 0) -> np.ndarray:
+    """
+    以 pandas ewm(adjust=False) 遞迴計算一批資料的 EMA；previous 為上一筆 EMA 值
+    (None 表示尚未初始化)，將其置於序列開頭即可接續遞迴。
+    gap 為 previous 之後已經過的 NaN 筆數 (以同樣數量的 NaN 接在 previous 之後，權重衰減與 pandas 一致)。
+    """
+    if previous is None:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    seeded = np.concatenate([[previous], np.full(gap, np.nan), values])
+    return pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1 + gap:]
+
+
+class StreamingEMA(StreamingIndicator):
+    """
+    串流指數移動平均，對應 calculate_ema (ewm(span=window, adjust=False))。
+
+    Args:
+        window: 計算 EMA 的窗口大小 (span)。
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.alpha = 2.0 / (window + 1.0)
+        self.value = None
+        # 上一個觀測值之後連續 NaN 的筆數
+        self.gap = 0
+
+    def update(self, value: float) -> float:
+        x = float(value)
+        if x != x:
+            if self.value is None:
+                return math.nan
+            self.gap += 1
+            return self.value
+        if self.value is None:
+            self.value = x
+        elif self.gap:
+            # NaN 之後的第一個觀測值 (少見)：交由 pandas 計算，確保權重衰減與 calculate_ema 完全一致
+            self.value = float(ewm_continue(np.array([x]), self.alpha, self.value, self.gap)[-1])
+        else:
+            self.value += self.alpha * (x - self.value)
+        self.gap = 0
+        return self.value
+
+    def update_batch(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        result = ewm_continue(values, self.alpha, self.value, self.gap)
+        observed = np.flatnonzero(~np.isnan(values))
+        if len(observed):
+            self.value = float(result[-1])
+            self.gap = len(values) - 1 - int(observed[-1])
+        elif self.value is not None:
+            self.gap += len(values)
+        return result
+
+    def get_state(self) -> dict:
+        return {'window': self.window, 'value': self.value, 'gap': self.gap}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StreamingEMA':
+        indicator = cls(state['window'])
+        indicator.value = state['value']
+        indicator.gap = state.get('gap', 0)
+        return indicator
+
+
+class StreamingRSI(StreamingIndicator):
+    """
+    串流相對強弱指數，對應 calculate_rsi。
+
+    平均漲幅/跌幅採用與 calculate_rsi 相同的遞迴平滑 (ewm(span=window, adjust=False))，
+    以確保兩者輸出一致。
+
+    Args:
+        window: 計算 RSI 的窗口大小 (預設為 14)。
+    """
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.alpha = 2.0 / (window + 1.0)
+        self.last_price = None
+        self.avg_gain = None
+        self.avg_loss = None
+
+    @staticmethod
+    def _rsi(avg_gain: float, avg_loss: float) -> float:
+        if avg_loss == 0.0:
+            return math.nan if avg_gain == 0.0 else 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def update(self, value: float) -> float:
+        x = float(value)
+        if self.last_price is None:
+            # 第一筆沒有價差，calculate_rsi 中對應的 gain/loss 皆為 0
+            self.last_price = x
+            self.avg_gain = 0.0
+            self.avg_loss = 0.0
+            return math.nan
+        delta = x - self.last_price
+        self.last_price = x
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.avg_gain += self.alpha * (gain - self.avg_gain)
+        self.avg_loss += self.alpha * (loss - self.avg_loss)
+        return self._rsi(self.avg_gain, self.avg_loss)
+
+    def update_batch(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        if self.last_price is None:
+            delta = np.diff(values, prepend=values[0])
+        else:
+            delta = np.diff(values, prepend=self.last_price)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+
+        avg_gain = ewm_continue(gain, self.alpha, self.avg_gain)
+        avg_loss = ewm_continue(loss, self.alpha, self.avg_loss)
+        self.last_price = float(values[-1])
+        self.avg_gain = float(avg_gain[-1])
+        self.avg_loss = float(avg_loss[-1])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        return rsi
+
+    def get_state(self) -> dict:
+        return {'window': self.window, 'last_price': self.last_price,
+                'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StreamingRSI':
+        indicator = cls(state['window'])
+        indicator.last_price = state['last_price']
+        indicator.avg_gain = state['avg_gain']
+        indicator.avg_loss = state['avg_loss']
+        return indicator
@@ -0,0 +1,334 @@
+"""
+批次模型推論引擎。
+
+模型只載入一次，特徵欄位的順序在建立時固定，輸入一律整理成 C 連續的 float32 區塊：
+    * 已是 float32 連續陣列 (e.g., FeatureSet.compute 的輸出) 的資料直接以 slice 送入模型，不複製；
+    * 其他型態 (DataFrame、dict、欄位順序不同的 FeatureMatrix) 逐區塊複製到預先配置的緩衝區，
+      不建立新的 DataFrame；
+    * XGBoost 模型以 Booster.inplace_predict 直接讀取 NumPy 陣列 (不建立 DMatrix)；
+    * 大批次可切成 batch_size 的區塊交給執行緒池 (模型呼叫會釋放 GIL 時有效)。
+每次呼叫的延遲與每個區塊的延遲以 LatencyHistogram 記錄，stats() 另提供每秒筆數。
+
+    engine = InferenceEngine.from_file('models/fold_010.json', feature_set=fs)
+    score = engine.predict(fs.compute(df['close']))      # 整批
+    for score in engine.predict_stream(chunks):          # 逐塊 Tick (特徵狀態跨塊接續)
+        ...
+"""
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from features.feature_set import FeatureMatrix, FeatureSet
+from utils.realtime_service import LatencyHistogram, _score_function
+
+XGBOOST_EXTENSIONS = ('.json', '.ubj', '.model', '.bin')
+DEFAULT_BATCH_SIZE = 65_536
+
+
+def load_model(path: str):
+    """
+    載入模型：XGBoost 的 .json/.ubj/.model/.bin 檔載入為 Booster，其他副檔名以 pickle 載入
+    (e.g., scikit-learn 模型)。
+    """
+    if os.path.splitext(path)[1].lower() in XGBOOST_EXTENSIONS:
+        booster = xgb.Booster()
+        booster.load_model(path)
+        return booster
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def model_columns(model) -> Optional[list]:
+    """模型訓練時記錄的特徵名稱 (Booster.feature_names 或 scikit-learn 的 feature_names_in_)，沒有則為 None。"""
+    if isinstance(model, xgb.Booster):
+        names = model.feature_names
+    elif hasattr(model, 'get_booster'):
+        names = model.get_booster().feature_names
+    else:
+        names = getattr(model, 'feature_names_in_', None)
+    return list(names) if names is not None else None
+
+
+def score_function(model) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    將模型轉為 (b, k) float32 -> (b,) 的函數。
+
+    XGBoost 的 Booster (與 XGBClassifier 等包裝) 使用 inplace_predict，binary:logistic 時輸出正類機率；
+    其他模型見 utils.realtime_service 的規則 (predict_proba 的正類機率、predict 或可呼叫物件)。
+    """
+    booster = model if isinstance(model, xgb.Booster) else None
+    if booster is None and hasattr(model, 'get_booster'):
+        booster = model.get_booster()
+    if booster is not None:
+        def score(x: np.ndarray) -> np.ndarray:
+            result = np.asarray(booster.inplace_predict(x))
+            return result[:, -1] if result.ndim == 2 else result
+        return score
+    return _score_function(model)
+
+
+class InferenceEngine:
+    """
+    載入一次、重複呼叫的批次推論引擎。
+
+    Args:
+        model: 已載入的模型 (見 score_function)。
+        columns: 模型輸入的特徵欄位順序；None 時依序取 feature_set.columns 或模型記錄的特徵名稱。
+        feature_set: 可選的特徵組合，predict_prices / predict_stream 以此由價格計算特徵。
+        batch_size: 每次模型呼叫最多的筆數 (也是預先配置緩衝區的列數)。
+        n_threads: 執行緒數；大於 1 時超過一個區塊的批次會平行計算
+            (XGBoost 本身已以多執行緒預測，通常維持 1 即可)。
+
+    Attributes:
+        columns: 固定的特徵欄位順序。
+        calls / rows / blocks: 累計的 predict 呼叫數、筆數與區塊數。
+        busy_s: 累計的推論時間 (秒)。
+        latency: {'call': 每次 predict 的延遲, 'block': 每個區塊的模型呼叫延遲}。
+    """
+
+    def __init__(
+        self,
+        model,
+        columns: Optional[Sequence[str]] = None,
+        feature_set: Optional[FeatureSet] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_threads: int = 1
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size 必須 >= 1")
+        trained = model_columns(model)
+        if columns is None:
+            columns = feature_set.columns if feature_set is not None else trained
+        if columns is None:
+            raise ValueError("無法得知特徵順序，請指定 columns 或 feature_set")
+        columns = list(columns)
+        if trained is not None and trained != columns:
+            raise ValueError(f"特徵順序與模型不一致：模型為 {trained}，輸入為 {columns}")
+        if feature_set is not None and feature_set.columns != columns:
+            raise ValueError("feature_set 的欄位與 columns 不一致")
+
+        self.model = model
+        self.columns = columns
+        self.feature_set = feature_set
+        self.batch_size = batch_size
+        self.n_threads = max(1, n_threads)
+        self.score = score_function(model)
+        self.calls = self.rows = self.blocks = 0
+        self.busy_s = 0.0
+        self.latency = {'call': LatencyHistogram(), 'block': LatencyHistogram()}
+        self._lock = threading.Lock()
+
+        # 每個執行緒一個輸入緩衝區，以佇列借還
+        self._buffers = queue.SimpleQueue()
+        for _ in range(self.n_threads):
+            self._buffers.put(np.empty((batch_size, len(columns)), dtype=np.float32))
+        self._pool = ThreadPoolExecutor(self.n_threads) if self.n_threads > 1 else None
+        self._feature_buffer = None
+        self._score_buffer = None
+        self._tail = np.empty(0, dtype=np.float64)
+        self._seen = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'InferenceEngine':
+        """以 load_model 載入模型並建立引擎；其他參數見 InferenceEngine。"""
+        return cls(load_model(path), **kwargs)
+
+    # ------------------------------------------------------------------
+    # 輸入整理
+    # ------------------------------------------------------------------
+    def _blocks_source(self, features) -> tuple:
+        """
+        回傳 (筆數, fill)：fill(start, stop, buffer) 傳回該區段的 (m, k) float32 連續陣列，
+        可直接使用原始資料時不複製，否則寫入 buffer。
+        """
+        k = len(self.columns)
+        if isinstance(features, FeatureMatrix):
+            if list(features.columns) == self.columns:
+                features = features.values
+            else:
+                position = {name: i for i, name in enumerate(features.columns)}
+                order = np.array([position[name] for name in self.columns])
+                values = features.values
+
+                def fill(start, stop, buffer):
+                    return np.take(values[start:stop], order, axis=1, out=buffer[:stop - start])
+                return len(values), fill
+
+        if isinstance(features, (pd.DataFrame, Mapping)):
+            missing = [name for name in self.columns if name not in features]
+            if missing:
+                raise KeyError(f"缺少特徵欄位：{missing}")
+            arrays = [np.asarray(features[name]) for name in self.columns]
+            n = len(arrays[0]) if arrays else 0
+
+            def fill(start, stop, buffer):
+                block = buffer[:stop - start]
+                for j, array in enumerate(arrays):
+                    block[:, j] = array[start:stop]
+                return block
+            return n, fill
+
+        values = np.asarray(features)
+        if values.ndim != 2 or values.shape[1] != k:
+            raise ValueError(f"特徵陣列的 shape 必須是 (n, {k})")
+        if values.dtype == np.float32 and values.flags.c_contiguous:
+            return len(values), lambda start, stop, buffer: values[start:stop]
+
+        def fill(start, stop, buffer):
+            block = buffer[:stop - start]
+            block[:] = values[start:stop]
+            return block
+        return len(values), fill
+
+    def _score_block(self, fill: Callable, start: int, stop: int, out: np.ndarray):
+        buffer = self._buffers.get()
+        try:
+            block = fill(start, stop, buffer)
+            started = time.perf_counter_ns()
+            out[start:stop] = self.score(block)
+            elapsed = time.perf_counter_ns() - started
+        finally:
+            self._buffers.put(buffer)
+        with self._lock:
+            self.latency['block'].record(np.array([elapsed]))
+
+    # ------------------------------------------------------------------
+    # 推論
+    # ------------------------------------------------------------------
+    def predict(self, features, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        對整批特徵推論。
+
+        Args:
+            features: (n, k) 陣列 (欄位順序為 self.columns)、FeatureMatrix、DataFrame 或
+                {欄位: 陣列} 的 dict (依欄位名稱對應)。
+            out: 可選的預先配置輸出陣列 (長度 n)。
+
+        Returns:
+            長度 n 的模型輸出 (out 有給時即為 out)。
+        """
+        started = time.perf_counter_ns()
+        n, fill = self._blocks_source(features)
+        if out is None:
+            out = np.empty(n, dtype=np.float32)
+        elif len(out) != n:
+            raise ValueError(f"out 的長度必須是 {n}")
+
+        bounds = [(start, min(start + self.batch_size, n)) for start in range(0, n, self.batch_size)]
+        if self._pool is not None and len(bounds) > 1:
+            list(self._pool.map(lambda b: self._score_block(fill, b[0], b[1], out), bounds))
+        else:
+            for start, stop in bounds:
+                self._score_block(fill, start, stop, out)
+
+        elapsed = time.perf_counter_ns() - started
+        with self._lock:
+            self.calls += 1
+            self.rows += n
+            self.blocks += len(bounds)
+            self.busy_s += elapsed / 1e9
+            self.latency['call'].record(np.array([elapsed]))
+        return out
+
+    def _require_feature_set(self) -> FeatureSet:
+        if self.feature_set is None:
+            raise ValueError("需要 feature_set 才能由價格計算特徵")
+        return self.feature_set
+
+    def predict_stream(self, prices: Iterable, reset: bool = False) -> Iterator[np.ndarray]:
+        """
+        逐塊由價格計算特徵並推論；每塊往前重疊 feature_set.halo_rows() 筆價格，
+        因此結果與一次計算整段資料相同 (EMA/RSI 的差異低於 halo_rows 的容忍度)。
+
+        Args:
+            prices: 逐塊的收盤價 (Series 或陣列)，不可含 NaN。
+            reset: 是否捨棄先前呼叫留下的價格狀態 (從新的序列開始)。
+
+        Yields:
+            每塊的模型輸出 (float32，暖機期內的列為 NaN)；緩衝區會在下一塊重複使用，需保留時請複製。
+        """
+        feature_set = self._require_feature_set()
+        halo = feature_set.halo_rows()
+        warmup_rows = feature_set.max_window - 1
+        if reset:
+            self._tail = np.empty(0, dtype=np.float64)
+            self._seen = 0
+        for chunk in prices:
+            chunk = np.asarray(chunk, dtype=np.float64)
+            if len(chunk) == 0:
+                continue
+            window = np.concatenate([self._tail, chunk]) if len(self._tail) else chunk
+            lead = len(window) - len(chunk)
+
+            m = len(window)
+            if self._feature_buffer is None or len(self._feature_buffer) < m:
+                self._feature_buffer = np.empty((m, len(self.columns)), dtype=np.float32)
+                self._score_buffer = np.empty(m, dtype=np.float32)
+            matrix = feature_set.compute(window, out=self._feature_buffer[:m])
+            score = self.predict(matrix.values[lead:], out=self._score_buffer[:len(chunk)])
+
+            warm = min(max(warmup_rows - self._seen, 0), len(chunk))
+            score[:warm] = np.nan
+            self._seen += len(chunk)
+            self._tail = window[-halo:] if halo else np.empty(0, dtype=np.float64)
+            yield score
+
+    def predict_prices(self, prices, chunk_size: int = 1_000_000) -> np.ndarray:
+        """
+        由整段收盤價計算特徵並推論 (分塊處理，特徵暫存記憶體只與 chunk_size 成正比)。
+
+        Returns:
+            長度與 prices 相同的 float32 模型輸出 (暖機期內的列為 NaN)。
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        out = np.empty(len(prices), dtype=np.float32)
+        chunks = (prices[start:start + chunk_size] for start in range(0, len(prices), chunk_size))
+        start = 0
+        for score in self.predict_stream(chunks, reset=True):
+            out[start:start + len(score)] = score
+            start += len(score)
+        return out
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        """累計的呼叫數、筆數、推論時間、每秒筆數與延遲摘要 (微秒)。"""
+        return {
+            'calls': self.calls,
+            'rows': self.rows,
+            'blocks': self.blocks,
+            'busy_s': self.busy_s,
+            'rows_per_s': self.rows / self.busy_s if self.busy_s > 0 else np.nan,
+            'latency': {name: hist.summary() for name, hist in self.latency.items()},
+        }
+
+    def latency_report(self) -> pd.DataFrame:
+        """每次呼叫與每個區塊的延遲摘要表，單位為微秒。"""
+        return pd.DataFrame({name: hist.summary() for name, hist in self.latency.items()}).T
+
+    def reset_stats(self):
+        self.calls = self.rows = self.blocks = 0
+        self.busy_s = 0.0
+        self.latency = {'call': LatencyHistogram(), 'block': LatencyHistogram()}
+
+    def close(self):
+        """關閉執行緒池。"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
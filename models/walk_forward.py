@@ -0,0 +1,269 @@
+"""
+Walk-Forward 訓練與評估 (XGBoost)。
+
+    1. 特徵矩陣 (FeatureSet.compute，與 features/feature_engineering.py 的指標一致) 與
+       create_forward_labels 的標註只計算一次；每折以 slice 取得連續列的 view，不複製特徵。
+    2. refit='full'：每折從頭訓練，各折互相獨立，以多程序平行執行；特徵、標註與
+       樣本外預測放在共享記憶體。
+    3. refit='warm_start'：依序接續上一折的模型 (xgb.train 的 xgb_model)，只以新進入訓練窗的
+       資料再訓練 warm_rounds 棵樹，省去每折從頭訓練的成本。
+切分方式 (交易時段邊界、purge/embargo) 見 utils/data_split.py。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from features.feature_set import FeatureSet
+from features.labeling import create_forward_labels
+from utils.data_split import Fold, walk_forward_splits
+from utils.evaluation import classification_metrics
+from utils.shared_memory import allocate_array, array_view, attach_array, share_array
+from utils.trading_session import index_to_ns
+
+DEFAULT_PARAMS = {
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss',
+    'tree_method': 'hist',
+    'max_depth': 6,
+    'eta': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+}
+REFIT_MODES = ('full', 'warm_start')
+
+
+class WalkForwardDataset(NamedTuple):
+    """
+    Attributes:
+        features: shape (n, k) 的 float32 特徵矩陣。
+        columns: 特徵欄位名稱。
+        labels: float32 標註 (1/0，未來找不到成交時為 NaN)。
+        timestamp: int64 奈秒時間戳。
+        session_id: 交易時段編號。
+        first_row: 第一個離開指標暖機期的列。
+        horizon: 標註往後看的時間。
+    """
+    features: np.ndarray
+    columns: list
+    labels: np.ndarray
+    timestamp: np.ndarray
+    session_id: np.ndarray
+    first_row: int
+    horizon: str
+
+
+class WalkForwardResult(NamedTuple):
+    """
+    Attributes:
+        folds: 各折的切分。
+        metrics: 每折一列的指標與耗時表。
+        predictions: 長度 n 的 float32 樣本外預測 (不在任何測試集內的列為 NaN)。
+    """
+    folds: list
+    metrics: pd.DataFrame
+    predictions: np.ndarray
+
+
+def build_dataset(
+    df: pd.DataFrame,
+    feature_set: FeatureSet,
+    window: str,
+    threshold: float,
+    price_column: str = 'close'
+) -> WalkForwardDataset:
+    """
+    一次計算整段資料的特徵矩陣與標註。
+
+    Args:
+        df: process_time_series 的輸出 (依時間排序、含 'session_id' 欄位)。
+        feature_set: 特徵組合。
+        window / threshold: 見 create_forward_labels (標註不跨越交易時段收盤)。
+        price_column: 價格欄位。
+
+    Returns:
+        WalkForwardDataset。
+    """
+    price = df[price_column]
+    matrix = feature_set.compute(price)
+    # 找不到未來成交或未來成交已落在下一個交易時段的位置為 NaN
+    labels = create_forward_labels(price, [window], [threshold], df['session_id'].to_numpy()).labels[:, 0, 0]
+    ts = index_to_ns(df.index)
+    return WalkForwardDataset(matrix.values, matrix.columns, labels, ts, df['session_id'].to_numpy(),
+                              int(matrix.warmup.sum()), window)
+
+
+def _dmatrix(features: np.ndarray, labels: np.ndarray, rows: slice, nthread: int) -> xgb.DMatrix:
+    y = labels[rows]
+    valid = ~np.isnan(y)
+    # 無標註的列以權重 0 保留，避免為了遮罩而複製特徵矩陣
+    return xgb.DMatrix(features[rows], label=np.where(valid, y, 0.0), weight=valid.astype(np.float32),
+                       nthread=nthread)
+
+
+def _run_fold(
+    features: np.ndarray,
+    labels: np.ndarray,
+    timestamp: np.ndarray,
+    predictions: np.ndarray,
+    fold: Fold,
+    params: dict,
+    rounds: int,
+    nthread: int,
+    booster: Optional[xgb.Booster] = None,
+    rows: Optional[slice] = None
+) -> tuple:
+    """訓練 (或接續訓練) 一折並在測試集上評估，回傳 (booster, 指標列)。"""
+    rows = fold.train if rows is None else rows
+    params = dict(params, nthread=nthread)
+    started = time.perf_counter()
+
+    trained_rows = 0
+    build_s = train_s = 0.0
+    if rows.stop > rows.start and rounds > 0:
+        dtrain = _dmatrix(features, labels, rows, nthread)
+        built = time.perf_counter()
+        booster = xgb.train(params, dtrain, num_boost_round=rounds, xgb_model=booster)
+        build_s, train_s = built - started, time.perf_counter() - built
+        trained_rows = rows.stop - rows.start
+    if booster is None:
+        raise ValueError(f"第 {fold.fold} 折沒有可訓練的資料")
+
+    predicted = time.perf_counter()
+    score = booster.predict(xgb.DMatrix(features[fold.test], nthread=nthread))
+    predictions[fold.test] = score
+    predict_s = time.perf_counter() - predicted
+
+    row = {
+        'fold': fold.fold,
+        'train_start': pd.Timestamp(timestamp[fold.train.start]) if fold.train.stop > fold.train.start else pd.NaT,
+        'train_end': pd.Timestamp(timestamp[fold.train.stop - 1]) if fold.train.stop > fold.train.start else pd.NaT,
+        'test_start': pd.Timestamp(timestamp[fold.test.start]),
+        'test_end': pd.Timestamp(timestamp[fold.test.stop - 1]),
+        'train_rows': fold.train.stop - fold.train.start,
+        'trained_rows': trained_rows,
+        'test_rows': fold.test.stop - fold.test.start,
+        'purged_rows': fold.purged,
+        'rounds': booster.num_boosted_rounds(),
+    }
+    row.update(classification_metrics(labels[fold.test], score))
+    row.update({'build_s': build_s, 'train_s': train_s, 'predict_s': predict_s,
+                'total_s': time.perf_counter() - started})
+    return booster, row
+
+
+def _fold_task(task: tuple) -> dict:
+    """worker：以共享記憶體中的特徵/標註從頭訓練一折，預測寫回共享陣列。"""
+    fold, specs, params, rounds, nthread, model_dir = task
+    handles = {}
+    try:
+        handles['features'], features = attach_array(specs['features'])
+        handles['labels'], labels = attach_array(specs['labels'])
+        handles['timestamp'], timestamp = attach_array(specs['timestamp'])
+        handles['predictions'], predictions = attach_array(specs['predictions'])
+        booster, row = _run_fold(features, labels, timestamp, predictions, fold, params, rounds, nthread)
+        if model_dir is not None:
+            booster.save_model(os.path.join(model_dir, f'fold_{fold.fold:03d}.json'))
+        return row
+    finally:
+        for shm in handles.values():
+            shm.close()
+
+
+def walk_forward(
+    dataset: WalkForwardDataset,
+    train_sessions: int = 20,
+    test_sessions: int = 2,
+    step_sessions: Optional[int] = None,
+    expanding: bool = False,
+    embargo: Optional[str] = None,
+    params: Optional[dict] = None,
+    num_boost_round: int = 200,
+    refit: str = 'full',
+    warm_rounds: int = 50,
+    n_workers: Optional[int] = None,
+    model_dir: Optional[str] = None
+) -> WalkForwardResult:
+    """
+    執行 Walk-Forward 訓練與評估。
+
+    Args:
+        dataset: build_dataset 的輸出。
+        train_sessions / test_sessions / step_sessions / expanding / embargo: 見 walk_forward_splits
+            (purge 的長度為 dataset.horizon)。
+        params: XGBoost 參數 (預設 DEFAULT_PARAMS)。
+        num_boost_round: 從頭訓練時的樹數。
+        refit: 'full' (每折從頭訓練、平行執行) 或 'warm_start' (依序接續上一折的模型)。
+        warm_rounds: warm_start 時每折新增的樹數。
+        n_workers: refit='full' 時的程序數 (預設為 min(折數, CPU 核心數))；
+            每個程序的 XGBoost 執行緒數為 CPU 核心數 / n_workers。
+        model_dir: 若指定，將每折的模型存為 fold_000.json、fold_001.json ...
+
+    Returns:
+        WalkForwardResult。
+    """
+    if refit not in REFIT_MODES:
+        raise ValueError(f"refit 必須是 {REFIT_MODES} 之一")
+    params = dict(DEFAULT_PARAMS if params is None else params)
+    folds = walk_forward_splits(dataset.timestamp, dataset.session_id, dataset.horizon, train_sessions,
+                                test_sessions, step_sessions, expanding, embargo, dataset.first_row)
+    if model_dir is not None:
+        os.makedirs(model_dir, exist_ok=True)
+    features = np.ascontiguousarray(dataset.features, dtype=np.float32)
+    labels = np.asarray(dataset.labels, dtype=np.float32)
+    cpus = os.cpu_count() or 1
+    rows = []
+
+    if refit == 'warm_start':
+        predictions = np.full(len(labels), np.nan, dtype=np.float32)
+        booster, trained_until = None, None
+        for fold in folds:
+            if booster is None:
+                booster, row = _run_fold(features, labels, dataset.timestamp, predictions, fold,
+                                         params, num_boost_round, cpus)
+            else:
+                # 只以上一折訓練窗之後新進入的資料接續訓練
+                new_rows = slice(max(trained_until, fold.train.start), fold.train.stop)
+                booster, row = _run_fold(features, labels, dataset.timestamp, predictions, fold,
+                                         params, warm_rounds, cpus, booster, new_rows)
+            trained_until = fold.train.stop
+            if model_dir is not None:
+                booster.save_model(os.path.join(model_dir, f'fold_{fold.fold:03d}.json'))
+            rows.append(row)
+    else:
+        n_workers = n_workers or min(len(folds), cpus) or 1
+        nthread = max(1, cpus // n_workers)
+        if n_workers == 1:
+            predictions = np.full(len(labels), np.nan, dtype=np.float32)
+            for fold in folds:
+                booster, row = _run_fold(features, labels, dataset.timestamp, predictions, fold,
+                                         params, num_boost_round, nthread)
+                if model_dir is not None:
+                    booster.save_model(os.path.join(model_dir, f'fold_{fold.fold:03d}.json'))
+                rows.append(row)
+        else:
+            shms, specs = [], {}
+            try:
+                for name, array in (('features', features), ('labels', labels),
+                                    ('timestamp', dataset.timestamp)):
+                    shm, specs[name] = share_array(array)
+                    shms.append(shm)
+                predictions_shm, specs['predictions'] = allocate_array((len(labels),), np.float32)
+                shms.append(predictions_shm)
+                prediction_view = array_view(predictions_shm, specs['predictions'])
+                prediction_view[:] = np.nan
+                tasks = [(fold, specs, params, num_boost_round, nthread, model_dir) for fold in folds]
+                with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                    rows = list(pool.map(_fold_task, tasks))
+                predictions = prediction_view.copy()
+                del prediction_view
+            finally:
+                for shm in shms:
+                    shm.close()
+                    shm.unlink()
+
+    return WalkForwardResult(folds, pd.DataFrame(rows), predictions)
@@ -0,0 +1,293 @@
+"""
+Tick 轉 K 棒 (OHLCV) 的聚合引擎。
+
+支援四種 K 棒：
+    'time'   : 固定時間 (e.g., '1min', '5s', '1h')
+    'tick'   : 每 size 筆 Tick
+    'volume' : 每累積 size 口成交量
+    'dollar' : 每累積 size 成交金額 (price * volume * multiplier)
+
+K 棒不會跨越交易時段 (session_id)；tick/volume/dollar K 棒的累積量在每個時段開盤時歸零。
+BarBuilder 以串流方式處理分塊輸入，最後一根尚未完成的 K 棒會保留到下一塊；
+session_bars 則以 TickStore 的分割為單位快取 K 棒。
+"""
+import os
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import instrument
+from utils.trading_session import (
+    SESSION_OUTSIDE,
+    SessionCalendar,
+    TAIFEX_CALENDAR,
+    classify_sessions,
+    index_to_ns,
+    session_ids,
+)
+
+BAR_KINDS = ('time', 'tick', 'volume', 'dollar')
+
+
+class Bars(NamedTuple):
+    """
+    K 棒陣列 (每個欄位長度相同)。
+
+    Attributes:
+        timestamp: K 棒起始時間 (int64 奈秒)；time K 棒為時間格起點，其他為第一筆 Tick 時間。
+        end_timestamp: K 棒最後一筆 Tick 的時間 (int64 奈秒)。
+        open / high / low / close: float32 價格。
+        volume: int64 成交量。
+        ticks: int32 Tick 筆數。
+        session_id: int64 交易時段編號。
+    """
+    timestamp: np.ndarray
+    end_timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    ticks: np.ndarray
+    session_id: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def to_frame(self) -> pd.DataFrame:
+        """轉為以 K 棒起始時間為索引的 DataFrame。"""
+        data = self._asdict()
+        index = pd.DatetimeIndex(pd.to_datetime(data.pop('timestamp')), name='timestamp')
+        data['end_timestamp'] = pd.to_datetime(data['end_timestamp'])
+        return pd.DataFrame(data, index=index)
+
+    @classmethod
+    def empty(cls) -> 'Bars':
+        return cls(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32),
+                   np.empty(0, np.float32), np.empty(0, np.float32), np.empty(0, np.float32),
+                   np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int64))
+
+    @classmethod
+    def concat(cls, parts: Sequence['Bars']) -> 'Bars':
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(*(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def _within_session_cumsum(values: np.ndarray, session: np.ndarray, offset: float) -> np.ndarray:
+    """
+    計算每筆 Tick 之前 (不含自身) 在同一交易時段內的累積量；
+    第一個時段從 offset 開始累積 (延續前一塊的未完成 K 棒)。
+    """
+    total = np.cumsum(values, dtype=np.float64)
+    exclusive = total - values
+    starts = np.flatnonzero(np.r_[True, session[1:] != session[:-1]])
+    base = exclusive[starts]
+    base[0] -= offset
+    counts = np.diff(np.r_[starts, len(values)])
+    return exclusive - np.repeat(base, counts)
+
+
+class BarBuilder:
+    """
+    串流式 K 棒產生器。
+
+    Args:
+        kind: 'time'、'tick'、'volume' 或 'dollar'。
+        size: time K 棒為頻率字串 (e.g., '1min')，其他為每根 K 棒的門檻值。
+        multiplier: dollar K 棒的契約乘數 (成交金額 = price * volume * multiplier)。
+
+    Example:
+        builder = BarBuilder('volume', 500)
+        for chunk in iter_tick_chunks(paths):
+            bars = builder.update(ts, price, volume, session_id)
+        bars = builder.flush()
+    """
+
+    def __init__(self, kind: str = 'time', size='1min', multiplier: float = 1.0):
+        if kind not in BAR_KINDS:
+            raise ValueError(f"kind 必須是 {BAR_KINDS} 之一")
+        self.kind = kind
+        self.size = size
+        self.multiplier = multiplier
+        if kind == 'time':
+            self.freq_ns = pd.Timedelta(size).value
+            if self.freq_ns <= 0:
+                raise ValueError("size 必須為正的時間長度")
+        elif size <= 0:
+            raise ValueError("size 必須 > 0")
+        # 尚未完成的最後一根 K 棒 (ts, price, volume, session_id) 與其起點的累積量
+        self._pending = None
+        self._pending_offset = 0.0
+
+    def _measure(self, price: np.ndarray, volume: np.ndarray) -> np.ndarray:
+        if self.kind == 'tick':
+            return np.ones(len(price), dtype=np.float64)
+        if self.kind == 'volume':
+            return volume.astype(np.float64)
+        return price.astype(np.float64) * volume * self.multiplier
+
+    def _aggregate(self, ts, price, volume, session, offset: float) -> tuple:
+        """回傳 (bars, 最後一根 K 棒的起始位置, 最後一根 K 棒起點的累積量)。"""
+        if self.kind == 'time':
+            bucket = ts // self.freq_ns
+            cumulative = None
+        else:
+            cumulative = _within_session_cumsum(self._measure(price, volume), session, offset)
+            bucket = np.floor(cumulative / self.size).astype(np.int64)
+
+        breaks = np.r_[True, (session[1:] != session[:-1]) | (bucket[1:] != bucket[:-1])]
+        starts = np.flatnonzero(breaks)
+        ends = np.r_[starts[1:], len(ts)] - 1
+
+        if self.kind == 'time':
+            bar_time = bucket[starts] * self.freq_ns
+        else:
+            bar_time = ts[starts]
+        bars = Bars(
+            timestamp=bar_time.astype(np.int64),
+            end_timestamp=ts[ends].astype(np.int64),
+            open=price[starts].astype(np.float32),
+            high=np.maximum.reduceat(price, starts).astype(np.float32),
+            low=np.minimum.reduceat(price, starts).astype(np.float32),
+            close=price[ends].astype(np.float32),
+            volume=np.add.reduceat(volume.astype(np.int64), starts),
+            ticks=np.diff(np.r_[starts, len(ts)]).astype(np.int32),
+            session_id=session[starts].astype(np.int64),
+        )
+        last_offset = 0.0 if cumulative is None else float(cumulative[starts[-1]])
+        return bars, int(starts[-1]), last_offset
+
+    def update(self, ts, price, volume, session_id) -> Bars:
+        """
+        加入一塊依時間排序的 Tick，回傳已完成的 K 棒 (最後一根保留至下次 update/flush)。
+
+        Args:
+            ts: int64 奈秒時間戳。
+            price: 成交價。
+            volume: 成交量。
+            session_id: 每筆 Tick 的交易時段編號 (見 utils.trading_session.session_ids)。
+        """
+        arrays = [np.asarray(ts, dtype=np.int64), np.asarray(price, dtype=np.float64),
+                  np.asarray(volume), np.asarray(session_id, dtype=np.int64)]
+        offset = 0.0
+        if self._pending is not None:
+            arrays = [np.concatenate([old, new]) for old, new in zip(self._pending, arrays)]
+            offset = self._pending_offset
+        if len(arrays[0]) == 0:
+            return Bars.empty()
+
+        bars, last_start, last_offset = self._aggregate(*arrays, offset)
+        self._pending = [a[last_start:] for a in arrays]
+        self._pending_offset = last_offset
+        return Bars(*(column[:-1] for column in bars))
+
+    def flush(self) -> Bars:
+        """輸出最後一根未完成的 K 棒並清空狀態。"""
+        if self._pending is None:
+            return Bars.empty()
+        bars, _, _ = self._aggregate(*self._pending, self._pending_offset)
+        self._pending = None
+        self._pending_offset = 0.0
+        return bars
+
+
+def _frame_session_ids(df: pd.DataFrame, calendar: SessionCalendar) -> tuple:
+    """取得 DataFrame 的 int64 時間戳與 session_id (若無 session_id 欄位則即時分類)。"""
+    ts = index_to_ns(df.index)
+    if 'session_id' in df.columns:
+        return ts, df['session_id'].to_numpy(), np.ones(len(df), dtype=bool)
+    session, trading_day = classify_sessions(ts, calendar, require_session_open=False)
+    return ts, session_ids(session, trading_day), session != SESSION_OUTSIDE
+
+
+@instrument()
+def build_bars(
+    df: pd.DataFrame,
+    kind: str = 'time',
+    size='1min',
+    price_column: str = 'close',
+    volume_column: Optional[str] = 'volume',
+    multiplier: float = 1.0,
+    calendar: SessionCalendar = TAIFEX_CALENDAR
+) -> Bars:
+    """
+    將 Tick DataFrame 聚合為 K 棒。
+
+    Args:
+        df: 索引為 DatetimeIndex、依時間排序的 Tick 資料 (e.g., process_time_series 的輸出)；
+            若沒有 'session_id' 欄位，會以 calendar 分類並略過非交易時段的 Tick。
+        kind / size / multiplier: 見 BarBuilder。
+        price_column: 價格欄位。
+        volume_column: 成交量欄位；None 表示資料沒有成交量 (只適用 time/tick K 棒，成交量記為 0)。
+        calendar: 交易時段設定。
+
+    Returns:
+        Bars。
+    """
+    if volume_column is None and kind in ('volume', 'dollar'):
+        raise ValueError(f"{kind} K 棒需要成交量欄位")
+    ts, sid, keep = _frame_session_ids(df, calendar)
+    price = df[price_column].to_numpy()
+    volume = df[volume_column].to_numpy() if volume_column is not None else np.zeros(len(df), dtype=np.int64)
+    if not keep.all():
+        ts, sid, price, volume = ts[keep], sid[keep], price[keep], volume[keep]
+
+    builder = BarBuilder(kind, size, multiplier)
+    return Bars.concat([builder.update(ts, price, volume, sid), builder.flush()])
+
+
+@instrument()
+def session_bars(
+    store,
+    kind: str = 'time',
+    size='1min',
+    start=None,
+    end=None,
+    sessions: Optional[Sequence[str]] = None,
+    price_column: str = 'close',
+    volume_column: str = 'volume',
+    multiplier: float = 1.0
+) -> Bars:
+    """
+    以 TickStore 的分割 (一個交易時段) 為單位計算並快取 K 棒。
+
+    快取存放於 store.root/bars/<kind>_<size>_<multiplier>_<price_column>_<volume_column>/<session_id>.npz，
+    當分割檔被重寫 (筆數、結束時間、檔案大小或修改時間變動，e.g., 增量匯入或來源檔案修正) 時自動重新計算。
+
+    Args:
+        store: utils.tick_store.TickStore。
+        kind / size / multiplier: 見 BarBuilder。
+        start / end / sessions: 見 TickStore.partitions。
+
+    Returns:
+        依時間排序的 Bars。
+    """
+    cache_key = f'{kind}_{size}_{multiplier:g}_{price_column}_{volume_column}'.replace('/', '-')
+    cache_dir = os.path.join(store.root, 'bars', cache_key)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    parts = []
+    for entry in store.partitions(start, end, sessions).itertuples(index=False):
+        cache_path = os.path.join(cache_dir, f'{entry.session_id}.npz')
+        stat = os.stat(os.path.join(store.root, entry.path))
+        signature = np.array([entry.rows, entry.end_ns, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached['signature'], signature):
+                    parts.append(Bars(*(cached[name] for name in Bars._fields)))
+                    continue
+
+        ticks = store.read_partition(str(entry.session_id), [price_column, volume_column])
+        builder = BarBuilder(kind, size, multiplier)
+        sid = np.full(len(ticks), entry.session_id, dtype=np.int64)
+        bars = Bars.concat([
+            builder.update(ticks['timestamp'].to_numpy(), ticks[price_column].to_numpy(),
+                           ticks[volume_column].to_numpy(), sid),
+            builder.flush(),
+        ])
+        np.savez(cache_path, signature=signature, **bars._asdict())
+        parts.append(bars)
+    return Bars.concat(parts)
@@ -1,42 +1,254 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
 import pandas as pd
 
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
+from utils.instrumentation import instrument
+from utils.quality_stats import QualityReport
+from utils.trading_session import (
+    SessionCalendar,
+    TAIFEX_CALENDAR,
+    classify_sessions,
+    filter_sessions,
+    session_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CleaningRules:
+    """
+    Tick 資料的清洗規則。
+
+    Attributes:
+        price_column / volume_column: 價格與成交量欄位。
+        timestamp_column: 時間欄位。
+        dedup_columns: 判斷重複的欄位組合 (只使用資料中存在的欄位)；同一奈秒內價格或數量不同的
+            成交視為不同筆，不會被刪除。
+        drop_zero_price / drop_zero_volume: 是否移除價格/成交量 <= 0 的資料。
+        jump_window: 價格跳動檢查的滾動中位數窗口 (筆數，含當筆)。
+        max_jump: 與滾動中位數的最大相對偏離 (e.g., 0.03 = 3%)；None 表示不檢查。
+        session_column: 交易時段編號欄位；資料沒有此欄位時以 calendar 由時間欄位判斷。
+            滾動中位數在每個交易時段開始時重新計算，開盤跳空不會被視為價格跳動。
+        calendar: 判斷交易時段用的日曆。
+    """
+    price_column: str = 'close'
+    volume_column: str = 'volume'
+    timestamp_column: str = 'timestamp'
+    dedup_columns: Sequence[str] = ('timestamp', 'close', 'volume', 'seq')
+    drop_zero_price: bool = True
+    drop_zero_volume: bool = True
+    jump_window: int = 51
+    max_jump: Optional[float] = 0.03
+    session_column: str = 'session_id'
+    calendar: SessionCalendar = field(default_factory=lambda: TAIFEX_CALENDAR)
+
+
+DEFAULT_RULES = CleaningRules()
+# 價格跳動遮罩的最大迭代次數 (通常 2~3 輪即收斂)
+_JUMP_ITERATIONS = 5
+
+
+def _timestamp_ns(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    index = pd.DatetimeIndex(pd.to_datetime(values))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+def _long_runs(mask: np.ndarray, length: int) -> np.ndarray:
+    """mask 中長度至少為 length 的連續 True 區段。"""
+    edges = np.diff(np.r_[False, mask, False].astype(np.int8))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    long = stops - starts >= length
+    delta = np.zeros(len(mask) + 1, dtype=np.int64)
+    delta[starts[long]] += 1
+    delta[stops[long]] -= 1
+    return np.cumsum(delta[:-1]) > 0
+
+
+class StreamingCleaner:
+    """
+    逐塊清洗 Tick 資料，並以可合併的累加器在單次掃描中產生 QualityReport。
+
+    規則依序套用：缺值 → 零價格 → 零成交量 → 價格跳動 (相對滾動中位數) → 重複資料。
+    滾動中位數與重複判斷的狀態會延續到下一塊；跨塊的重複判斷需要輸入依時間排序。
+
+    價格跳動以同一交易時段內、最近 jump_window 筆通過檢查的價格的中位數為基準：被判定為
+    跳動的價格不會進入中位數 (連續多筆異常報價不會拉動基準)；但連續超過半個窗口的偏離
+    視為真實的價格變動而保留，避免基準停在舊價位而刪除之後所有的成交。
+
+    Args:
+        rules: 清洗規則。
+        price_history: 可選，這批資料之前 (同一交易時段內) 通過檢查的價格，用於分段清洗時延續滾動中位數。
+
+    Example:
+        cleaner = StreamingCleaner()
+        for chunk in iter_tick_chunks(paths):
+            cleaned = cleaner.process(chunk)
+        print(cleaner.report.summary())
+    """
+
+    def __init__(self, rules: CleaningRules = DEFAULT_RULES, price_history: Optional[np.ndarray] = None):
+        self.rules = rules
+        self.report = QualityReport()
+        history = np.empty(0) if price_history is None else np.asarray(price_history, dtype=np.float64)
+        self._price_tail = history[-(rules.jump_window - 1):] if rules.jump_window > 1 else np.empty(0)
+        self._tail_session = None
+        self._dedup_tail = None
+
+    def _drop(self, df: pd.DataFrame, mask: np.ndarray, reason: str) -> pd.DataFrame:
+        removed = int(mask.sum())
+        self.report.count_removed(reason, removed)
+        return df.loc[~mask] if removed else df
+
+    def _sessions(self, df: pd.DataFrame) -> Optional[np.ndarray]:
+        """每列的交易時段編號 (非交易時段為 -1)；無法判斷時回傳 None。"""
+        rules = self.rules
+        if rules.session_column in df.columns:
+            return df[rules.session_column].to_numpy()
+        if rules.timestamp_column in df.columns:
+            session, trading_day = classify_sessions(_timestamp_ns(df[rules.timestamp_column]), rules.calendar,
+                                                     require_session_open=False)
+            return session_ids(session, trading_day)
+        return None
+
+    def _jump_mask(self, prices: np.ndarray, sessions: Optional[np.ndarray]) -> np.ndarray:
+        """逐個交易時段判斷價格跳動，換時段時清除滾動中位數的歷史。"""
+        n = len(prices)
+        mask = np.zeros(n, dtype=bool)
+        if n == 0:
+            return mask
+        if sessions is None:
+            edges = np.array([0, n])
+        else:
+            edges = np.r_[np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]]), n]
+        for a, b in zip(edges[:-1], edges[1:]):
+            if sessions is not None:
+                if self._tail_session is not None and sessions[a] != self._tail_session:
+                    self._price_tail = self._price_tail[:0]
+                self._tail_session = sessions[a]
+            mask[a:b] = self._session_jump_mask(prices[a:b])
+        return mask
+
+    def _session_jump_mask(self, prices: np.ndarray) -> np.ndarray:
+        rules = self.rules
+        tail = self._price_tail
+        persistent = rules.jump_window // 2 + 1
+        mask = np.zeros(len(prices), dtype=bool)
+        sustained = np.zeros(len(prices), dtype=bool)
+        # 跳動與否取決於中位數、中位數又只納入未跳動的價格，以迭代求解 (第一輪即為包含所有價格的滾動中位數)
+        for _ in range(_JUMP_ITERATIONS):
+            accepted = np.concatenate([tail, prices[~mask]])
+            median = pd.Series(accepted).rolling(rules.jump_window, min_periods=1).median().to_numpy()
+            # 每筆以「最後一筆 (含當筆) 通過檢查的價格」所在位置的中位數為基準
+            position = len(tail) + np.cumsum(~mask) - 1
+            reference = np.where(position >= 0, median[np.maximum(position, 0)], np.nan)
+            flagged = np.abs(prices - reference) > rules.max_jump * np.abs(reference)
+            # 持續偏離的區段一旦確認即固定保留，迭代因此會收斂
+            sustained |= _long_runs(flagged, persistent)
+            flagged &= ~sustained
+            if np.array_equal(flagged, mask):
+                break
+            mask = flagged
+        if rules.jump_window > 1:
+            self._price_tail = np.concatenate([tail, prices[~mask]])[-(rules.jump_window - 1):]
+        return mask
+
+    def _duplicate_mask(self, df: pd.DataFrame) -> np.ndarray:
+        rules = self.rules
+        keys = [c for c in rules.dedup_columns if c in df.columns]
+        current = df[keys]
+        if self._dedup_tail is not None and list(self._dedup_tail.columns) == keys:
+            combined = pd.concat([self._dedup_tail, current], ignore_index=True)
+            duplicated = combined.duplicated(keys).to_numpy()[len(self._dedup_tail):]
+        else:
+            duplicated = current.duplicated(keys).to_numpy()
+
+        # 保留最後一個時間戳的資料，供下一塊判斷跨塊重複
+        kept = current.loc[~duplicated]
+        if rules.timestamp_column in keys and len(kept):
+            ts = kept[rules.timestamp_column]
+            self._dedup_tail = kept.loc[ts == ts.iloc[-1]].reset_index(drop=True)
+        else:
+            self._dedup_tail = kept.reset_index(drop=True)
+        return duplicated
+
+    @instrument()
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        """清洗一塊資料並更新品質報告，回傳清洗後的資料。"""
+        rules = self.rules
+        report = self.report
+        stat_columns = [rules.price_column, rules.volume_column]
+        report.rows_in += len(df)
+        report.update_stats('before', df, stat_columns)
+
+        df = self._drop(df, df.isna().any(axis=1).to_numpy(), 'null')
+        if rules.drop_zero_price and rules.price_column in df.columns:
+            df = self._drop(df, (df[rules.price_column] <= 0).to_numpy(), 'zero_price')
+        if rules.drop_zero_volume and rules.volume_column in df.columns:
+            df = self._drop(df, (df[rules.volume_column] <= 0).to_numpy(), 'zero_volume')
+        if rules.max_jump is not None and rules.price_column in df.columns:
+            mask = self._jump_mask(df[rules.price_column].to_numpy(dtype=np.float64), self._sessions(df))
+            df = self._drop(df, mask, 'price_jump')
+        df = self._drop(df, self._duplicate_mask(df), 'duplicate')
+
+        report.rows_out += len(df)
+        report.update_stats('after', df, stat_columns)
+        if rules.timestamp_column in df.columns:
+            report.update_time_range(_timestamp_ns(df[rules.timestamp_column]))
+        return df
+
+    def process_chunks(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """逐塊清洗，略過清洗後為空的塊。"""
+        for chunk in chunks:
+            cleaned = self.process(chunk)
+            if len(cleaned):
+                yield cleaned
+
+
+@instrument()
+def clean_data(
+    df: pd.DataFrame,
+    rules: CleaningRules = DEFAULT_RULES,
+    return_report: bool = False,
+    price_history: Optional[np.ndarray] = None
+):
     """
     處理資料中的缺失值、異常值和重複資料。
 
+    規則見 CleaningRules；統計資訊改以 QualityReport 回傳，不再印出。
+    大量資料請改用 StreamingCleaner 逐塊處理。
+
     Args:
-        df (pd.DataFrame): 原始資料 DataFrame。
+        df (pd.DataFrame): 原始資料 DataFrame (應依時間排序)。
+        rules (CleaningRules): 清洗規則。
+        return_report (bool): 是否一併回傳品質報告。
+        price_history (np.ndarray): 可選，df 之前的有效價格，見 StreamingCleaner。
 
     Returns:
-        pd.DataFrame: 清洗後的資料 DataFrame。
+        pd.DataFrame: 清洗後的資料 DataFrame；return_report 為 True 時回傳 (DataFrame, QualityReport)。
     """
-    print("\n處理缺失值前：")
-    print(df.isnull().sum())
-    df = df.dropna() # 範例：簡單刪除含有缺失值的列
-    print("\n處理缺失值後：")
-    print(df.isnull().sum())
-
-    print("\n處理異常值前：")
-    print(df.describe())
-    # 範例：移除價格為 0 或極端值的資料
-    # df = df[(df['close'] > 0) & (df['close'] < df['close'].quantile(0.99))]
-    print("\n處理異常值後：")
-    print(df.describe())
-
-    print("\n處理重複資料前：")
-    print(f"重複資料筆數：{df.duplicated().sum()}")
-    df = df.drop_duplicates(subset=['timestamp'])
-    print("\n處理重複資料後：")
-    print(f"重複資料筆數：{df.duplicated().sum()}")
-    
-    return df
+    cleaner = StreamingCleaner(rules, price_history)
+    cleaned = cleaner.process(df)
+    return (cleaned, cleaner.report) if return_report else cleaned
 
-def process_time_series(df: pd.DataFrame) -> pd.DataFrame:
+@instrument()
+def process_time_series(df: pd.DataFrame, calendar: SessionCalendar = TAIFEX_CALENDAR) -> pd.DataFrame:
     """
     將時間欄位設定為索引，標準化時間格式，並處理非交易時間資料。
 
+    非交易時間的判斷以 utils.trading_session 單次向量化完成，
+    並新增 'session'、'trading_day'、'session_id' 欄位。
+
     Args:
         df (pd.DataFrame): 原始資料 DataFrame。
+        calendar (SessionCalendar): 交易時段與休市日設定 (預設為台指期日盤/夜盤)。
 
     Returns:
         pd.DataFrame: 處理時間序列後的資料 DataFrame。
@@ -46,50 +258,10 @@ def process_time_series(df: pd.DataFrame) -> pd.DataFrame:
     df.set_index('timestamp', inplace=True)
 
     # 標準化時間格式 (如果需要)
-    df = df.sort_index()
+    df = df.sort_index(kind='stable')
 
     # 處理非交易時間資料
-    day_start = '08:45'
-    day_end = '13:45'
-    night_start = '15:00'
-    night_end = '05:00'
-
-    day_start_time = pd.to_datetime(day_start).time()
-    day_end_time = pd.to_datetime(day_end).time()
-    night_start_time = pd.to_datetime(night_start).time()
-    night_end_time = pd.to_datetime(night_end).time()
-
-    cleaned_df = pd.DataFrame()
-    unique_dates = df.index.normalize().unique()
-
-    for current_date in unique_dates:
-        # 日盤時間範圍
-        day_session_start_dt = current_date.replace(hour=day_start_time.hour, minute=day_start_time.minute, second=day_start_time.second)
-        day_session_end_dt = current_date.replace(hour=day_end_time.hour, minute=day_end_time.minute, second=day_end_time.second)
-        
-        # 夜盤時間範圍 (跨日)
-        night_session_start_dt = current_date.replace(hour=night_start_time.hour, minute=night_start_time.minute, second=night_start_time.second)
-        night_session_end_dt = (current_date + pd.Timedelta(days=1)).replace(hour=night_end_time.hour, minute=night_end_time.minute, second=night_end_time.second)
-        
-        # 篩選日盤數據
-        day_data = df.loc[(df.index >= day_session_start_dt) & (df.index < day_session_end_dt)]
-        
-        # 篩選夜盤數據
-        night_data_part1 = df.loc[(df.index >= night_session_start_dt) & (df.index <= current_date.replace(hour=23, minute=59, second=59))]
-        night_data_part2 = df.loc[(df.index >= current_date.replace(hour=0, minute=0, second=0) + pd.Timedelta(days=1)) & (df.index < night_session_end_dt)]
-        
-        night_data = pd.concat([night_data_part1, night_data_part2])
-        
-        # 合併日盤和夜盤數據
-        daily_trade_data = pd.concat([day_data, night_data])
-        
-        cleaned_df = pd.concat([cleaned_df, daily_trade_data])
-            
-    df = cleaned_df.sort_index()
-
-    print("\n時間序列處理後：")
-    print(df.head())
-    print(df.index.dtype)
-    print(f"資料筆數：{len(df)}")
-    
-    return df
\ No newline at end of file
+    df = filter_sessions(df, calendar)
+
+    logger.debug("時間序列處理後：%d 筆，索引型別 %s\n%s", len(df), df.index.dtype, df.head())
+    return df
@@ -1,18 +1,247 @@
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.instrumentation import instrument
+
+# 台指期最小跳動點 (1 點)
+TICK_SIZE = 1.0
+
+TIMESTAMP_COLUMN = 'timestamp'
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'price')
+VOLUME_COLUMNS = ('volume',)
+
+DEFAULT_BATCH_SIZE = 1_000_000
+
+PathLike = Union[str, Sequence[str]]
+
+
+def _as_list(paths: PathLike) -> list:
+    return [paths] if isinstance(paths, str) else list(paths)
+
+
+def _time_filter(schema: pa.Schema, start, end) -> Optional[pc.Expression]:
+    """
+    依照 timestamp 欄位的實際型態建立可下推至 Parquet 的時間範圍篩選條件 ([start, end))。
+    timestamp 若非時間型態 (e.g., 字串)，回傳 None，改由讀取後再篩選。
+    """
+    if start is None and end is None:
+        return None
+    field_type = schema.field(TIMESTAMP_COLUMN).type
+    if not pa.types.is_timestamp(field_type):
+        return None
+
+    def to_scalar(value):
+        ts = pd.Timestamp(value)
+        if field_type.tz is not None and ts.tz is None:
+            ts = ts.tz_localize(field_type.tz)
+        elif field_type.tz is None and ts.tz is not None:
+            ts = ts.tz_localize(None)
+        return pa.scalar(ts, type=field_type)
+
+    column = ds.field(TIMESTAMP_COLUMN)
+    expression = None
+    if start is not None:
+        expression = column >= to_scalar(start)
+    if end is not None:
+        upper = column < to_scalar(end)
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def _timestamp_to_ns(values) -> np.ndarray:
+    """將 timestamp 欄位 (Arrow 陣列) 轉為當地時間的 int64 奈秒。"""
+    index = pd.DatetimeIndex(pd.to_datetime(values.to_pandas()))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+def compact_frame(
+    table: Union[pa.Table, pa.RecordBatch],
+    price_as_ticks: bool = False,
+    tick_size: float = TICK_SIZE
+) -> pd.DataFrame:
+    """
+    將 Arrow 資料轉為精簡型態的 DataFrame：
+    timestamp 為 int64 奈秒、價格為 float32 (或 int32 跳動點數)、成交量為 int32。
+    含缺值的價格/成交量欄位維持 float32 (NaN)，留待 clean_data 處理；其他欄位維持原型態。
+
+    Args:
+        table: pyarrow Table 或 RecordBatch。
+        price_as_ticks: 是否將價格轉為 int32 的跳動點數 (price / tick_size)。
+        tick_size: 最小跳動點。
+
+    Returns:
+        精簡型態的 DataFrame。
+    """
+    columns = {}
+    for name, values in zip(table.schema.names, table.columns):
+        if name == TIMESTAMP_COLUMN:
+            columns[name] = _timestamp_to_ns(values)
+        elif name in PRICE_COLUMNS:
+            price = values.to_numpy(zero_copy_only=False).astype(np.float64)
+            if price_as_ticks and values.null_count == 0:
+                columns[name] = np.rint(price / tick_size).astype(np.int32)
+            else:
+                columns[name] = price.astype(np.float32)
+        elif name in VOLUME_COLUMNS:
+            dtype = np.int32 if values.null_count == 0 else np.float32
+            columns[name] = values.to_numpy(zero_copy_only=False).astype(dtype)
+        else:
+            columns[name] = values.to_pandas()
+    return pd.DataFrame(columns)
+
 
-def load_and_inspect_data(data_path):
+def iter_tick_chunks(
+    paths: PathLike,
+    columns: Optional[Sequence[str]] = None,
+    start=None,
+    end=None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    price_as_ticks: bool = False,
+    tick_size: float = TICK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    以串流方式逐批讀取一或多個 Parquet Tick 檔，記憶體用量受 batch_size 限制。
+
+    只讀取指定欄位，並將時間範圍篩選下推至 Parquet (依 row group 統計值略過不相關的區塊)。
+
+    Args:
+        paths: 單一檔案路徑或多個檔案路徑 (e.g., 多個月份)。
+        columns: 要讀取的欄位 (None 表示全部)；timestamp 欄位一律包含。
+        start: 起始時間 (含)，None 表示不限制。
+        end: 結束時間 (不含)，None 表示不限制。
+        batch_size: 每批最多筆數。
+        price_as_ticks: 是否將價格轉為 int32 跳動點數。
+        tick_size: 最小跳動點。
+
+    Yields:
+        精簡型態的 DataFrame (見 compact_frame)。
+    """
+    dataset = ds.dataset(_as_list(paths), format='parquet')
+    if columns is not None:
+        columns = [TIMESTAMP_COLUMN] + [c for c in columns if c != TIMESTAMP_COLUMN]
+
+    expression = _time_filter(dataset.schema, start, end)
+    post_filter = expression is None and (start is not None or end is not None)
+    start_ns = None if start is None else pd.Timestamp(start).tz_localize(None).value
+    end_ns = None if end is None else pd.Timestamp(end).tz_localize(None).value
+
+    for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+        if batch.num_rows == 0:
+            continue
+        chunk = compact_frame(batch, price_as_ticks, tick_size)
+        if post_filter:
+            ts = chunk[TIMESTAMP_COLUMN].to_numpy()
+            mask = np.ones(len(chunk), dtype=bool)
+            if start_ns is not None:
+                mask &= ts >= start_ns
+            if end_ns is not None:
+                mask &= ts < end_ns
+            chunk = chunk.loc[mask].reset_index(drop=True)
+            if chunk.empty:
+                continue
+        yield chunk
+
+
+@instrument()
+def load_ticks(
+    paths: PathLike,
+    columns: Optional[Sequence[str]] = None,
+    start=None,
+    end=None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    price_as_ticks: bool = False,
+    tick_size: float = TICK_SIZE
+) -> pd.DataFrame:
+    """
+    讀取一或多個 Parquet Tick 檔並合併為單一精簡型態的 DataFrame。
+    參數同 iter_tick_chunks。
+    """
+    chunks = list(iter_tick_chunks(paths, columns, start, end, batch_size, price_as_ticks, tick_size))
+    if not chunks:
+        schema = ds.dataset(_as_list(paths), format='parquet').schema
+        names = schema.names if columns is None else [TIMESTAMP_COLUMN] + [c for c in columns if c != TIMESTAMP_COLUMN]
+        return compact_frame(schema.empty_table().select(names), price_as_ticks, tick_size)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def summarize_parquet(paths: PathLike, sample_rows: int = 0) -> dict:
+    """
+    以 Parquet metadata 產生資料摘要，不需載入整個檔案。
+
+    Args:
+        paths: 單一或多個檔案路徑。
+        sample_rows: 若大於 0，另外讀取每個檔案前 sample_rows 筆計算描述性統計。
+
+    Returns:
+        dict，包含 num_rows、num_row_groups、schema、各欄位的 min/max/null_count，
+        以及 (可選) sample 的 describe() 結果。
+    """
+    summary = {'num_rows': 0, 'num_row_groups': 0, 'files': [], 'columns': {}}
+    samples = []
+    for path in _as_list(paths):
+        parquet_file = pq.ParquetFile(path)
+        metadata = parquet_file.metadata
+        summary['num_rows'] += metadata.num_rows
+        summary['num_row_groups'] += metadata.num_row_groups
+        summary['files'].append(path)
+        summary['schema'] = parquet_file.schema_arrow
+
+        for rg in range(metadata.num_row_groups):
+            row_group = metadata.row_group(rg)
+            for i in range(row_group.num_columns):
+                column = row_group.column(i)
+                name = column.path_in_schema
+                stats = summary['columns'].setdefault(name, {'min': None, 'max': None, 'null_count': 0})
+                if column.statistics is None or not column.statistics.has_min_max:
+                    continue
+                lo, hi = column.statistics.min, column.statistics.max
+                stats['min'] = lo if stats['min'] is None else min(stats['min'], lo)
+                stats['max'] = hi if stats['max'] is None else max(stats['max'], hi)
+                if column.statistics.null_count is not None:
+                    stats['null_count'] += column.statistics.null_count
+
+        if sample_rows > 0:
+            batch = next(parquet_file.iter_batches(batch_size=sample_rows), None)
+            if batch is not None:
+                samples.append(batch.to_pandas())
+
+    if samples:
+        summary['sample_describe'] = pd.concat(samples, ignore_index=True).describe()
+    return summary
+
+
+def load_and_inspect_data(data_path, inspect: bool = True, sample_rows: int = 100_000, **kwargs):
     """
     載入歷史 Tick/分K 資料並進行初步檢視。
+
+    資料以 load_ticks 分批讀取並轉為精簡型態；檢視資訊改由 Parquet metadata
+    與前 sample_rows 筆樣本計算，不再對整份資料執行 describe()/info()。
+    其他參數 (columns、start、end、price_as_ticks 等) 會傳給 load_ticks。
     """
     try:
-        df = pd.read_parquet(data_path)
+        df = load_ticks(data_path, **kwargs)
         print("資料載入成功！")
         print("前 5 行資料：")
         print(df.head())
-        print("\n資料基本資訊：")
-        df.info()
-        print("\n描述性統計：")
-        print(df.describe())
+        if inspect:
+            summary = summarize_parquet(data_path, sample_rows=sample_rows)
+            print("\n資料基本資訊：")
+            print(f"資料筆數：{summary['num_rows']}，Row groups：{summary['num_row_groups']}")
+            print(summary['schema'])
+            print(f"記憶體用量：{df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB")
+            print("\n欄位統計 (Parquet metadata)：")
+            print(pd.DataFrame(summary['columns']).T)
+            if 'sample_describe' in summary:
+                print(f"\n描述性統計 (前 {sample_rows} 筆樣本)：")
+                print(summary['sample_describe'])
         return df
     except FileNotFoundError:
         print(f"錯誤：找不到檔案 {data_path}")
@@ -24,11 +253,11 @@ def load_and_inspect_data(data_path):
 if __name__ == "__main__":
     # 指定資料檔案路徑
     data_path = './data/ticks_2025-04.parquet'
-    
+
     # 載入資料並檢視
     df = load_and_inspect_data(data_path)
-    
+
     if df is not None:
         print("\n資料欄位：")
         print(df.columns)
-        print(f"資料筆數：{len(df)}")
\ No newline at end of file
+        print(f"資料筆數：{len(df)}")
@@ -0,0 +1,102 @@
+"""
+時間序列資料切分 (Walk-Forward)。
+
+切分以交易時段 (session_id) 為單位，訓練集與測試集都是連續的列區間，
+因此可以直接以 slice 取得特徵矩陣的 view (不複製)。
+訓練集尾端會 purge 掉「標註所用的未來成交落在測試集內」的列，並可再加上 embargo 間隔，
+避免標註資訊洩漏到訓練集。
+"""
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class Fold(NamedTuple):
+    """
+    一個 Walk-Forward 折。
+
+    Attributes:
+        fold: 折的編號 (由 0 開始)。
+        train: 訓練集的列區間 (已扣除 purge/embargo 與暖機期)。
+        test: 測試集的列區間。
+        purged: 因 purge/embargo 從訓練集尾端移除的筆數。
+        train_sessions: 訓練集涵蓋的交易時段數。
+        test_sessions: 測試集涵蓋的交易時段數。
+    """
+    fold: int
+    train: slice
+    test: slice
+    purged: int
+    train_sessions: int
+    test_sessions: int
+
+
+def walk_forward_splits(
+    timestamp: np.ndarray,
+    session_id: np.ndarray,
+    horizon: str,
+    train_sessions: int = 20,
+    test_sessions: int = 2,
+    step_sessions: Optional[int] = None,
+    expanding: bool = False,
+    embargo: Optional[str] = None,
+    first_row: int = 0
+) -> List[Fold]:
+    """
+    以交易時段為邊界產生 rolling (或 expanding) 的訓練/測試區間。
+
+    第 k 折的測試集為第 s_k ~ s_k + test_sessions 個時段 (s_k = train_sessions + k * step_sessions)，
+    訓練集為其前 train_sessions 個時段 (expanding=True 時為之前的所有時段)。
+    訓練集的第 i 列若其標註使用的未來成交 (t_i + horizon 之後的第一筆) 落在測試集開始之後，
+    或 t_i 晚於 測試集開始 - embargo，則被移除。
+
+    Args:
+        timestamp: 依時間排序的 int64 奈秒時間戳。
+        session_id: 與 timestamp 對齊的交易時段編號。
+        horizon: 標註往後看的時間 (e.g., create_up_down_label 的 window)。
+        train_sessions: 訓練集的時段數 (expanding 時為第一折的時段數)。
+        test_sessions: 測試集的時段數。
+        step_sessions: 每折前進的時段數 (預設等於 test_sessions)。
+        expanding: 是否使用擴張視窗 (訓練集起點固定在第一個時段)。
+        embargo: 額外的間隔時間 (e.g., '30min')，None 表示只做 purge。
+        first_row: 訓練集最早可用的列 (e.g., 特徵暖機期之後的第一列)。
+
+    Returns:
+        Fold 列表。
+    """
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    session_id = np.asarray(session_id)
+    n = len(timestamp)
+    if n == 0:
+        return []
+    step_sessions = step_sessions or test_sessions
+    starts = np.flatnonzero(np.r_[True, session_id[1:] != session_id[:-1]])
+    bounds = np.r_[starts, n]
+    num_sessions = len(starts)
+    horizon_ns = pd.Timedelta(horizon).value
+    embargo_ns = 0 if embargo is None else pd.Timedelta(embargo).value
+
+    folds = []
+    first = train_sessions
+    while first + test_sessions <= num_sessions:
+        test_start, test_stop = int(bounds[first]), int(bounds[first + test_sessions])
+        train_first = 0 if expanding else first - train_sessions
+        train_start = max(int(bounds[train_first]), first_row)
+
+        # purge：t_i + horizon <= 測試集前最後一筆的時間，標註才完全由訓練集範圍內的成交決定
+        train_stop = int(np.searchsorted(timestamp, timestamp[test_start - 1] - horizon_ns, side='right'))
+        if embargo_ns:
+            train_stop = min(train_stop, int(np.searchsorted(timestamp, timestamp[test_start] - embargo_ns, side='left')))
+        train_stop = max(train_stop, train_start)
+
+        folds.append(Fold(
+            fold=len(folds),
+            train=slice(train_start, train_stop),
+            test=slice(test_start, test_stop),
+            purged=test_start - train_stop,
+            train_sessions=first - train_first,
+            test_sessions=test_sessions,
+        ))
+        first += step_sessions
+    return folds
@@ -0,0 +1,212 @@
+"""
+長期間價格走勢圖的降採樣 (level of detail)。
+
+圖上一個像素寬度內的上千個點在視覺上沒有差別，卻會讓圖檔與瀏覽器負擔隨資料量成長。
+這裡以預先計算的 K 棒 (e.g., 每個交易時段的 1 分 K，見 utils.bar_builder.session_bars)
+為基礎，依目前可見的時間範圍與像素數挑選要繪製的點：
+    'minmax'：每個像素區間保留第一點、最低價、最高價與最後一點 (M4)，不會漏掉極值。
+    'lttb'  ：Largest-Triangle-Three-Buckets，保留視覺形狀，點數固定為 max_points。
+兩者都只在可見範圍內運算，縮放時重新呼叫 LevelOfDetail.series 即可取得更細的資料。
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.bar_builder import Bars
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+
+
+class LodSeries(NamedTuple):
+    """
+    降採樣後的走勢 (不同交易時段之間以 NaN 斷開)。
+
+    Attributes:
+        timestamp: int64 奈秒時間戳。
+        price: float64 價格 (斷點為 NaN)。
+        session_id: 每個點的交易時段編號 (斷點為 -1)。
+    """
+    timestamp: np.ndarray
+    price: np.ndarray
+    session_id: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+
+def _segments(x: np.ndarray, n_bins: int, x0: float, x1: float) -> tuple:
+    """將依序排列的 x 依等寬像素區間分段，回傳 (各段起點, 各段長度)。"""
+    width = max(x1 - x0, 1)
+    bins = np.minimum(((x - x0) * (n_bins / width)).astype(np.int64), n_bins - 1)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    return starts, np.diff(np.r_[starts, len(x)])
+
+
+def _first_in_segment(mask: np.ndarray, segment: np.ndarray) -> np.ndarray:
+    """每段中第一個 mask 為 True 的索引 (沒有 True 的段落會被略過)。"""
+    hits = np.flatnonzero(mask)
+    _, first = np.unique(segment[hits], return_index=True)
+    return hits[first]
+
+
+def minmax_points(x: np.ndarray, y: np.ndarray, low: Optional[np.ndarray] = None,
+                  high: Optional[np.ndarray] = None, n_bins: int = 1000,
+                  x_range: Optional[tuple] = None) -> tuple:
+    """
+    每個像素區間保留第一點、最低點、最高點與最後一點 (M4 降採樣)。
+
+    Args:
+        x: 依序排列的 x (e.g., 奈秒時間戳)。
+        y: 數值 (e.g., K 棒收盤價)，用於區間的第一點與最後一點。
+        low / high: 用來找區間極值的數列 (e.g., K 棒最低/最高價)，None 表示與 y 相同。
+        n_bins: 像素區間數。
+        x_range: 區間切分的 (起點, 終點)，預設為 x 的範圍。
+
+    Returns:
+        (index, value)：依 x 排序的點 (最多 4 * n_bins 個)；index 為對應的原始位置
+        (同一位置可能出現多次，e.g., 同一根 K 棒的最低價與最高價)。
+    """
+    low = y if low is None else low
+    high = y if high is None else high
+    n = len(x)
+    if n <= 4 * n_bins:
+        return np.arange(n), np.asarray(y)
+    x0, x1 = x_range if x_range is not None else (x[0], x[-1])
+    starts, lengths = _segments(x, n_bins, x0, x1)
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    # fmin/fmax 略過 NaN；全為 NaN 的區間沒有極值點
+    lows = _first_in_segment(low == np.repeat(np.fmin.reduceat(low, starts), lengths), segment)
+    highs = _first_in_segment(high == np.repeat(np.fmax.reduceat(high, starts), lengths), segment)
+    lasts = starts + lengths - 1
+    index = np.concatenate([starts, lows, highs, lasts])
+    value = np.concatenate([y[starts], low[lows], high[highs], y[lasts]])
+    # 同一位置依 第一點 → 極值 → 最後一點 的順序排列
+    role = np.repeat(np.array([0, 1, 1, 2]), [len(starts), len(lows), len(highs), len(lasts)])
+    order = np.lexsort((role, index))
+    return index[order], value[order]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降採樣的索引。
+
+    第一與最後一點固定保留；其餘資料等分為 n_out - 2 個區間，每個區間選出與
+    「前一個選中點」及「下一個區間平均點」構成最大三角形面積的點。
+
+    Args:
+        x: 依序排列的 x。
+        y: 數值 (不可含 NaN)。
+        n_out: 輸出點數。
+
+    Returns:
+        遞增排序的索引。
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 各區間的平均點以累積和一次算好
+    cx, cy = np.r_[0.0, np.cumsum(x)], np.r_[0.0, np.cumsum(y)]
+    counts = np.maximum(np.diff(edges), 1)
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < len(mean_x):
+            nx, ny = mean_x[i + 1], mean_y[i + 1]
+        else:
+            nx, ny = x[-1], y[-1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - nx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (ny - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+class LevelOfDetail:
+    """
+    以 K 棒為基礎、依可見範圍提供降採樣走勢的資料來源。
+
+    Args:
+        bars: 依時間排序的 K 棒 (e.g., build_bars / session_bars 的 1 分 K)。
+        method: 'minmax' 或 'lttb'。
+    """
+
+    def __init__(self, bars: Bars, method: str = 'minmax'):
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"method 必須是 {DOWNSAMPLE_METHODS} 之一")
+        self.method = method
+        self.timestamp = np.asarray(bars.timestamp, dtype=np.int64)
+        self.end_timestamp = np.asarray(bars.end_timestamp, dtype=np.int64)
+        self.low = np.asarray(bars.low, dtype=np.float64)
+        self.high = np.asarray(bars.high, dtype=np.float64)
+        self.close = np.asarray(bars.close, dtype=np.float64)
+        self.session_id = np.asarray(bars.session_id, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def time_range(self) -> tuple:
+        """資料的 (起點, 終點) 奈秒時間。"""
+        if len(self) == 0:
+            return 0, 0
+        return int(self.timestamp[0]), int(self.end_timestamp[-1])
+
+    def series(self, start=None, end=None, max_points: int = 4000, sessions: Optional[np.ndarray] = None) -> LodSeries:
+        """
+        取得 [start, end] 範圍內、最多約 max_points 點的走勢。
+
+        可見範圍內的 K 棒數不超過 max_points 時直接回傳各 K 棒收盤價；否則以 minmax
+        (每個像素區間的第一根收盤、最低價、最高價與最後一根收盤，點數不超過 max_points) 或 lttb 降採樣。
+
+        Args:
+            start / end: 可見範圍 (奈秒或可轉為 pd.Timestamp 的值，None 表示資料的起訖)。
+            max_points: 點數上限 (約等於圖的像素寬度的數倍)。
+            sessions: 若指定，只保留 session_id 符合條件的 K 棒 (布林遮罩，長度與 K 棒相同)。
+
+        Returns:
+            LodSeries (不同交易時段之間插入 NaN 斷點)。
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.timestamp, _to_ns(start), side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamp, _to_ns(end), side='right'))
+        rows = np.arange(lo, hi)
+        if sessions is not None:
+            rows = rows[sessions[lo:hi]]
+        price = self.close[rows]
+        if len(rows) > max_points:
+            ts = self.timestamp[rows]
+            if self.method == 'minmax':
+                x_range = (_to_ns(start) if start is not None else ts[0],
+                           _to_ns(end) if end is not None else ts[-1])
+                picked, price = minmax_points(ts, price, self.low[rows], self.high[rows],
+                                              max(1, max_points // 4), x_range)
+            else:
+                picked = lttb_indices(ts, price, max_points)
+                price = price[picked]
+            rows = rows[picked]
+        return self._with_gaps(rows, price)
+
+    def _with_gaps(self, rows: np.ndarray, price: np.ndarray) -> LodSeries:
+        """組成走勢，並在交易時段切換處插入 NaN 斷點。"""
+        ts = self.timestamp[rows]
+        sid = self.session_id[rows]
+        breaks = np.flatnonzero(sid[1:] != sid[:-1]) + 1
+        if len(breaks):
+            ts = np.insert(ts, breaks, self.end_timestamp[rows[breaks - 1]] + 1)
+            price = np.insert(price, breaks, np.nan)
+            sid = np.insert(sid, breaks, -1)
+        return LodSeries(ts, price, sid)
+
+
+def _to_ns(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return pd.Timestamp(value).value
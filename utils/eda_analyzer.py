@@ -1,3 +1,5 @@
+from typing import Optional
+
 import pandas as pd
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
@@ -5,123 +7,70 @@ import matplotlib.dates as mdates
 import seaborn as sns
 import numpy as np
 
-def plot_daily_close_price(df: pd.DataFrame):
+from utils.bar_builder import Bars, build_bars
+from utils.downsampling import LevelOfDetail
+from utils.histograms import VOLUME_BINS, BinSpec, PriceVolumeHistograms, price_volume_histograms
+from utils.trading_session import SessionCalendar, TAIFEX_CALENDAR, missing_sessions, session_bounds_ns
+
+def plot_daily_close_price(
+    df: Optional[pd.DataFrame] = None,
+    bars: Optional[Bars] = None,
+    calendar: SessionCalendar = TAIFEX_CALENDAR,
+    max_points: int = 4000,
+    method: str = 'minmax',
+    dynamic: bool = False,
+    show: bool = True
+):
     """
     繪製每日收盤價互動式走勢圖 (日盤/夜盤區分)，帶有日期範圍選擇器。
-    線段只在有實際交易數據的點上繪製，沒有交易則斷開。
+    線段只在同一交易時段內連接，沒有成交的時段 (休市) 以綠色區塊標示。
+
+    圖以 1 分 K 為基礎並依可見範圍降採樣 (見 utils.downsampling)，點數與資料期間長短無關；
+    多個月的資料建議傳入預先計算的 bars (e.g., session_bars(store) 的快取)，省去由 Tick 聚合的時間。
 
     Args:
-        df (pd.DataFrame): 包含 'close' 欄位的 DataFrame，索引為時間。
+        df (pd.DataFrame): 包含 'close' 欄位的 DataFrame，索引為時間 (bars 有給時可省略)。
+        bars (Bars): 預先計算的 K 棒。
+        calendar (SessionCalendar): 交易時段設定。
+        max_points (int): 每條線最多繪製的點數。
+        method (str): 降採樣方式，'minmax' (保留極值) 或 'lttb'。
+        dynamic (bool): 為 True 時回傳 FigureWidget (需要 ipywidgets)，縮放時依可見範圍重新取樣。
+        show (bool): 是否顯示圖表。
+
+    Returns:
+        go.Figure (dynamic 時為 go.FigureWidget)。
     """
-    start_time = df.index.min().floor('min')
-    end_time = df.index.max().ceil('min')
-    
-    # Create a full minute-by-minute index for the entire period
-    full_minute_index = pd.date_range(start=start_time, end=end_time, freq='min')
-    
-    # Ensure the original 'close' data is at minute frequency before reindexing
-    # Use .last() to pick the last observed price in each minute interval
-    # This handles cases where original data might be tick-level or irregular
-    minute_close_data = df['close'].resample('min').last()
-    
-    # Reindex the minute-level 'close' data to the full minute index
-    # This will introduce NaN for minutes where there's no original data after resampling
-    daily_close_resampled = minute_close_data.reindex(full_minute_index).to_frame()
-    
-    # Define day and night session time ranges
-    day_start_time = pd.to_datetime('08:45').time()
-    day_end_time = pd.to_datetime('13:45').time() # Exclusive
-    night_start_time = pd.to_datetime('15:00').time()
-    night_end_time = pd.to_datetime('05:00').time() # Exclusive, next day
-
-    time_only = daily_close_resampled.index.time
-
-    # Create boolean masks for each session
-    is_day_session = (time_only >= day_start_time) & \
-                     (time_only < day_end_time)
-
-    is_night_session = ((time_only >= night_start_time) & \
-                        (time_only <= pd.to_datetime('23:59:59').time())) | \
-                       (time_only < night_end_time)
-
-    # Create session-specific series, setting non-session times to NaN
-    # Plotly will automatically break lines at NaN values
-    # Apply ffill before applying session masks to ensure continuity within sessions
-    # Create session-specific series, setting non-session times to NaN
-    # Plotly will automatically break lines at NaN values
-    # Create session-specific series, setting non-session times to NaN
-    # For continuity within sessions during flat price periods (e.g., limit up/down),
-    # we ffill and bfill *within* the session boundaries.
-    # This ensures lines are drawn for continuous flat prices without "filling" non-trading gaps.
-    day_session_close = daily_close_resampled['close'].where(is_day_session)
-    night_session_close = daily_close_resampled['close'].where(is_night_session)
+    if bars is None:
+        volume_column = 'volume' if 'volume' in df.columns else None
+        bars = build_bars(df, 'time', '1min', volume_column=volume_column, calendar=calendar)
+    lod = LevelOfDetail(bars, method)
+    is_night = lod.session_id % 2 == 1
+    traces = [(mask, name, color) for mask, name, color in ((~is_night, '日盤', 'blue'), (is_night, '夜盤', 'red'))
+              if mask.any()]
 
     fig = go.Figure()
-
-    # Add traces for day and night sessions only if they have non-NaN data
-    if not day_session_close.dropna().empty:
-        fig.add_trace(go.Scatter(x=day_session_close.index, y=day_session_close.values,
-                                 mode='lines', name='日盤',
-                                 line=dict(color='blue'),
+    for mask, name, color in traces:
+        series = lod.series(max_points=max_points, sessions=mask)
+        fig.add_trace(go.Scatter(x=series.timestamp.view('datetime64[ns]'), y=series.price,
+                                 mode='lines', name=name,
+                                 line=dict(color=color),
                                  hovertemplate='%{fullData.name}<br>時間: %{x}<br>價格: %{y:,.0f}<extra></extra>',
                                  hoverlabel=dict(bgcolor="rgba(255, 255, 255, 0.7)", font_size=12, font_color="black")))
 
-    if not night_session_close.dropna().empty:
-        fig.add_trace(go.Scatter(x=night_session_close.index, y=night_session_close.values,
-                                 mode='lines', name='夜盤',
-                                 line=dict(color='red'),
-                                 hovertemplate='%{fullData.name}<br>時間: %{x}<br>價格: %{y:,.0f}<extra></extra>',
-                                 hoverlabel=dict(bgcolor="rgba(255, 255, 255, 0.7)", font_size=12, font_color="black")))
-
-    # Add green rectangles for sessions with no data (holidays)
-    shapes = []
-    all_dates = pd.to_datetime(df.index.date).unique()
-
-    for current_date in all_dates:
-        current_date_ts = pd.Timestamp(current_date)
-
-        # Check Day Session
-        day_session_start_dt = current_date_ts.replace(hour=day_start_time.hour, minute=day_start_time.minute, second=day_start_time.second)
-        day_session_end_dt = current_date_ts.replace(hour=day_end_time.hour, minute=day_end_time.minute, second=day_end_time.second)
-        
-        # Check if there's any actual data (not just ffilled NaNs) in the original df for this day session
-        day_data_exists = df.index.to_series().between(day_session_start_dt, day_session_end_dt, inclusive='both').any()
-        
-        if not day_data_exists: # If no original data for this day session
-            shapes.append(
-                dict(
-                    type="rect",
-                    xref="x", yref="paper",
-                    x0=day_session_start_dt, y0=0,
-                    x1=day_session_end_dt, y1=1,
-                    fillcolor="rgba(0,255,0,0.2)", # Green with transparency
-                    layer="below",
-                    line_width=0,
-                )
-            )
-
-        # Check Night Session
-        night_session_start_dt = current_date_ts.replace(hour=night_start_time.hour, minute=night_start_time.minute, second=night_start_time.second)
-        night_session_end_dt = (current_date_ts + pd.Timedelta(days=1)).replace(hour=night_end_time.hour, minute=night_end_time.minute, second=night_end_time.second)
-
-        # Check if there's any actual data in the original df for this night session
-        night_data_exists_part1 = df.index.to_series().between(night_session_start_dt, current_date_ts.replace(hour=23, minute=59, second=59), inclusive='both').any()
-        night_data_exists_part2 = df.index.to_series().between((current_date_ts + pd.Timedelta(days=1)).replace(hour=0, minute=0, second=0), night_session_end_dt, inclusive='both').any()
-        night_data_exists = night_data_exists_part1 or night_data_exists_part2
-        
-        if not night_data_exists: # If no original data for this night session
-            shapes.append(
-                dict(
-                    type="rect",
-                    xref="x", yref="paper",
-                    x0=night_session_start_dt, y0=0,
-                    x1=night_session_end_dt, y1=1,
-                    fillcolor="rgba(0,255,0,0.2)",
-                    layer="below",
-                    line_width=0,
-                )
-            )
-    
+    # 沒有成交的時段 (休市) 以綠色區塊標示
+    holiday_start, holiday_end = session_bounds_ns(missing_sessions(lod.session_id), calendar)
+    shapes = [
+        dict(
+            type="rect",
+            xref="x", yref="paper",
+            x0=pd.Timestamp(start), y0=0,
+            x1=pd.Timestamp(end), y1=1,
+            fillcolor="rgba(0,255,0,0.2)", # Green with transparency
+            layer="below",
+            line_width=0,
+        )
+        for start, end in zip(holiday_start, holiday_end)
+    ]
     fig.update_layout(shapes=shapes)
 
     fig.update_layout(
@@ -146,7 +95,23 @@ def plot_daily_close_price(df: pd.DataFrame):
             type="date"
         )
     )
-    fig.show()
+
+    if dynamic:
+        fig = go.FigureWidget(fig)
+
+        def resample_visible(axis, x_range):
+            start, end = (None, None) if x_range is None else x_range
+            with fig.batch_update():
+                for trace, (mask, _, _) in zip(fig.data, traces):
+                    series = lod.series(start, end, max_points, mask)
+                    trace.x = series.timestamp.view('datetime64[ns]')
+                    trace.y = series.price
+
+        fig.layout.xaxis.on_change(resample_visible, 'range')
+
+    if show:
+        fig.show()
+    return fig
 
 def plot_daily_volume(df: pd.DataFrame):
     """
@@ -174,78 +139,104 @@ def analyze_daily_volatility(df: pd.DataFrame):
     """
     進行基礎波動率分析 (日報酬率標準差)。
 
+    日收盤價取每日最後一筆成交 (索引可含同一時間的多筆成交)，沒有成交的日期不計入。
+
     Args:
         df (pd.DataFrame): 包含 'close' 欄位的 DataFrame，索引為時間。
+
+    Returns:
+        float: 日報酬率標準差。
     """
-    daily_returns = df['close'].resample('D').ffill().pct_change().dropna()
+    daily_returns = df['close'].resample('D').last().dropna().pct_change().dropna()
     daily_volatility = daily_returns.std()
     print(f"\n日報酬率標準差 (波動率): {daily_volatility:.4f}")
-
-def plot_price_volume_distribution(df: pd.DataFrame):
+    return daily_volatility
+
+def _price_volume_histograms(df, hist, cache, volume_bins: BinSpec = VOLUME_BINS) -> PriceVolumeHistograms:
+    """取得價格/成交量直方圖：優先使用傳入的 hist，其次為快取，最後才由 df 計算。"""
+    if hist is not None:
+        return hist
+    if cache is not None:
+        return cache.call(price_volume_histograms, df, volume_bins=volume_bins)
+    return price_volume_histograms(df, volume_bins=volume_bins)
+
+
+def plot_price_volume_distribution(
+    df: Optional[pd.DataFrame] = None,
+    hist: Optional[PriceVolumeHistograms] = None,
+    price_bins: int = 100,
+    cache=None
+):
     """
-    繪製價格與成交量分佈圖。
+    繪製價格與成交量分佈圖 (成交量以對數分箱)。
+
+    分佈由 utils.histograms 逐塊計算 (不把原始 Tick 交給繪圖函式庫)；
+    可傳入預先計算 (或由 iter_tick_chunks 串流計算、多份合併) 的 hist，
+    或以 cache (features.cache.FeatureCache) 重複使用相同資料的計算結果。
 
     Args:
-        df (pd.DataFrame): 包含 'close' 和 'volume' 欄位的 DataFrame。
+        df (pd.DataFrame): 包含 'close' 和 'volume' 欄位的 DataFrame (hist 有給時可省略)。
+        hist (PriceVolumeHistograms): price_volume_histograms 的結果。
+        price_bins (int): 價格分佈的最大箱數。
+        cache (FeatureCache): 可選的計算結果快取。
     """
+    hist = _price_volume_histograms(df, hist, cache)
+    price = hist.price.to_arrays(price_bins)
+    volume = hist.volume.to_arrays()
+
     plt.rcParams['font.family'] = ['Arial Unicode MS']
     plt.rcParams['axes.unicode_minus'] = False
 
     plt.figure(figsize=(12, 6))
     plt.subplot(1, 2, 1)
-    sns.histplot(df['close'], kde=False) # 關閉KDE以提高速度
+    plt.stairs(price.counts, price.edges[0], fill=True)
     plt.title('價格分佈')
     plt.xlabel('價格')
     plt.ylabel('頻率')
 
     plt.subplot(1, 2, 2)
-    sns.histplot(df['volume'], kde=False, bins=100)
+    plt.stairs(volume.counts, volume.edges[0], fill=True)
     plt.title('成交量分佈')
     plt.xlabel('成交量')
     plt.ylabel('頻率')
+    plt.xscale('log') # 對數分箱
     plt.yscale('log') # 將Y軸設置為對數刻度
     plt.tight_layout()
     plt.show()
 
-def plot_price_volume_scatter(df: pd.DataFrame):
+def plot_price_volume_scatter(
+    df: Optional[pd.DataFrame] = None,
+    hist: Optional[PriceVolumeHistograms] = None,
+    num_bins_price: int = 50,
+    num_bins_volume: int = 50,
+    volume_bins: BinSpec = VOLUME_BINS,
+    cache=None
+):
     """
     繪製價格與成交量的氣泡圖，氣泡大小表示該區域的數據點密度。
 
     Args:
-        df (pd.DataFrame): 包含 'close' (價格) 和 'volume' (成交量) 欄位的 DataFrame。
+        df (pd.DataFrame): 包含 'close' (價格) 和 'volume' (成交量) 欄位的 DataFrame (hist 有給時可省略)。
+        hist (PriceVolumeHistograms): price_volume_histograms 的結果。
+        num_bins_price / num_bins_volume (int): 價格與成交量的最大箱數。
+        volume_bins (BinSpec): 由 df 計算時成交量的分箱 (預設為對數分箱；
+            BinSpec(width=1) 為每口一格的線性分箱)。
+        cache (FeatureCache): 可選的計算結果快取。
     """
+    hist = _price_volume_histograms(df, hist, cache, volume_bins)
+    joint = hist.joint.to_arrays((num_bins_price, num_bins_volume))
+
+    # x 和 y 座標為 bin 的中心點，size 為頻率；只包含有數據的 bin
+    i, j = np.nonzero(joint.counts)
+    grouped_data = pd.DataFrame({
+        'price_center': joint.centers(0)[i],
+        'volume_center': joint.centers(1)[j],
+        'frequency': joint.counts[i, j],
+    })
+
     plt.rcParams['font.family'] = ['Arial Unicode MS']
     plt.rcParams['axes.unicode_minus'] = False
 
-    # 設定分箱數量
-    num_bins_price = 50
-    num_bins_volume = 50
-
-    # 計算價格和成交量的 2D 頻率分佈
-    # range 參數定義了每個維度的範圍，確保所有數據點都被包含
-    # bins 參數定義了每個維度的分箱數量
-    hist, xedges, yedges = np.histogram2d(df['close'], df['volume'],
-                                          bins=[num_bins_price, num_bins_volume],
-                                          range=[[df['close'].min(), df['close'].max()],
-                                                 [df['volume'].min(), df['volume'].max()]])
-
-    # 創建一個 DataFrame 來儲存氣泡圖的數據
-    # x 和 y 座標為 bin 的中心點，size 為頻率
-    x_centers = (xedges[:-1] + xedges[1:]) / 2
-    y_centers = (yedges[:-1] + yedges[1:]) / 2
-
-    # 將 2D 頻率分佈轉換為適合 seaborn.scatterplot 的長格式 DataFrame
-    plot_data = []
-    for i in range(len(x_centers)):
-        for j in range(len(y_centers)):
-            if hist[i, j] > 0: # 只包含有數據的 bin
-                plot_data.append({
-                    'price_center': x_centers[i],
-                    'volume_center': y_centers[j],
-                    'frequency': hist[i, j]
-                })
-    grouped_data = pd.DataFrame(plot_data)
-
     plt.figure(figsize=(12, 8))
     sns.scatterplot(
         data=grouped_data,
@@ -258,8 +249,10 @@ def plot_price_volume_scatter(df: pd.DataFrame):
         legend='full',
         alpha=0.7
     )
+    if joint.log[1]:
+        plt.yscale('log')
     plt.title('價格與成交量密度氣泡圖')
     plt.xlabel('價格')
     plt.ylabel('成交量')
     plt.grid(True, linestyle='--', alpha=0.7)
-    plt.show()
\ No newline at end of file
+    plt.show()
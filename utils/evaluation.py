@@ -0,0 +1,48 @@
+"""
+分類模型的評估指標。
+"""
+import math
+
+import numpy as np
+from sklearn.metrics import (
+    accuracy_score,
+    f1_score,
+    log_loss,
+    precision_score,
+    recall_score,
+    roc_auc_score,
+)
+
+
+def classification_metrics(y_true, y_score, threshold: float = 0.5) -> dict:
+    """
+    計算二元分類指標。
+
+    Args:
+        y_true: 0/1 標註 (NaN 的列會被略過)。
+        y_score: 模型輸出的正類機率。
+        threshold: 將機率轉為預測類別的門檻。
+
+    Returns:
+        dict: samples, positive_rate, accuracy, precision, recall, f1, roc_auc, log_loss。
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_score = np.asarray(y_score, dtype=np.float64)
+    valid = ~np.isnan(y_true) & ~np.isnan(y_score)
+    y_true = y_true[valid].astype(np.int8)
+    y_score = y_score[valid]
+    if len(y_true) == 0:
+        return {'samples': 0}
+
+    y_pred = (y_score >= threshold).astype(np.int8)
+    both_classes = len(np.unique(y_true)) == 2
+    return {
+        'samples': int(len(y_true)),
+        'positive_rate': float(y_true.mean()),
+        'accuracy': float(accuracy_score(y_true, y_pred)),
+        'precision': float(precision_score(y_true, y_pred, zero_division=0)),
+        'recall': float(recall_score(y_true, y_pred, zero_division=0)),
+        'f1': float(f1_score(y_true, y_pred, zero_division=0)),
+        'roc_auc': float(roc_auc_score(y_true, y_score)) if both_classes else math.nan,
+        'log_loss': float(log_loss(y_true, y_score, labels=[0, 1])),
+    }
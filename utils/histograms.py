@@ -0,0 +1,267 @@
+"""
+可逐塊累加、可合併的 1 維/2 維直方圖 (EDA 的價格與成交量分佈)。
+
+分箱使用與資料範圍無關的固定網格 (線性：寬度 width、以 origin 對齊；對數：每 10 倍
+bins_per_decade 格)，因此：
+    * 不需要先掃描一次資料求最小/最大值，Tick 可以分塊串流處理，記憶體只與分塊大小及
+      實際出現的箱數有關 (與總筆數無關)；
+    * 不同分塊、不同程序或不同月份的計數可直接相加 (Histogram.merge)；
+    * 以細網格 (e.g., 價格 1 個跳動點) 計算一次後，繪圖時再以 to_arrays(max_bins) 合併相鄰
+      箱為較粗的解析度，重複繪圖 (或改變箱數) 不需要重新讀取 Tick。
+"""
+import math
+from dataclasses import dataclass
+from typing import Iterable, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import TICK_SIZE
+from utils.instrumentation import instrument
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+# 對數分箱時，避免 log10(1000) = 2.9999999999999996 之類的誤差把邊界值放進前一格
+_LOG_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class BinSpec:
+    """
+    固定網格的分箱規則。
+
+    Attributes:
+        width: 線性分箱的寬度。
+        origin: 線性分箱的對齊點 (第 i 格為 [origin + i * width, origin + (i + 1) * width))。
+        log: 是否使用對數分箱 (只計入正值，0 與負值計為 dropped)。
+        bins_per_decade: 對數分箱每 10 倍的格數 (第 i 格為 [10^(i/b), 10^((i+1)/b)))。
+    """
+    width: float = 1.0
+    origin: float = 0.0
+    log: bool = False
+    bins_per_decade: int = 20
+
+    def index(self, values: np.ndarray) -> tuple:
+        """回傳 (格子編號 int64, 是否有效)；NaN、無限大與對數分箱的非正值為無效。"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.log:
+            valid = values > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scaled = np.log10(np.where(valid, values, 1.0)) * self.bins_per_decade + _LOG_EPSILON
+        else:
+            valid = np.isfinite(values)
+            scaled = (np.where(valid, values, self.origin) - self.origin) / self.width
+        return np.floor(scaled).astype(np.int64), valid
+
+    def edges(self, start: int, stop: int) -> np.ndarray:
+        """第 start ~ stop - 1 格的邊界 (長度 stop - start + 1)。"""
+        i = np.arange(start, stop + 1, dtype=np.float64)
+        if self.log:
+            return 10.0 ** (i / self.bins_per_decade)
+        return self.origin + i * self.width
+
+
+PRICE_BINS = BinSpec(width=TICK_SIZE)
+VOLUME_BINS = BinSpec(log=True, bins_per_decade=20)
+
+
+class HistogramArrays(NamedTuple):
+    """
+    可直接繪圖的直方圖陣列。
+
+    Attributes:
+        counts: int64 計數，shape 為各維度的箱數。
+        edges: 各維度的邊界陣列 (長度為箱數 + 1)。
+        log: 各維度是否為對數分箱。
+    """
+    counts: np.ndarray
+    edges: tuple
+    log: tuple
+
+    def centers(self, dim: int = 0) -> np.ndarray:
+        """第 dim 維各箱的中心 (對數分箱為幾何平均)。"""
+        edges = self.edges[dim]
+        if self.log[dim]:
+            return np.sqrt(edges[:-1] * edges[1:])
+        return (edges[:-1] + edges[1:]) / 2
+
+
+class Histogram:
+    """
+    固定網格的 1 維或 2 維直方圖，計數陣列只涵蓋實際出現過的格子範圍並依需要擴張。
+
+    Args:
+        *specs: 各維度的 BinSpec。
+
+    Attributes:
+        total: 累計輸入筆數。
+        dropped: 因數值無效 (見 BinSpec.index) 而未計入的筆數。
+
+    Example:
+        hist = Histogram(PRICE_BINS, VOLUME_BINS)
+        for chunk in iter_tick_chunks(paths, columns=['close', 'volume']):
+            hist.update(chunk['close'], chunk['volume'])
+        arrays = hist.to_arrays(max_bins=(50, 40))
+    """
+
+    def __init__(self, *specs: BinSpec):
+        if len(specs) not in (1, 2):
+            raise ValueError("只支援 1 維或 2 維直方圖")
+        self.specs = specs
+        self.counts = np.zeros((0,) * len(specs), dtype=np.int64)
+        self.offset = (0,) * len(specs)
+        self.total = 0
+        self.dropped = 0
+
+    @property
+    def ndim(self) -> int:
+        return len(self.specs)
+
+    def _grow(self, lo: tuple, hi: tuple):
+        """擴張計數陣列以涵蓋第 lo ~ hi (含) 格。"""
+        if self.counts.size:
+            lo = tuple(min(a, b) for a, b in zip(lo, self.offset))
+            hi = tuple(max(a, b + n - 1) for a, b, n in zip(hi, self.offset, self.counts.shape))
+        shape = tuple(h - l + 1 for l, h in zip(lo, hi))
+        if shape == self.counts.shape and lo == self.offset:
+            return
+        grown = np.zeros(shape, dtype=np.int64)
+        if self.counts.size:
+            grown[tuple(slice(o - l, o - l + n) for o, l, n in zip(self.offset, lo, self.counts.shape))] = self.counts
+        self.counts, self.offset = grown, lo
+
+    def add_indices(self, indices: tuple, valid: np.ndarray, total: Optional[int] = None):
+        """以各維度的格子編號 (見 BinSpec.index) 累加計數；valid 為 False 的列不計入。"""
+        total = len(valid) if total is None else total
+        self.total += total
+        indices = [idx[valid] for idx in indices]
+        n = len(indices[0])
+        self.dropped += total - n
+        if n == 0:
+            return
+        lo = tuple(int(idx.min()) for idx in indices)
+        hi = tuple(int(idx.max()) for idx in indices)
+        shape = tuple(h - l + 1 for l, h in zip(lo, hi))
+        flat = np.ravel_multi_index(tuple(idx - l for idx, l in zip(indices, lo)), shape)
+        local = np.bincount(flat, minlength=math.prod(shape)).reshape(shape)
+        self._grow(lo, hi)
+        self.counts[tuple(slice(l - o, l - o + s) for l, o, s in zip(lo, self.offset, shape))] += local
+
+    def update(self, *values) -> 'Histogram':
+        """累加一塊資料 (每個維度一個陣列，長度相同)。"""
+        if len(values) != self.ndim:
+            raise ValueError(f"需要 {self.ndim} 個陣列")
+        results = [spec.index(v) for spec, v in zip(self.specs, values)]
+        valid = results[0][1]
+        for _, v in results[1:]:
+            valid = valid & v
+        self.add_indices(tuple(idx for idx, _ in results), valid)
+        return self
+
+    def merge(self, other: 'Histogram') -> 'Histogram':
+        """合併另一個相同分箱規則的直方圖 (e.g., 其他分塊或程序的結果)。"""
+        if other.specs != self.specs:
+            raise ValueError("分箱規則不同，無法合併")
+        self.total += other.total
+        self.dropped += other.dropped
+        if other.counts.size:
+            hi = tuple(o + n - 1 for o, n in zip(other.offset, other.counts.shape))
+            self._grow(other.offset, hi)
+            self.counts[tuple(slice(oo - o, oo - o + n)
+                              for oo, o, n in zip(other.offset, self.offset, other.counts.shape))] += other.counts
+        return self
+
+    def to_arrays(self, max_bins: Union[int, tuple, None] = None) -> HistogramArrays:
+        """
+        去除兩端沒有資料的格子，並可將相鄰格合併為不超過 max_bins 格。
+
+        Args:
+            max_bins: 各維度的最大格數 (整數表示所有維度相同，None 表示不合併)。
+
+        Returns:
+            HistogramArrays。
+        """
+        counts, offset = self.counts, list(self.offset)
+        for dim in range(self.ndim):
+            other_axes = tuple(a for a in range(self.ndim) if a != dim)
+            nonzero = np.flatnonzero(counts.sum(axis=other_axes) if other_axes else counts)
+            if len(nonzero) == 0:
+                return HistogramArrays(np.zeros((0,) * self.ndim, dtype=np.int64),
+                                       tuple(np.zeros(1) for _ in self.specs), tuple(s.log for s in self.specs))
+            first, last = int(nonzero[0]), int(nonzero[-1])
+            counts = np.take(counts, np.arange(first, last + 1), axis=dim)
+            offset[dim] += first
+
+        if max_bins is not None and not isinstance(max_bins, tuple):
+            max_bins = (max_bins,) * self.ndim
+        edges = []
+        for dim, spec in enumerate(self.specs):
+            n = counts.shape[dim]
+            factor = 1 if max_bins is None else max(1, -(-n // max_bins[dim]))
+            if factor > 1:
+                padded = -(-n // factor) * factor
+                pad = [(0, 0)] * self.ndim
+                pad[dim] = (0, padded - n)
+                counts = np.pad(counts, pad)
+                shape = counts.shape[:dim] + (padded // factor, factor) + counts.shape[dim + 1:]
+                counts = counts.reshape(shape).sum(axis=dim + 1)
+                n = padded
+            edges.append(spec.edges(offset[dim], offset[dim] + n)[::factor])
+        return HistogramArrays(counts, tuple(edges), tuple(s.log for s in self.specs))
+
+
+class PriceVolumeHistograms(NamedTuple):
+    """
+    Attributes:
+        price: 價格的 1 維直方圖。
+        volume: 成交量的 1 維直方圖。
+        joint: (價格, 成交量) 的 2 維直方圖。
+    """
+    price: Histogram
+    volume: Histogram
+    joint: Histogram
+
+    def merge(self, other: 'PriceVolumeHistograms') -> 'PriceVolumeHistograms':
+        for mine, theirs in zip(self, other):
+            mine.merge(theirs)
+        return self
+
+
+def _iter_chunks(data, chunk_size: int) -> Iterable[pd.DataFrame]:
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+    else:
+        yield from data
+
+
+@instrument()
+def price_volume_histograms(
+    data,
+    price_bins: BinSpec = PRICE_BINS,
+    volume_bins: BinSpec = VOLUME_BINS,
+    price_column: str = 'close',
+    volume_column: str = 'volume',
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> PriceVolumeHistograms:
+    """
+    逐塊計算價格、成交量與兩者聯合分佈的直方圖，每塊的格子編號只計算一次。
+
+    Args:
+        data: DataFrame，或逐塊產生 DataFrame 的 iterable (e.g., iter_tick_chunks，
+            此時記憶體用量與總筆數無關)。
+        price_bins / volume_bins: 分箱規則 (預設價格每 1 跳動點一格、成交量每 10 倍 20 格)。
+        price_column / volume_column: 欄位名稱。
+        chunk_size: data 為 DataFrame 時每塊的筆數。
+
+    Returns:
+        PriceVolumeHistograms。
+    """
+    result = PriceVolumeHistograms(Histogram(price_bins), Histogram(volume_bins),
+                                   Histogram(price_bins, volume_bins))
+    for chunk in _iter_chunks(data, chunk_size):
+        price_idx, price_valid = price_bins.index(chunk[price_column].to_numpy())
+        volume_idx, volume_valid = volume_bins.index(chunk[volume_column].to_numpy())
+        result.price.add_indices((price_idx,), price_valid)
+        result.volume.add_indices((volume_idx,), volume_valid)
+        result.joint.add_indices((price_idx, volume_idx), price_valid & volume_valid)
+    return result
@@ -0,0 +1,460 @@
+"""
+管線的效能量測 (階段計時、筆數、記憶體、cProfile)。
+
+每個階段一筆記錄，以 JSON Lines 附加寫入追蹤檔 (多程序可同時寫入同一個檔案)，
+可再以 to_chrome_trace 轉為 Chrome 追蹤格式 (chrome://tracing、Perfetto)。
+記錄欄位：
+    name, pid, tid, depth, parent, start (epoch 秒), duration_s, cpu_s,
+    rows_in, rows_out, rss_mb, rss_delta_mb, peak_rss_mb (階段期間的最高 RSS)，
+    memory 開啟時另有 alloc_peak_mb / alloc_net_mb (tracemalloc)，
+    profile 開啟時另有 profile (該階段 cProfile 結果的 .prof 檔)，以及呼叫端附加的欄位。
+
+啟用方式：
+    * 環境變數：TICK_TRACE=<追蹤檔路徑>，TICK_TRACE_PROFILE=cprofile|tracemalloc|all
+      (於 import 時讀取，子程序會繼承)。
+    * 程式內：with tracing('trace.jsonl', profile=True): ...
+
+未啟用時 stage() 回傳共用的空物件、instrument() 包裝的函數只多一次旗標判斷，
+因此可以在正式執行時保留這些量測點。
+
+    @instrument()
+    def clean_data(df, ...): ...
+
+    with stage('pipeline.features', rows_in=n) as s:
+        ...
+        s.update(rows_out=len(result))
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+TRACE_ENV = 'TICK_TRACE'
+PROFILE_ENV = 'TICK_TRACE_PROFILE'
+PROFILE_MODES = ('cprofile', 'tracemalloc', 'all')
+MB = 1024 * 1024
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_HWM_PATTERN = re.compile(rb'VmHWM:\s+(\d+) kB')
+
+# 目前的 Tracer (None 表示未啟用)；instrument() 的包裝函數只檢查這個變數
+_tracer = None
+
+
+def _rss_bytes() -> int:
+    """目前的 RSS (bytes)；Linux 以外以 getrusage 的歷史最高值代替。"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return _max_rss_bytes()
+
+
+def _max_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _peak_rss_bytes() -> int:
+    """自上次 _reset_peak_rss 以來的最高 RSS (bytes)。"""
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            match = _HWM_PATTERN.search(f.read())
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    return _max_rss_bytes()
+
+
+def _reset_peak_rss() -> bool:
+    """將 VmHWM 重設為目前的 RSS (Linux 4.0+)；不支援時回傳 False (peak 為程序的歷史最高值)。"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def count_rows(value) -> Optional[int]:
+    """
+    推算物件的筆數：DataFrame/Series/ndarray 取長度，tuple (含 NamedTuple 結果) 取第一個元素的筆數。
+    無法推算時回傳 None。
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray)):
+        return len(value)
+    if isinstance(value, tuple) and value:
+        return count_rows(value[0])
+    return None
+
+
+class _NullStage:
+    """未啟用時的階段：所有操作都是空操作。"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def update(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """
+    一個量測中的階段 (由 stage() 建立)。
+
+    Attributes:
+        name: 階段名稱。
+        fields: 要寫入記錄的欄位 (rows_in、rows_out 與呼叫端附加的欄位)。
+    """
+
+    def __init__(self, tracer: 'Tracer', name: str, fields: dict):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.parent = None
+        self.depth = 0
+        self.child_rss_peak = 0
+        self.child_alloc_peak = 0
+
+    def update(self, **fields):
+        """附加或覆寫記錄欄位 (e.g., rows_out)。"""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.tracer._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        self.tracer._exit(self)
+        return False
+
+
+class Tracer:
+    """
+    收集階段記錄並寫入 JSON Lines 追蹤檔。
+
+    Args:
+        path: 追蹤檔路徑 (附加寫入)。
+        profile: 是否以 cProfile 記錄最外層的階段 (同一時間只有一個 profiler，
+            巢狀的階段包含在外層的結果中)；結果存為 <path>.<pid>-<序號>-<階段>.prof。
+        memory: 是否以 tracemalloc 記錄每個階段的配置量 (會明顯拖慢執行)。
+    """
+
+    def __init__(self, path: str, profile: bool = False, memory: bool = False):
+        self.path = path
+        self.profile = profile
+        self.memory = memory
+        self.records = 0
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = None
+        self._profiled_stage = None
+        self._started_tracemalloc = False
+        self._peak_resettable = _reset_peak_rss()
+        self._pid = os.getpid()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, s: Stage):
+        stack = self._stack()
+        if stack:
+            s.parent = stack[-1]
+            s.depth = len(stack)
+        stack.append(s)
+        if self.profile and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiled_stage = s
+            self._profiler.enable()
+        # 高水位在進入子階段時重設，重設前先把目前為止的最高值交給外層階段
+        if self.memory:
+            s.alloc_start, peak = tracemalloc.get_traced_memory()
+            if s.parent is not None:
+                s.parent.child_alloc_peak = max(s.parent.child_alloc_peak, peak)
+            tracemalloc.reset_peak()
+        s.rss_start = _rss_bytes()
+        if self._peak_resettable:
+            if s.parent is not None:
+                s.parent.child_rss_peak = max(s.parent.child_rss_peak, _peak_rss_bytes())
+            _reset_peak_rss()
+        s.cpu_start = time.process_time()
+        s.wall_start = time.time()
+        s.perf_start = time.perf_counter()
+
+    def _exit(self, s: Stage):
+        duration = time.perf_counter() - s.perf_start
+        cpu = time.process_time() - s.cpu_start
+        rss = _rss_bytes()
+        rss_peak = max(_peak_rss_bytes(), s.child_rss_peak, rss, s.rss_start)
+        record = {
+            'name': s.name,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'depth': s.depth,
+            'parent': s.parent.name if s.parent is not None else None,
+            'start': s.wall_start,
+            'duration_s': duration,
+            'cpu_s': cpu,
+            'rows_in': None,
+            'rows_out': None,
+            'rss_mb': rss / MB,
+            'rss_delta_mb': (rss - s.rss_start) / MB,
+            'peak_rss_mb': rss_peak / MB,
+        }
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            alloc_peak = max(peak, s.child_alloc_peak)
+            record['alloc_peak_mb'] = (alloc_peak - s.alloc_start) / MB
+            record['alloc_net_mb'] = (current - s.alloc_start) / MB
+            if s.parent is not None:
+                s.parent.child_alloc_peak = max(s.parent.child_alloc_peak, alloc_peak)
+        if s.parent is not None:
+            s.parent.child_rss_peak = max(s.parent.child_rss_peak, rss_peak)
+        if self._profiled_stage is s:
+            self._profiler.disable()
+            safe_name = re.sub(r'[^\w.-]+', '_', s.name)
+            profile_path = f'{self.path}.{os.getpid()}-{self.records:05d}-{safe_name}.prof'
+            self._profiler.dump_stats(profile_path)
+            record['profile'] = profile_path
+            self._profiler = self._profiled_stage = None
+        record.update(s.fields)
+
+        stack = self._stack()
+        if stack and stack[-1] is s:
+            stack.pop()
+        self.write(record)
+
+    def write(self, record: dict):
+        """寫入一筆記錄 (每筆一行並立即 flush，程序中斷時已完成的階段不會遺失)。"""
+        line = json.dumps(record, ensure_ascii=False, default=_json_default) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if not self._file.closed:
+            self._file.close()
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def enabled() -> bool:
+    """目前是否正在記錄。"""
+    return _tracer is not None
+
+
+def stage(name: str, rows_in: Optional[int] = None, **fields):
+    """
+    量測一段程式碼的 context manager；未啟用時回傳空物件。
+
+    Args:
+        name: 階段名稱 (建議以 模組.函數 或 管線.步驟 命名)。
+        rows_in: 輸入筆數。
+        **fields: 附加在記錄上的欄位 (需可轉為 JSON)。
+
+    Returns:
+        可呼叫 update(rows_out=..., ...) 的階段物件。
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_STAGE
+    if tracer._pid != os.getpid():
+        # fork 出來的子程序：改用自己的檔案代號，避免與父程序共用緩衝
+        tracer = _reopen_after_fork(tracer)
+    fields['rows_in'] = rows_in
+    return Stage(tracer, name, fields)
+
+
+def instrument(name: Optional[str] = None, rows_in: Optional[Callable] = None,
+               rows_out: Optional[Callable] = None) -> Callable:
+    """
+    以 stage() 量測函數每次呼叫的裝飾器。
+
+    Args:
+        name: 階段名稱 (預設為 模組.函數)。
+        rows_in: 由 (args, kwargs) 計算輸入筆數的函數；預設取第一個 DataFrame/Series/ndarray 參數的長度。
+        rows_out: 由回傳值計算輸出筆數的函數；預設為 count_rows。
+
+    Returns:
+        裝飾器。包裝後的函數保留原本的名稱、簽章與 __wrapped__。
+    """
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            n_in = rows_in(args, kwargs) if rows_in is not None else _first_rows(args, kwargs)
+            with stage(stage_name, rows_in=n_in) as s:
+                result = func(*args, **kwargs)
+                s.update(rows_out=rows_out(result) if rows_out is not None else count_rows(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def _first_rows(args: tuple, kwargs: dict) -> Optional[int]:
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            return len(value)
+    return None
+
+
+def _reopen_after_fork(tracer: Tracer) -> Tracer:
+    global _tracer
+    child = Tracer(tracer.path, tracer.profile, tracer.memory)
+    _tracer = child
+    return child
+
+
+def start_tracing(path: str, profile: bool = False, memory: bool = False) -> Tracer:
+    """開始記錄 (取代目前的 Tracer)，回傳新的 Tracer。"""
+    global _tracer
+    stop_tracing()
+    _tracer = Tracer(path, profile, memory)
+    return _tracer
+
+
+def stop_tracing():
+    """停止記錄並關閉追蹤檔。"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+@contextlib.contextmanager
+def tracing(path: str, profile: bool = False, memory: bool = False, chrome_path: Optional[str] = None):
+    """
+    在 with 區塊內啟用記錄，離開時還原先前的狀態。
+
+    Args:
+        path: JSON Lines 追蹤檔路徑。
+        profile: 是否記錄 cProfile (見 Tracer)。
+        memory: 是否以 tracemalloc 記錄配置量。
+        chrome_path: 若指定，離開時將追蹤檔轉為 Chrome 追蹤格式。
+
+    Yields:
+        Tracer。
+    """
+    global _tracer
+    previous = _tracer
+    tracer = _tracer = Tracer(path, profile, memory)
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        tracer.close()
+        if chrome_path is not None:
+            to_chrome_trace(path, chrome_path)
+
+
+def read_trace(path: str) -> pd.DataFrame:
+    """讀取 JSON Lines 追蹤檔為 DataFrame (每個階段一列)。"""
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.DataFrame(records)
+
+
+def summarize_trace(path: str) -> pd.DataFrame:
+    """依階段名稱彙總追蹤檔：呼叫次數、總/平均耗時、總筆數與最高 RSS，依總耗時排序。"""
+    trace = read_trace(path)
+    if trace.empty:
+        return trace
+    summary = trace.groupby('name').agg(
+        calls=('duration_s', 'size'),
+        total_s=('duration_s', 'sum'),
+        mean_s=('duration_s', 'mean'),
+        cpu_s=('cpu_s', 'sum'),
+        rows_in=('rows_in', 'sum'),
+        rows_out=('rows_out', 'sum'),
+        peak_rss_mb=('peak_rss_mb', 'max'),
+    )
+    return summary.sort_values('total_s', ascending=False)
+
+
+def to_chrome_trace(path: str, output_path: str) -> int:
+    """
+    將 JSON Lines 追蹤檔轉為 Chrome 追蹤格式 (complete event，ph='X')。
+
+    Args:
+        path: JSON Lines 追蹤檔。
+        output_path: 輸出的 .json 檔。
+
+    Returns:
+        事件數。
+    """
+    skip = {'name', 'pid', 'tid', 'start', 'duration_s'}
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            events.append({
+                'name': record['name'],
+                'cat': record['name'].split('.')[0],
+                'ph': 'X',
+                'ts': record['start'] * 1e6,
+                'dur': record['duration_s'] * 1e6,
+                'pid': record['pid'],
+                'tid': record['tid'],
+                'args': {key: value for key, value in record.items() if key not in skip},
+            })
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
+
+
+def _from_environment():
+    """依 TICK_TRACE / TICK_TRACE_PROFILE 環境變數啟用記錄。"""
+    path = os.environ.get(TRACE_ENV)
+    if not path:
+        return
+    mode = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if mode and mode not in PROFILE_MODES:
+        raise ValueError(f"{PROFILE_ENV} 必須是 {PROFILE_MODES} 之一")
+    start_tracing(path, profile=mode in ('cprofile', 'all'), memory=mode in ('tracemalloc', 'all'))
+
+
+_from_environment()
@@ -0,0 +1,259 @@
+"""
+以交易日/交易時段為單位分片、多程序平行執行 清洗 → 特徵 → 標註 的管線。
+
+原始 Tick 陣列只在主程序複製一次到 multiprocessing.shared_memory，各 worker 直接
+以 NumPy 陣列存取 (不 pickle DataFrame)，結果也寫回共享記憶體中的預先配置陣列：
+    1. 清洗：依交易時段分片 (同一時間戳的重複資料不會跨片)，各片以 clean_data 產生保留遮罩；
+       價格跳動檢查的滾動中位數在每個時段開始時重新計算，因此各片不需要前一片的資料。
+    2. 時段篩選：主程序以 classify_sessions 單次向量化完成。
+    3. 特徵與標註：依完整交易時段分片，每片往前多取 halo 筆作為指標暖機資料，
+       因此結果與單程序計算一致；標註不跨越時段收盤，不需要往後的重疊。
+"""
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from features.feature_set import FeatureSet
+from features.labeling import create_forward_labels
+from utils.data_cleaner import DEFAULT_RULES, CleaningRules, clean_data
+from utils.instrumentation import instrument, stage
+from utils.quality_stats import QualityReport
+from utils.shared_memory import allocate_array, array_view, attach_array, share_array
+from utils.trading_session import (
+    SESSION_OUTSIDE,
+    SessionCalendar,
+    TAIFEX_CALENDAR,
+    classify_sessions,
+    session_ids,
+)
+
+
+class PipelineResult(NamedTuple):
+    """
+    Attributes:
+        index: 清洗與時段篩選後的 DatetimeIndex (長度 n)。
+        price: 收盤價 (float64)。
+        session_id: 交易時段編號。
+        features: shape (n, k) 的 float32 特徵矩陣。
+        feature_columns: 特徵欄位名稱。
+        warmup: 指標暖機期遮罩。
+        labels: shape (n, H, K) 的 float32 標註張量 (見 create_forward_labels)。
+        report: 清洗的品質報告 (各分片合併)。
+    """
+    index: pd.DatetimeIndex
+    price: np.ndarray
+    session_id: np.ndarray
+    features: np.ndarray
+    feature_columns: list
+    warmup: np.ndarray
+    labels: np.ndarray
+    report: Optional[QualityReport] = None
+
+    def to_frame(self, windows: Sequence[str], thresholds: Sequence[float]) -> pd.DataFrame:
+        """展開為 DataFrame (標註欄位命名為 label_<window>_<threshold>)。"""
+        df = pd.DataFrame(self.features, index=self.index, columns=self.feature_columns)
+        df.insert(0, 'close', self.price)
+        df.insert(1, 'session_id', self.session_id)
+        for h, window in enumerate(windows):
+            for k, threshold in enumerate(thresholds):
+                df[f'label_{window}_{threshold:g}'] = self.labels[:, h, k]
+        return df
+
+
+# ----------------------------------------------------------------------
+# 分片
+# ----------------------------------------------------------------------
+def _balanced_shards(boundaries: np.ndarray, n: int, num_shards: int) -> list:
+    """
+    在允許的切點 (boundaries，已排序且含 0) 中挑選切點，使各片筆數接近 n / num_shards。
+    回傳 [(start, stop), ...]。
+    """
+    targets = np.linspace(0, n, num_shards + 1)[1:-1]
+    picks = boundaries[np.clip(np.searchsorted(boundaries, targets), 0, len(boundaries) - 1)]
+    edges = np.unique(np.r_[0, picks, n])
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+# ----------------------------------------------------------------------
+# worker
+# ----------------------------------------------------------------------
+def _clean_shard(task: tuple):
+    (start, stop), specs, keep_spec, rules = task
+    handles = {}
+    try:
+        columns = {}
+        for name, spec in specs.items():
+            handles[name], array = attach_array(spec)
+            columns[name] = array[start:stop]
+        handles['_keep'], keep = attach_array(keep_spec)
+
+        frame = pd.DataFrame(columns)
+        frame['_row'] = np.arange(start, stop)
+        cleaned, report = clean_data(frame, rules, return_report=True)
+        keep[start:stop] = False
+        keep[cleaned['_row'].to_numpy()] = True
+        return report
+    finally:
+        for shm in handles.values():
+            shm.close()
+
+
+def _feature_shard(task: tuple) -> int:
+    (start, stop), halo, feature_set, windows, thresholds, specs = task
+    handles = {}
+    try:
+        handles['ts'], ts = attach_array(specs['ts'])
+        handles['price'], price = attach_array(specs['price'])
+        handles['session'], sid = attach_array(specs['session'])
+        handles['features'], features = attach_array(specs['features'])
+
+        lead = min(halo, start)
+        if feature_set is not None:
+            matrix = feature_set.compute(price[start - lead:stop])
+            features[start:stop] = matrix.values[lead:]
+
+        if windows:
+            handles['labels'], labels = attach_array(specs['labels'])
+            series = pd.Series(price[start:stop], index=pd.DatetimeIndex(ts[start:stop].view('datetime64[ns]')))
+            result = create_forward_labels(series, windows, thresholds, sid[start:stop])
+            labels[start:stop] = result.labels
+        return stop - start
+    finally:
+        for shm in handles.values():
+            shm.close()
+
+
+# ----------------------------------------------------------------------
+# 主流程
+# ----------------------------------------------------------------------
+@instrument()
+def run_pipeline(
+    df: pd.DataFrame,
+    feature_set: Optional[FeatureSet] = None,
+    windows: Sequence[str] = (),
+    thresholds: Sequence[float] = (),
+    calendar: SessionCalendar = TAIFEX_CALENDAR,
+    rules: CleaningRules = DEFAULT_RULES,
+    n_workers: Optional[int] = None,
+    halo: Optional[int] = None,
+    shards_per_worker: int = 4,
+    price_column: str = 'close',
+    volume_column: str = 'volume',
+    output_dir: Optional[str] = None
+) -> PipelineResult:
+    """
+    平行執行 清洗 → 時段篩選 → 特徵 → 標註，結果與單程序依序呼叫
+    clean_data、process_time_series、FeatureSet.compute、create_forward_labels (帶 session_id) 相同。
+
+    Args:
+        df: 原始 Tick DataFrame (含 'timestamp'、price_column、volume_column 欄位)。
+            清洗只考慮這三個欄位。
+        feature_set: 要計算的特徵組合 (None 表示不計算特徵)。
+        windows / thresholds: 標註的週期與閾值 (空表示不計算標註)。
+        calendar: 交易時段設定。
+        rules: 清洗規則 (價格/成交量欄位以 price_column、volume_column 為準，交易時段以 calendar 為準)。
+        n_workers: 程序數 (預設為 CPU 核心數)。
+        halo: 特徵分片往前重疊的筆數；None 表示使用 feature_set.halo_rows()。
+        shards_per_worker: 每個程序平均分到的分片數 (用於負載平衡)。
+        price_column / volume_column: 價格與成交量欄位。
+        output_dir: 若指定，依時間順序將每個分片的結果寫成
+            part-00000.parquet、part-00001.parquet ...
+
+    Returns:
+        PipelineResult。
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    rules = dataclasses.replace(rules, price_column=price_column, volume_column=volume_column, calendar=calendar)
+    num_shards = max(1, n_workers * shards_per_worker)
+    windows, thresholds = list(windows), list(thresholds)
+
+    ts = pd.DatetimeIndex(pd.to_datetime(df['timestamp']))
+    if ts.tz is not None:
+        ts = ts.tz_localize(None)
+    ts = ts.as_unit('ns').asi8
+    order = np.argsort(ts, kind='stable')
+    raw = {
+        'timestamp': ts[order],
+        price_column: df[price_column].to_numpy(dtype=np.float64)[order],
+        volume_column: df[volume_column].to_numpy()[order],
+    }
+    shms = []
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            # 1. 清洗 (依交易時段分片；非交易時段的資料各自成片)
+            with stage('pipeline.clean', rows_in=len(ts)) as s:
+                specs = {}
+                for name, array in raw.items():
+                    shm, specs[name] = share_array(array)
+                    shms.append(shm)
+                keep_shm, keep_spec = allocate_array((len(ts),), np.bool_)
+                shms.append(keep_shm)
+                raw_session, raw_day = classify_sessions(raw['timestamp'], rules.calendar, require_session_open=False)
+                raw_sid = session_ids(raw_session, raw_day)
+                sid_starts = np.flatnonzero(np.r_[True, raw_sid[1:] != raw_sid[:-1]])
+                tasks = [(shard, specs, keep_spec, rules)
+                         for shard in _balanced_shards(sid_starts, len(ts), num_shards)]
+                report = QualityReport()
+                for shard_report in pool.map(_clean_shard, tasks):
+                    report.merge(shard_report)
+                keep = array_view(keep_shm, keep_spec).copy()
+                cleaned = {name: array[keep] for name, array in raw.items()}
+                s.update(rows_out=int(keep.sum()))
+
+            # 2. 時段篩選
+            with stage('pipeline.sessions', rows_in=len(cleaned['timestamp'])) as s:
+                session, trading_day = classify_sessions(cleaned['timestamp'], calendar)
+                in_session = session != SESSION_OUTSIDE
+                ts_out = cleaned['timestamp'][in_session]
+                price = cleaned[price_column][in_session]
+                sid = session_ids(session[in_session], trading_day[in_session])
+                n = len(ts_out)
+                s.update(rows_out=n)
+
+            # 3. 特徵與標註 (依完整交易時段分片)
+            with stage('pipeline.features', rows_in=n) as s:
+                columns = feature_set.columns if feature_set is not None else []
+                if halo is None:
+                    halo = feature_set.halo_rows() if feature_set is not None else 0
+                specs = {}
+                for name, array in (('ts', ts_out), ('price', price), ('session', sid)):
+                    shm, specs[name] = share_array(array)
+                    shms.append(shm)
+                features_shm, specs['features'] = allocate_array((n, len(columns)), np.float32)
+                labels_shm, specs['labels'] = allocate_array((n, len(windows), len(thresholds)), np.float32)
+                shms.extend([features_shm, labels_shm])
+
+                session_starts = np.flatnonzero(np.r_[True, sid[1:] != sid[:-1]]) if n else np.array([0])
+                shards = _balanced_shards(session_starts, n, num_shards)
+                tasks = [(shard, halo, feature_set, windows, thresholds, specs) for shard in shards]
+
+                features = np.empty((n, len(columns)), dtype=np.float32)
+                labels = np.empty((n, len(windows), len(thresholds)), dtype=np.float32)
+                feature_view = array_view(features_shm, specs['features'])
+                label_view = array_view(labels_shm, specs['labels'])
+                if output_dir is not None:
+                    os.makedirs(output_dir, exist_ok=True)
+                for part, ((start, stop), _) in enumerate(zip(shards, pool.map(_feature_shard, tasks))):
+                    features[start:stop] = feature_view[start:stop]
+                    labels[start:stop] = label_view[start:stop]
+                    if output_dir is not None:
+                        piece = PipelineResult(
+                            pd.DatetimeIndex(ts_out[start:stop].view('datetime64[ns]'), name='timestamp'),
+                            price[start:stop], sid[start:stop], features[start:stop], columns,
+                            np.zeros(stop - start, dtype=bool), labels[start:stop])
+                        piece.to_frame(windows, thresholds).to_parquet(
+                            os.path.join(output_dir, f'part-{part:05d}.parquet'))
+                s.update(rows_out=n, shards=len(shards))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    max_window = feature_set.max_window if feature_set is not None else 1
+    warmup = np.arange(n) < max_window - 1
+    index = pd.DatetimeIndex(ts_out.view('datetime64[ns]'), name='timestamp')
+    return PipelineResult(index, price, sid, features, columns, warmup, labels, report)
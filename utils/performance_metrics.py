@@ -0,0 +1,117 @@
+"""
+回測績效指標。
+
+所有函數皆以 NumPy 陣列為輸入，金額單位與輸入一致 (e.g., 新台幣)。
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def equity_curve(pnl: np.ndarray, initial: float = 0.0) -> np.ndarray:
+    """逐筆交易損益的累積權益曲線。"""
+    return initial + np.cumsum(np.asarray(pnl, dtype=np.float64))
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """
+    最大回撤 (金額，正數)：權益曲線自先前最高點 (含起點 0) 的最大跌幅。
+
+    Args:
+        equity: 權益曲線 (e.g., equity_curve 的輸出)。
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+    return float((peak - equity).max())
+
+
+def sharpe_ratio(returns: np.ndarray, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> float:
+    """
+    年化夏普比率 (無風險利率視為 0)：mean / std (ddof=1) * sqrt(periods_per_year)。
+
+    Args:
+        returns: 每期報酬 (或每期損益金額，資金固定時兩者的夏普比率相同)。
+        periods_per_year: 一年的期數 (日報酬為 252)。
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) < 2:
+        return math.nan
+    std = returns.std(ddof=1)
+    if std == 0:
+        return math.nan
+    return float(returns.mean() / std * math.sqrt(periods_per_year))
+
+
+def win_rate(pnl: np.ndarray) -> float:
+    """獲利交易 (pnl > 0) 佔全部交易的比例。"""
+    pnl = np.asarray(pnl)
+    return float((pnl > 0).mean()) if len(pnl) else math.nan
+
+
+def profit_factor(pnl: np.ndarray) -> float:
+    """總獲利 / 總虧損 (絕對值)；沒有虧損交易時為 inf。"""
+    pnl = np.asarray(pnl, dtype=np.float64)
+    gross_loss = -pnl[pnl < 0].sum()
+    gross_profit = pnl[pnl > 0].sum()
+    if gross_loss == 0:
+        return math.inf if gross_profit > 0 else math.nan
+    return float(gross_profit / gross_loss)
+
+
+def period_pnl(pnl: np.ndarray, period: np.ndarray, all_periods: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    將逐筆交易損益依期別 (e.g., 交易日) 加總。
+
+    Args:
+        pnl: 逐筆交易損益。
+        period: 每筆交易所屬的期別 (整數，e.g., 出場的交易日)。
+        all_periods: 完整的期別列表 (含沒有交易的期別，損益記為 0)；None 表示只用有交易的期別。
+
+    Returns:
+        依 all_periods (或排序後的期別) 順序的每期損益。
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    period = np.asarray(period)
+    if all_periods is None:
+        all_periods = np.unique(period)
+    position = np.searchsorted(all_periods, period)
+    return np.bincount(position, weights=pnl, minlength=len(all_periods))
+
+
+def summarize_trades(
+    pnl: np.ndarray,
+    period: Optional[np.ndarray] = None,
+    all_periods: Optional[np.ndarray] = None,
+    periods_per_year: int = TRADING_DAYS_PER_YEAR
+) -> dict:
+    """
+    計算常用績效指標。
+
+    Args:
+        pnl: 逐筆交易損益 (已扣除成本)。
+        period: 每筆交易的期別 (見 period_pnl)；提供時夏普比率以每期損益計算，否則以逐筆損益計算。
+        all_periods: 完整的期別列表。
+        periods_per_year: 一年的期數。
+
+    Returns:
+        dict: trades, total_pnl, avg_pnl, win_rate, profit_factor, max_drawdown, sharpe。
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    if period is not None:
+        sharpe = sharpe_ratio(period_pnl(pnl, period, all_periods), periods_per_year)
+    else:
+        sharpe = sharpe_ratio(pnl, periods_per_year)
+    return {
+        'trades': len(pnl),
+        'total_pnl': float(pnl.sum()),
+        'avg_pnl': float(pnl.mean()) if len(pnl) else math.nan,
+        'win_rate': win_rate(pnl),
+        'profit_factor': profit_factor(pnl),
+        'max_drawdown': max_drawdown(equity_curve(pnl)),
+        'sharpe': sharpe,
+    }
@@ -0,0 +1,459 @@
+"""
+即時推論服務 (asyncio)。
+
+資料流：
+    TickSource ──> 特徵更新 (逐筆, O(1)) ──> 有界佇列 ──> 微批次模型推論 ──> 發佈 (sink)
+
+    * 來源可替換：ReplaySource 以 1x / 10x / 最快速度重播 Parquet 歷史 Tick；
+      SocketSource 讀取本機 TCP 連線的逐行 Tick (serve_replay 可作為測試用的對端)。
+    * 特徵狀態在接收端逐筆更新，不受背壓影響；背壓只作用於待推論佇列：
+      'block' 讓來源等待 (適合重播)，'drop_oldest' 丟棄最舊的待推論 Tick (適合即時來源，避免延遲累積)。
+    * 模型以微批次呼叫：取得第一筆後，收集佇列中已到達的 Tick (最多 max_batch 筆)，
+      並最多再等待 max_delay 秒。
+    * 每個階段的延遲 (自 Tick 到達起算) 以近似分位數直方圖記錄，可輸出 p50/p99。
+"""
+import asyncio
+import json
+import math
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from features.feature_set import FeatureSet
+from utils.data_cleaner import DEFAULT_RULES, CleaningRules
+from utils.data_loader import TIMESTAMP_COLUMN, iter_tick_chunks
+from utils.quality_stats import QuantileSketch
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest')
+LATENCY_STAGES = ('feature', 'queue', 'model', 'total')
+
+
+class Tick(NamedTuple):
+    timestamp: int
+    price: float
+    volume: int
+
+
+class PredictionBatch(NamedTuple):
+    """
+    一次模型呼叫的結果 (每個欄位長度相同)。
+
+    Attributes:
+        timestamp: Tick 的交易所時間 (int64 奈秒)。
+        price: 成交價。
+        score: 模型輸出 (e.g., 上漲機率)。
+        arrival_ns: Tick 到達服務的時間 (time.perf_counter_ns)。
+        published_ns: 結果發佈的時間 (time.perf_counter_ns)。
+    """
+    timestamp: np.ndarray
+    price: np.ndarray
+    score: np.ndarray
+    arrival_ns: np.ndarray
+    published_ns: int
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {'price': self.price, 'score': self.score,
+             'latency_us': (self.published_ns - self.arrival_ns) / 1e3},
+            index=pd.DatetimeIndex(pd.to_datetime(self.timestamp), name='timestamp'),
+        )
+
+
+# ----------------------------------------------------------------------
+# Tick 來源
+# ----------------------------------------------------------------------
+class ReplaySource:
+    """
+    重播 Parquet 歷史 Tick。
+
+    Args:
+        paths: Parquet 檔案路徑 (見 utils.data_loader.iter_tick_chunks)。
+        speed: 重播倍速 (1.0 為原速、10.0 為十倍速)；None 表示不等待、以最快速度送出。
+        price_column: 價格欄位。
+        volume_column: 成交量欄位。
+        start / end: 重播的時間範圍。
+        batch_size: 每次自磁碟讀取的筆數。
+    """
+
+    def __init__(
+        self,
+        paths,
+        speed: Optional[float] = 1.0,
+        price_column: str = 'close',
+        volume_column: str = 'volume',
+        start=None,
+        end=None,
+        batch_size: int = 100_000
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed 必須 > 0 或為 None")
+        self.paths = paths
+        self.speed = speed
+        self.price_column = price_column
+        self.volume_column = volume_column
+        self.start = start
+        self.end = end
+        self.batch_size = batch_size
+
+    async def __aiter__(self):
+        origin_ts = None
+        origin_wall = None
+        chunks = iter_tick_chunks(self.paths, [self.price_column, self.volume_column],
+                                  self.start, self.end, self.batch_size)
+        for chunk in chunks:
+            ts = chunk[TIMESTAMP_COLUMN].to_numpy()
+            price = chunk[self.price_column].to_numpy(dtype=np.float64)
+            volume = chunk[self.volume_column].to_numpy()
+            if origin_ts is None and len(ts):
+                origin_ts = int(ts[0])
+                origin_wall = time.perf_counter()
+            for t, p, v in zip(ts.tolist(), price.tolist(), volume.tolist()):
+                if self.speed is None:
+                    # 最快速度：每筆仍讓出控制權一次，讓下游協程有機會執行
+                    await asyncio.sleep(0)
+                else:
+                    delay = origin_wall + (t - origin_ts) / 1e9 / self.speed - time.perf_counter()
+                    await asyncio.sleep(delay if delay > 0 else 0)
+                yield Tick(t, p, v)
+
+
+def _valid_tick(tick: Tick, rules: CleaningRules) -> bool:
+    """逐筆套用 CleaningRules 的缺值與零價格/零成交量規則。"""
+    price, volume = tick.price, tick.volume
+    if price is None or volume is None or not math.isfinite(price) or volume != volume:
+        return False
+    if rules.drop_zero_price and price <= 0:
+        return False
+    if rules.drop_zero_volume and volume <= 0:
+        return False
+    return True
+
+
+def _parse_line(line: bytes) -> Tick:
+    """解析一行 Tick：'timestamp_ns,price,volume' 或同名欄位的 JSON 物件。"""
+    line = line.strip()
+    if line.startswith(b'{'):
+        record = json.loads(line)
+        return Tick(int(record['timestamp']), float(record['price']), int(record['volume']))
+    t, p, v = line.split(b',')
+    return Tick(int(t), float(p), int(v))
+
+
+class SocketSource:
+    """
+    自本機 TCP 連線讀取逐行 Tick (模擬 WebSocket 行情源)；格式見 _parse_line。
+
+    Args:
+        host: 主機。
+        port: 連接埠。
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9000):
+        self.host = host
+        self.port = port
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield _parse_line(line)
+        finally:
+            writer.close()
+
+
+async def serve_replay(source, host: str = '127.0.0.1', port: int = 9000) -> asyncio.AbstractServer:
+    """
+    啟動一個本機 TCP 伺服器，將 source (e.g., ReplaySource) 的 Tick 逐行送給每個連線的客戶端，
+    作為 SocketSource 的對端。
+    """
+    async def handle(reader, writer):
+        try:
+            async for tick in source:
+                writer.write(f'{tick.timestamp},{tick.price!r},{tick.volume}\n'.encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+# ----------------------------------------------------------------------
+# 延遲統計
+# ----------------------------------------------------------------------
+class LatencyHistogram:
+    """
+    延遲分布 (奈秒)，以 QuantileSketch 記錄 (相對誤差 accuracy)，可合併。
+    record() 只把資料放入暫存區，累積 flush_size 筆後才批次寫入 sketch，讓熱路徑的成本維持在常數。
+
+    Args:
+        accuracy: 分位數的相對誤差。
+        flush_size: 暫存區筆數上限。
+    """
+
+    def __init__(self, accuracy: float = 0.01, flush_size: int = 4096):
+        self.sketch = QuantileSketch(accuracy)
+        self.flush_size = flush_size
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+        self._pending = []
+        self._pending_rows = 0
+
+    def record(self, latency_ns):
+        latency_ns = np.asarray(latency_ns, dtype=np.int64)
+        if len(latency_ns) == 0:
+            return
+        self._pending.append(latency_ns)
+        self._pending_rows += len(latency_ns)
+        if self._pending_rows >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        values = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+        self.sketch.update(values)
+        self.count += len(values)
+        self.total += int(values.sum())
+        self.maximum = max(self.maximum, int(values.max()))
+
+    def merge(self, other: 'LatencyHistogram'):
+        self.flush()
+        other.flush()
+        self.sketch.merge(other.sketch)
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def summary(self, quantiles: Sequence[float] = (0.5, 0.9, 0.99)) -> dict:
+        """回傳筆數、平均、分位數與最大值 (微秒)。"""
+        self.flush()
+        result = {'count': self.count, 'mean_us': self.total / self.count / 1e3 if self.count else np.nan}
+        for q in quantiles:
+            result[f'p{q * 100:g}_us'] = self.sketch.quantile(q) / 1e3
+        result['max_us'] = self.maximum / 1e3
+        return result
+
+
+# ----------------------------------------------------------------------
+# 推論服務
+# ----------------------------------------------------------------------
+def _score_function(model) -> Callable[[np.ndarray], np.ndarray]:
+    """將模型轉為 (b, k) float32 -> (b,) 的函數：優先使用 predict_proba 的正類機率，其次 predict。"""
+    if hasattr(model, 'predict_proba'):
+        return lambda x: np.asarray(model.predict_proba(x))[:, -1]
+    if hasattr(model, 'predict'):
+        return lambda x: np.asarray(model.predict(x)).reshape(len(x))
+    if callable(model):
+        return lambda x: np.asarray(model(x)).reshape(len(x))
+    raise TypeError("model 必須有 predict_proba / predict 方法或為可呼叫物件")
+
+
+class InferenceService:
+    """
+    即時推論服務。
+
+    Args:
+        source: 非同步可迭代的 Tick 來源 (ReplaySource、SocketSource 或任何 yield Tick 的物件)。
+        feature_set: 特徵組合 (欄位順序即模型輸入順序)。
+        model: 具 predict_proba / predict 的模型，或 (b, k) float32 陣列 -> (b,) 的函數；
+            XGBoost Booster 請以 models.inference.InferenceEngine 包裝 (inplace_predict，不建立 DMatrix)。
+        max_batch: 每次模型呼叫最多的 Tick 數。
+        max_delay: 收集微批次時最多額外等待的秒數；0 表示只收集已在佇列中的 Tick。
+            事件迴圈計時器的精度約 1 ms，小於此值的等待會被放大，延遲敏感時建議維持 0。
+        queue_size: 待推論佇列的容量。
+        overflow: 佇列已滿時的處理方式，'block' 或 'drop_oldest'。
+        sink: 收到 PredictionBatch 時呼叫的函數 (可為 async 函數)。
+        skip_warmup: 是否略過特徵仍在暖機期的 Tick (不送入模型)。
+        history: 可選的歷史價格，用於啟動前初始化特徵狀態。
+        rules: 清洗規則；價格/成交量缺值 (或非有限值) 及 drop_zero_price / drop_zero_volume 的 Tick
+            不會更新特徵，計入 counters['rejected']。價格跳動與重複資料的檢查需要前後文，不在此套用。
+
+    Example:
+        service = InferenceService(ReplaySource(paths, speed=10), FeatureSet(sma=[5, 20], rsi=[14]), model)
+        stats = asyncio.run(service.run())
+        print(service.latency_report())
+    """
+
+    def __init__(
+        self,
+        source,
+        feature_set: FeatureSet,
+        model,
+        max_batch: int = 256,
+        max_delay: float = 0.0,
+        queue_size: int = 10_000,
+        overflow: str = 'block',
+        sink: Optional[Callable] = None,
+        skip_warmup: bool = True,
+        history=None,
+        rules: CleaningRules = DEFAULT_RULES
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow 必須是 {OVERFLOW_POLICIES} 之一")
+        if max_batch < 1:
+            raise ValueError("max_batch 必須 >= 1")
+        self.source = source
+        self.features = feature_set.streaming()
+        if history is not None:
+            self.features.warm_up(history)
+        self.score = _score_function(model)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.sink = sink
+        self.skip_warmup = skip_warmup
+        self.rules = rules
+        self.latency: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+        self.counters = {'ticks': 0, 'rejected': 0, 'skipped_warmup': 0, 'dropped': 0, 'predicted': 0, 'batches': 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._stopping = False
+        # 微批次的預先配置緩衝區 (避免每批配置記憶體)
+        k = len(self.features.columns)
+        self._x = np.empty((max_batch, k), dtype=np.float32)
+        self._ts = np.empty(max_batch, dtype=np.int64)
+        self._price = np.empty(max_batch, dtype=np.float64)
+        self._arrival = np.empty(max_batch, dtype=np.int64)
+        self._ready = np.empty(max_batch, dtype=np.int64)
+
+    def stop(self):
+        """要求服務在處理完已接收的 Tick 後結束。"""
+        self._stopping = True
+
+    async def _ingest(self):
+        queue = self._queue
+        features = self.features
+        counters = self.counters
+        try:
+            async for tick in self.source:
+                arrival = time.perf_counter_ns()
+                counters['ticks'] += 1
+                if not _valid_tick(tick, self.rules):
+                    # 缺值或零價格不能進入特徵狀態 (一筆 NaN 會讓之後的指標全部變成 NaN)
+                    counters['rejected'] += 1
+                    continue
+                row = features.update(tick.price)
+                if self.skip_warmup and not features.ready:
+                    counters['skipped_warmup'] += 1
+                    continue
+                item = (arrival, time.perf_counter_ns(), tick.timestamp, tick.price, row)
+                if self.overflow == 'block':
+                    await queue.put(item)
+                else:
+                    if queue.full():
+                        queue.get_nowait()
+                        counters['dropped'] += 1
+                    queue.put_nowait(item)
+                if self._stopping:
+                    break
+        finally:
+            await queue.put(None)
+
+    async def _collect(self) -> int:
+        """收集一個微批次到預先配置的緩衝區，回傳筆數 (-1 表示來源已結束)。"""
+        queue = self._queue
+        item = await queue.get()
+        if item is None:
+            return -1
+        n = 0
+        deadline = time.perf_counter() + self.max_delay
+        while True:
+            self._arrival[n], self._ready[n], self._ts[n], self._price[n], self._x[n] = item
+            n += 1
+            if n == self.max_batch:
+                break
+            if not queue.empty():
+                item = queue.get_nowait()
+            else:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                # 保留結束標記給下一次 _collect
+                queue.put_nowait(None)
+                break
+        return n
+
+    async def _infer(self):
+        while True:
+            n = await self._collect()
+            if n < 0:
+                break
+            started = time.perf_counter_ns()
+            score = self.score(self._x[:n])
+            finished = time.perf_counter_ns()
+
+            arrival = self._arrival[:n]
+            if self.sink is not None:
+                batch = PredictionBatch(self._ts[:n].copy(), self._price[:n].copy(),
+                                        np.asarray(score, dtype=np.float64), arrival.copy(),
+                                        time.perf_counter_ns())
+                result = self.sink(batch)
+                if asyncio.iscoroutine(result):
+                    await result
+            published = time.perf_counter_ns()
+
+            self.latency['feature'].record(self._ready[:n] - arrival)
+            self.latency['queue'].record(started - self._ready[:n])
+            self.latency['model'].record(np.full(n, finished - started))
+            self.latency['total'].record(published - arrival)
+            self.counters['predicted'] += n
+            self.counters['batches'] += 1
+
+    async def run(self) -> dict:
+        """執行服務直到來源結束 (或 stop())，回傳計數與各階段延遲摘要。"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = False
+        started = time.perf_counter()
+        await asyncio.gather(self._ingest(), self._infer())
+        elapsed = time.perf_counter() - started
+        stats = dict(self.counters)
+        stats['elapsed_s'] = elapsed
+        stats['ticks_per_s'] = self.counters['ticks'] / elapsed if elapsed > 0 else np.nan
+        stats['mean_batch'] = self.counters['predicted'] / self.counters['batches'] if self.counters['batches'] else 0.0
+        stats['latency'] = {stage: hist.summary() for stage, hist in self.latency.items()}
+        return stats
+
+    def latency_report(self) -> pd.DataFrame:
+        """各階段延遲 (自 Tick 到達起算) 的摘要表，單位為微秒。"""
+        return pd.DataFrame({stage: hist.summary() for stage, hist in self.latency.items()}).T
+
+
+def run_replay(
+    paths,
+    feature_set: FeatureSet,
+    model,
+    speed: Optional[float] = 1.0,
+    **kwargs
+) -> dict:
+    """
+    以 ReplaySource 執行 InferenceService 的便利函數。
+
+    Args:
+        paths: Parquet 檔案路徑。
+        feature_set: 特徵組合。
+        model: 模型 (見 InferenceService)。
+        speed: 重播倍速，None 為最快速度。
+        **kwargs: 傳給 InferenceService 的其他參數。
+
+    Returns:
+        InferenceService.run() 的統計結果。
+    """
+    service = InferenceService(ReplaySource(paths, speed=speed), feature_set, model, **kwargs)
+    return asyncio.run(service.run())
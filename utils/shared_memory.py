@@ -0,0 +1,56 @@
+"""
+以 multiprocessing.shared_memory 在程序間共享 NumPy 陣列。
+
+主程序以 share_array / allocate_array 建立共享區塊並取得可 pickle 的 spec
+(名稱, shape, dtype)，worker 以 attach_array(spec) 取得同一塊記憶體上的陣列，
+不需要 pickle 陣列本身。建立者負責在結束時 close() 與 unlink()；worker 只需 close()。
+
+Example:
+    shm, spec = share_array(prices)
+    try:
+        with ProcessPoolExecutor() as pool:
+            pool.map(worker, [(spec, shard) for shard in shards])
+    finally:
+        shm.close()
+        shm.unlink()
+
+    def worker(task):
+        spec, (start, stop) = task
+        shm, prices = attach_array(spec)
+        try:
+            ...
+        finally:
+            shm.close()
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def share_array(array: np.ndarray) -> tuple:
+    """將陣列複製到新的共享記憶體區塊，回傳 (SharedMemory, spec)。"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def allocate_array(shape: tuple, dtype) -> tuple:
+    """配置未初始化的共享陣列，回傳 (SharedMemory, spec)。"""
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape)) * dtype.itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    return shm, (shm.name, shape, dtype.str)
+
+
+def attach_array(spec: tuple) -> tuple:
+    """在 worker 中依 spec 取得共享陣列，回傳 (SharedMemory, ndarray)。"""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def array_view(shm: shared_memory.SharedMemory, spec: tuple) -> np.ndarray:
+    """在建立者程序中取得共享區塊上的陣列 (不另外開啟區塊)。"""
+    _, shape, dtype = spec
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
@@ -0,0 +1,200 @@
+"""
+可重現的台指期風格合成 Tick 資料，供效能測試與開發使用 (真實資料無法放進版本庫)。
+
+資料特性：
+    * 只在交易日 (週一至週五、扣除 calendar.holidays) 的日盤與夜盤產生成交；
+      日盤成交頻率高於夜盤，另有少量落在非交易時段的成交 (測試時段篩選)。
+    * 爆量：部分成交集中在時段內隨機的短暫區間，時間戳為毫秒，因此會有同一時間戳的多筆成交。
+    * 完全重複的列 (相同時間、價格、成交量)、價格跳動異常 (單筆偏離數 %)、缺值與零成交量 (測試清洗)。
+    * 價格為以跳動點為單位的隨機漫步，每個時段開盤有跳空。
+相同的參數與 seed 一定產生相同的資料，且與分塊大小無關。
+"""
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_loader import TICK_SIZE
+from utils.trading_session import NS_PER_DAY, SessionCalendar, TAIFEX_CALENDAR
+
+
+@dataclass(frozen=True)
+class SyntheticProfile:
+    """
+    合成資料的參數。
+
+    Attributes:
+        day_rate / night_rate: 日盤/夜盤平均每秒成交筆數。
+        burst_fraction: 屬於爆量區間的成交比例。
+        bursts_per_session: 每個時段的爆量區間數。
+        burst_seconds: 爆量區間的平均長度 (秒)。
+        duplicate_rate: 完全重複列的比例。
+        jump_rate: 價格異常跳動的比例。
+        jump_size: 異常跳動的幅度範圍 (相對價格)。
+        null_rate: 價格缺值的比例。
+        zero_volume_rate: 零成交量的比例。
+        outside_rate: 落在非交易時段的成交比例。
+        base_price: 起始價格。
+        gap_ticks: 每個時段開盤跳空的標準差 (跳動點)。
+    """
+    day_rate: float = 8.0
+    night_rate: float = 1.5
+    burst_fraction: float = 0.2
+    bursts_per_session: int = 6
+    burst_seconds: float = 20.0
+    duplicate_rate: float = 0.002
+    jump_rate: float = 0.0002
+    jump_size: tuple = (0.04, 0.08)
+    null_rate: float = 0.0001
+    zero_volume_rate: float = 0.0005
+    outside_rate: float = 0.0005
+    base_price: float = 20000.0
+    gap_ticks: float = 40.0
+
+
+DEFAULT_PROFILE = SyntheticProfile()
+
+
+def _sessions(start, calendar: SessionCalendar, profile: SyntheticProfile) -> Iterator[tuple]:
+    """依序產生 (開始奈秒, 長度奈秒, 平均頻率) 的交易時段，無限延伸。"""
+    day_start, day_end, night_start, night_end = calendar.bounds_ns()
+    holidays = set(calendar.holiday_days().tolist())
+    day = pd.Timestamp(start).normalize().value // NS_PER_DAY
+    night_length = night_end + NS_PER_DAY - night_start if night_end <= night_start else night_end - night_start
+    while True:
+        # 1970-01-01 為週四，(day + 3) % 7 < 5 即週一至週五
+        if (day + 3) % 7 < 5 and day not in holidays:
+            base = day * NS_PER_DAY
+            yield base + day_start, day_end - day_start, profile.day_rate
+            yield base + night_start, night_length, profile.night_rate
+        day += 1
+
+
+def _session_ticks(rng: np.random.Generator, start: int, length: int, count: int,
+                   profile: SyntheticProfile) -> np.ndarray:
+    """產生一個時段內 count 筆依序排列的毫秒時間戳 (含爆量區間)。"""
+    offsets = rng.random(count) * length
+    burst = rng.random(count) < profile.burst_fraction
+    n_burst = int(burst.sum())
+    if n_burst and profile.bursts_per_session > 0:
+        centers = rng.random(profile.bursts_per_session) * length
+        offsets[burst] = (centers[rng.integers(0, len(centers), n_burst)]
+                          + rng.exponential(profile.burst_seconds * 1e9, n_burst))
+    offsets = np.clip(offsets, 0, length - 1)
+    ts = start + offsets.astype(np.int64)
+    ts -= ts % 1_000_000
+    ts.sort()
+    return ts
+
+
+def iter_synthetic_ticks(
+    n_ticks: int,
+    start='2025-01-02',
+    seed: int = 0,
+    calendar: SessionCalendar = TAIFEX_CALENDAR,
+    profile: SyntheticProfile = DEFAULT_PROFILE,
+    chunk_ticks: int = 1_000_000
+) -> Iterator[pd.DataFrame]:
+    """
+    逐塊產生合成 Tick (欄位: timestamp, close, volume)，每塊為完整的交易時段、約 chunk_ticks 筆。
+
+    Args:
+        n_ticks: 交易時段內的成交筆數 (另外加上重複列與非交易時段的成交)。
+        start: 起始日期。
+        seed: 亂數種子。
+        calendar: 交易時段與休市日。
+        profile: 資料特性參數。
+        chunk_ticks: 每塊的目標筆數。
+
+    Yields:
+        依時間排序的 DataFrame。
+    """
+    rng = np.random.default_rng(seed)
+    price = profile.base_price
+    produced = 0
+    pending = []
+    pending_rows = 0
+    for session_start, length, rate in _sessions(start, calendar, profile):
+        if produced >= n_ticks:
+            break
+        count = min(int(rng.poisson(rate * length / 1e9)), n_ticks - produced)
+        if count == 0:
+            continue
+        produced += count
+        ts = _session_ticks(rng, session_start, length, count, profile)
+
+        # 價格：跳動點隨機漫步，開盤跳空
+        steps = rng.choice(np.array([-2, -1, 0, 1, 2]), size=count, p=[0.05, 0.25, 0.4, 0.25, 0.05])
+        steps[0] += int(round(rng.normal(0, profile.gap_ticks)))
+        close = price + np.cumsum(steps) * TICK_SIZE
+        price = float(close[-1])
+        volume = rng.geometric(0.45, count).astype(np.int32)
+
+        # 非交易時段的零星成交 (時段結束後 1~60 分鐘)
+        n_outside = rng.binomial(count, profile.outside_rate)
+        if n_outside:
+            at = rng.integers(0, count, n_outside)
+            outside_ts = session_start + length + rng.integers(60, 3600, n_outside) * 1_000_000_000
+            ts = np.concatenate([ts, outside_ts])
+            close = np.concatenate([close, close[at]])
+            volume = np.concatenate([volume, volume[at]])
+            order = np.argsort(ts, kind='stable')
+            ts, close, volume = ts[order], close[order], volume[order]
+
+        # 完全重複的列
+        repeats = np.ones(len(ts), dtype=np.int64)
+        repeats[rng.random(len(ts)) < profile.duplicate_rate] = 2
+        ts, close, volume = np.repeat(ts, repeats), np.repeat(close, repeats), np.repeat(volume, repeats)
+
+        # 異常跳動、缺值、零成交量 (不影響後續的隨機漫步)
+        close = close.astype(np.float64)
+        jumps = np.flatnonzero(rng.random(len(close)) < profile.jump_rate)
+        sign = rng.choice(np.array([-1.0, 1.0]), len(jumps))
+        close[jumps] *= 1.0 + sign * rng.uniform(*profile.jump_size, len(jumps))
+        close[rng.random(len(close)) < profile.null_rate] = np.nan
+        volume[rng.random(len(volume)) < profile.zero_volume_rate] = 0
+
+        pending.append((ts, close, volume))
+        pending_rows += len(ts)
+        if pending_rows >= chunk_ticks:
+            yield _frame(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        yield _frame(pending)
+
+
+def _frame(parts: list) -> pd.DataFrame:
+    ts, close, volume = (np.concatenate(columns) for columns in zip(*parts))
+    return pd.DataFrame({'timestamp': ts.view('datetime64[ns]'), 'close': close, 'volume': volume})
+
+
+def generate_ticks(n_ticks: int, start='2025-01-02', seed: int = 0,
+                   calendar: SessionCalendar = TAIFEX_CALENDAR,
+                   profile: SyntheticProfile = DEFAULT_PROFILE) -> pd.DataFrame:
+    """產生合成 Tick 並合併為單一 DataFrame；參數見 iter_synthetic_ticks。"""
+    return pd.concat(list(iter_synthetic_ticks(n_ticks, start, seed, calendar, profile)), ignore_index=True)
+
+
+def write_synthetic_parquet(path: str, n_ticks: int, start='2025-01-02', seed: int = 0,
+                            calendar: SessionCalendar = TAIFEX_CALENDAR,
+                            profile: SyntheticProfile = DEFAULT_PROFILE,
+                            row_group_size: Optional[int] = 1_000_000) -> int:
+    """
+    將合成 Tick 逐塊寫入單一 Parquet 檔 (記憶體只保留一塊)，回傳寫入的筆數。
+    """
+    rows = 0
+    writer = None
+    try:
+        for chunk in iter_synthetic_ticks(n_ticks, start, seed, calendar, profile):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table, row_group_size=row_group_size)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -0,0 +1,282 @@
+import dataclasses
+import json
+import os
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_cleaner import DEFAULT_RULES, clean_data
+from utils.data_loader import TIMESTAMP_COLUMN, load_ticks
+from utils.instrumentation import instrument
+from utils.trading_session import (
+    SESSION_DAY,
+    SESSION_NAMES,
+    SESSION_NIGHT,
+    SESSION_OUTSIDE,
+    SessionCalendar,
+    TAIFEX_CALENDAR,
+    classify_sessions,
+    session_ids,
+)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 2
+# 分割檔中記錄每筆資料來源檔案的欄位 (值為 manifest['source_ids'] 的編號，查詢時不回傳)
+SOURCE_COLUMN = '_source'
+
+
+def _day_string(trading_day: int) -> str:
+    return str(np.datetime64(int(trading_day), 'D'))
+
+
+def _session_code(session_id: int) -> int:
+    return SESSION_NIGHT if session_id % 2 else SESSION_DAY
+
+
+class TickStore:
+    """
+    本地 Tick 資料庫：以「交易日 × 盤別」分割儲存清洗後的 Tick (Parquet)，
+    並以 manifest.json 記錄每個分割的筆數、時間範圍與價格範圍。
+
+    每筆資料記錄其來源檔案 (SOURCE_COLUMN)；來源檔案變動時，先移除該檔案先前寫入的資料，
+    再與其他檔案的資料合併，因此來源檔案中被修正或刪除的成交不會殘留在資料庫中。
+
+    目錄結構：
+        root/
+            manifest.json
+            trading_day=2025-04-01/session=day/ticks.parquet
+            trading_day=2025-04-01/session=night/ticks.parquet
+
+    session_id 的定義見 utils.trading_session.session_ids。
+    """
+
+    def __init__(self, root: str, calendar: SessionCalendar = TAIFEX_CALENDAR, price_column: str = 'close'):
+        self.root = root
+        self.calendar = calendar
+        self.price_column = price_column
+        self.rules = dataclasses.replace(DEFAULT_RULES, price_column=price_column, calendar=calendar)
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    # ------------------------------------------------------------------
+    # manifest
+    # ------------------------------------------------------------------
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {'version': MANIFEST_VERSION, 'partitions': {}, 'sources': {}, 'source_ids': {}}
+        with open(self.manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest.setdefault('source_ids', {})
+        manifest['version'] = MANIFEST_VERSION
+        return manifest
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _source_id(self, source: str) -> int:
+        source_ids = self.manifest['source_ids']
+        if source not in source_ids:
+            source_ids[source] = max(source_ids.values(), default=-1) + 1
+        return source_ids[source]
+
+    def _partition_path(self, session_id: int) -> str:
+        name = SESSION_NAMES[_session_code(session_id)]
+        return os.path.join(f'trading_day={_day_string(session_id // 2)}', f'session={name}', 'ticks.parquet')
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+    @instrument()
+    def ingest(self, paths: Iterable[str], **load_kwargs) -> list:
+        """
+        增量匯入原始 Parquet 檔：只重新寫入來源檔案有變動的交易時段。
+
+        已匯入且檔案大小/修改時間未變的檔案會直接略過；檔案有變動時，該檔案現在與先前涉及的
+        所有交易時段都會重新寫入 (先移除該檔案的舊資料再合併新資料)。跨檔案的夜盤
+        (e.g., 月底夜盤延續到下個月檔) 會與其他檔案的資料合併。
+
+        Args:
+            paths: 原始 Parquet 檔路徑。
+            **load_kwargs: 傳給 load_ticks 的參數 (e.g., columns)。
+
+        Returns:
+            本次寫入 (或因資料被移除而刪除) 的 session_id 列表。
+        """
+        written = []
+        for path in paths:
+            source = os.path.abspath(path)
+            stat = os.stat(source)
+            signature = [stat.st_size, stat.st_mtime_ns]
+            if self.manifest['sources'].get(source) == signature:
+                continue
+
+            raw = load_ticks(source, **load_kwargs)
+            session, trading_day = classify_sessions(raw[TIMESTAMP_COLUMN].to_numpy(), self.calendar,
+                                                     require_session_open=False)
+            ids = session_ids(session, trading_day)
+            in_session = session != SESSION_OUTSIDE
+            unique_ids, counts = np.unique(ids[in_session], return_counts=True)
+
+            # 這個檔案先前寫入、但新版本已沒有資料的時段也要重寫 (筆數記為 0)
+            pending = {int(key): 0 for key, entry in self.manifest['partitions'].items()
+                       if source in entry['sources']}
+            pending.update(zip(unique_ids.tolist(), counts.tolist()))
+            if pending:
+                written.extend(self._write_sessions(source, raw.loc[np.isin(ids, unique_ids)], pending))
+
+            self.manifest['sources'][source] = signature
+            self._save_manifest()
+        return written
+
+    def _write_sessions(self, source: str, new_rows: pd.DataFrame, pending: dict) -> list:
+        source_id = self._source_id(source)
+        frames = []
+        for session_id in pending:
+            if str(session_id) in self.manifest['partitions']:
+                existing = self._read_tagged(str(session_id))
+                frames.append(existing.loc[existing[SOURCE_COLUMN] != source_id])
+        frames.append(new_rows.assign(**{SOURCE_COLUMN: np.int32(source_id)}))
+        # 清洗前先依時間排序 (重新匯入較早的檔案時，新資料會排在其他檔案的資料之前)
+        combined = pd.concat(frames, ignore_index=True).sort_values(TIMESTAMP_COLUMN, kind='stable')
+        combined = clean_data(combined, self.rules).reset_index(drop=True)
+
+        ts = combined[TIMESTAMP_COLUMN].to_numpy()
+        session, trading_day = classify_sessions(ts, self.calendar, require_session_open=False)
+        ids = session_ids(session, trading_day)
+
+        written = []
+        for session_id in sorted(pending):
+            part = combined.loc[ids == session_id].reset_index(drop=True)
+            key = str(session_id)
+            relative_path = self._partition_path(session_id)
+            full_path = os.path.join(self.root, relative_path)
+            if part.empty:
+                if self.manifest['partitions'].pop(key, None) is not None:
+                    os.remove(full_path)
+                    written.append(session_id)
+                continue
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), full_path)
+
+            sources = self.manifest['partitions'].get(key, {}).get('sources', {})
+            if pending[session_id]:
+                sources[source] = pending[session_id]
+            else:
+                sources.pop(source, None)
+            part_ts = part[TIMESTAMP_COLUMN].to_numpy()
+            entry = {
+                'session_id': session_id,
+                'trading_day': _day_string(session_id // 2),
+                'session': SESSION_NAMES[_session_code(session_id)],
+                'path': relative_path,
+                'rows': len(part),
+                'start_ns': int(part_ts[0]),
+                'end_ns': int(part_ts[-1]),
+                'sources': sources,
+            }
+            if self.price_column in part.columns:
+                entry['min_price'] = float(part[self.price_column].min())
+                entry['max_price'] = float(part[self.price_column].max())
+            self.manifest['partitions'][key] = entry
+            written.append(session_id)
+        return written
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def partitions(self, start=None, end=None, sessions: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        回傳符合條件的分割清單 (manifest 內容)，依 session_id 排序。
+
+        Args:
+            start: 起始交易日 (含)，None 表示不限制。
+            end: 結束交易日 (含)，None 表示不限制。
+            sessions: 盤別篩選，e.g., ['night']；None 表示全部。
+        """
+        columns = ['session_id', 'trading_day', 'session', 'path', 'rows', 'start_ns', 'end_ns',
+                   'min_price', 'max_price']
+        entries = pd.DataFrame(list(self.manifest['partitions'].values()), columns=columns)
+        if entries.empty:
+            return entries
+        days = pd.to_datetime(entries['trading_day'])
+        mask = np.ones(len(entries), dtype=bool)
+        if start is not None:
+            mask &= days >= pd.Timestamp(start).normalize()
+        if end is not None:
+            mask &= days <= pd.Timestamp(end).normalize()
+        if sessions is not None:
+            mask &= entries['session'].isin(list(sessions))
+        return entries.loc[mask].sort_values('session_id').reset_index(drop=True)
+
+    def read_partition(self, key: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """以 memory map 讀取單一分割 (key 為 session_id 字串)；timestamp 欄位為 int64 奈秒。"""
+        entry = self.manifest['partitions'][key]
+        if columns is not None:
+            columns = [TIMESTAMP_COLUMN] + [c for c in columns if c != TIMESTAMP_COLUMN]
+        table = pq.read_table(os.path.join(self.root, entry['path']), columns=columns, memory_map=True)
+        if SOURCE_COLUMN in table.column_names:
+            table = table.drop([SOURCE_COLUMN])
+        return table.to_pandas()
+
+    def _read_tagged(self, key: str) -> pd.DataFrame:
+        """讀取分割並保留來源欄位；舊版 (未記錄來源) 的分割只有單一來源時以該來源補上。"""
+        entry = self.manifest['partitions'][key]
+        df = pq.read_table(os.path.join(self.root, entry['path']), memory_map=True).to_pandas()
+        if SOURCE_COLUMN not in df.columns:
+            if len(entry['sources']) != 1:
+                raise ValueError(f"分割 {entry['path']} 沒有來源欄位且來自多個檔案，請重新建立資料庫")
+            df[SOURCE_COLUMN] = np.int32(self._source_id(next(iter(entry['sources']))))
+        return df
+
+    def iter_partitions(
+        self,
+        start=None,
+        end=None,
+        sessions: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None
+    ) -> Iterator[tuple]:
+        """
+        依時間順序逐一讀取符合條件的分割 (以 memory map 開啟)。
+
+        Yields:
+            (session_id, DataFrame)；DataFrame 的 timestamp 欄位為 int64 奈秒。
+        """
+        for session_id in self.partitions(start, end, sessions)['session_id'].tolist():
+            yield session_id, self.read_partition(str(session_id), columns)
+
+    @instrument()
+    def query(
+        self,
+        start=None,
+        end=None,
+        sessions: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """
+        讀取符合條件的 Tick，格式與 process_time_series 的輸出相同
+        (DatetimeIndex，並含 'session'、'trading_day'、'session_id' 欄位)。
+
+        Example:
+            store.query('2025-03-01', '2025-04-15', sessions=['night'])
+        """
+        frames = []
+        for session_id, part in self.iter_partitions(start, end, sessions, columns):
+            part['session'] = np.int8(_session_code(session_id))
+            part['trading_day'] = pd.Timestamp(_day_string(session_id // 2))
+            part['session_id'] = np.int64(session_id)
+            frames.append(part)
+        if not frames:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name=TIMESTAMP_COLUMN))
+        df = pd.concat(frames, ignore_index=True)
+        df.index = pd.DatetimeIndex(pd.to_datetime(df.pop(TIMESTAMP_COLUMN)), name=TIMESTAMP_COLUMN)
+        return df
@@ -0,0 +1,201 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import instrument
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+# 交易時段代碼
+SESSION_OUTSIDE = 0
+SESSION_DAY = 1
+SESSION_NIGHT = 2
+SESSION_NAMES = {SESSION_DAY: 'day', SESSION_NIGHT: 'night'}
+
+
+def _parse_hhmm(value: str) -> int:
+    """將 'HH:MM' (或 'HH:MM:SS') 字串轉為當日經過的奈秒數。"""
+    t = pd.to_datetime(value).time()
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000_000
+
+
+@dataclass
+class SessionCalendar:
+    """
+    交易時段設定 (預設為台指期日盤 08:45–13:45、夜盤 15:00–隔日 05:00)。
+
+    所有時段皆為左閉右開區間；夜盤的結束時間若小於開始時間，視為跨日。
+    夜盤的交易日 (trading_day) 以「開盤當天」的日期計算，與 process_time_series 的慣例相同。
+
+    Attributes:
+        day_start / day_end: 日盤開收盤時間。
+        night_start / night_end: 夜盤開收盤時間。
+        holidays: 休市日期；該日期開盤的日盤與夜盤都會被視為非交易時段。
+    """
+    day_start: str = '08:45'
+    day_end: str = '13:45'
+    night_start: str = '15:00'
+    night_end: str = '05:00'
+    holidays: Iterable = field(default_factory=tuple)
+
+    def bounds_ns(self) -> tuple:
+        """回傳 (day_start, day_end, night_start, night_end) 的當日奈秒偏移量。"""
+        return (_parse_hhmm(self.day_start), _parse_hhmm(self.day_end),
+                _parse_hhmm(self.night_start), _parse_hhmm(self.night_end))
+
+    def holiday_days(self) -> np.ndarray:
+        """回傳休市日期 (以 1970-01-01 起算的日數, int64)。"""
+        if not self.holidays:
+            return np.empty(0, dtype=np.int64)
+        days = pd.to_datetime(list(self.holidays)).normalize()
+        return (days.as_unit('ns').asi8 // NS_PER_DAY).astype(np.int64)
+
+
+TAIFEX_CALENDAR = SessionCalendar()
+
+
+def index_to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    將 DatetimeIndex 轉為以「當地牆上時間」表示的 int64 奈秒陣列。
+
+    有時區的索引會先去除時區 (保留當地時間)，確保 08:45 等時段邊界以交易所時間判斷。
+    """
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+@instrument()
+def classify_sessions(
+    ts_ns: np.ndarray,
+    calendar: SessionCalendar = TAIFEX_CALENDAR,
+    require_session_open: bool = True
+) -> tuple:
+    """
+    以單次向量化運算，將每筆 Tick 分類為日盤、夜盤 (含跨午夜部分) 或非交易時段。
+
+    Args:
+        ts_ns: int64 奈秒時間戳 (當地時間)，不需排序。
+        calendar: 交易時段設定。
+        require_session_open: 若為 True，午夜後的夜盤 Tick 只有在其開盤日 (前一日)
+            本身也出現在資料中時才保留。這與舊版 process_time_series 的逐日迴圈行為一致，
+            例如月檔第一天 00:00–05:00 屬於上個月最後一個夜盤的資料會被排除。
+
+    Returns:
+        (session, trading_day)：
+        session 為 int8 陣列 (SESSION_OUTSIDE / SESSION_DAY / SESSION_NIGHT)；
+        trading_day 為 int64 陣列，表示所屬交易日 (以 1970-01-01 起算的日數)。
+    """
+    ts_ns = np.asarray(ts_ns, dtype=np.int64)
+    day_start, day_end, night_start, night_end = calendar.bounds_ns()
+
+    day_number = ts_ns // NS_PER_DAY
+    time_of_day = ts_ns - day_number * NS_PER_DAY
+
+    is_day = (time_of_day >= day_start) & (time_of_day < day_end)
+    if night_end > night_start:
+        is_night_evening = (time_of_day >= night_start) & (time_of_day < night_end)
+        is_night_morning = np.zeros(len(ts_ns), dtype=bool)
+    else:
+        is_night_evening = time_of_day >= night_start
+        is_night_morning = time_of_day < night_end
+
+    trading_day = day_number - is_night_morning
+    if require_session_open and is_night_morning.any():
+        present_days = np.unique(day_number)
+        is_night_morning &= np.isin(trading_day, present_days)
+
+    session = np.zeros(len(ts_ns), dtype=np.int8)
+    session[is_day] = SESSION_DAY
+    session[is_night_evening | is_night_morning] = SESSION_NIGHT
+
+    holiday_days = calendar.holiday_days()
+    if len(holiday_days):
+        session[np.isin(trading_day, holiday_days)] = SESSION_OUTSIDE
+
+    return session, trading_day
+
+
+def session_ids(session: np.ndarray, trading_day: np.ndarray) -> np.ndarray:
+    """
+    組合交易日與時段為單一 int64 session_id (trading_day * 2 + 是否為夜盤)。
+
+    同一交易日的日盤先於夜盤，因此 session_id 的排序即為時間順序；非交易時段為 -1。
+    """
+    ids = trading_day.astype(np.int64) * 2 + (session == SESSION_NIGHT)
+    ids[session == SESSION_OUTSIDE] = -1
+    return ids
+
+
+def session_bounds_ns(session_id, calendar: SessionCalendar = TAIFEX_CALENDAR) -> tuple:
+    """
+    回傳 session_id 對應時段的 [開盤, 收盤) 奈秒時間 (可接受純量或陣列)。
+    """
+    session_id = np.asarray(session_id, dtype=np.int64)
+    day_start, day_end, night_start, night_end = calendar.bounds_ns()
+    trading_day = session_id // 2
+    is_night = (session_id % 2) == 1
+    base = trading_day * NS_PER_DAY
+    start = base + np.where(is_night, night_start, day_start)
+    night_close = night_end + (NS_PER_DAY if night_end <= night_start else 0)
+    end = base + np.where(is_night, night_close, day_end)
+    return start, end
+
+
+def missing_sessions(session_id) -> np.ndarray:
+    """
+    找出資料期間內沒有任何成交的交易時段 (e.g., 休市日)，以單次集合運算完成。
+
+    預期的時段為第一個到最後一個時段之間，週一至週五的日盤與夜盤；時段的起訖時間見 session_bounds_ns。
+
+    Args:
+        session_id: 資料的 session_id (不需排序，-1 會被忽略)。
+
+    Returns:
+        依時間排序的 int64 session_id 陣列。
+    """
+    observed = np.unique(np.asarray(session_id, dtype=np.int64))
+    observed = observed[observed >= 0]
+    if len(observed) == 0:
+        return observed
+    days = np.arange(observed[0] // 2, observed[-1] // 2 + 1, dtype=np.int64)
+    # 1970-01-01 為週四，(day + 3) % 7 < 5 即週一至週五
+    days = days[(days + 3) % 7 < 5]
+    expected = (days[:, None] * 2 + np.array([0, 1])).ravel()
+    expected = expected[(expected >= observed[0]) & (expected <= observed[-1])]
+    return np.setdiff1d(expected, observed, assume_unique=True)
+
+
+@instrument()
+def filter_sessions(
+    df: pd.DataFrame,
+    calendar: SessionCalendar = TAIFEX_CALENDAR,
+    require_session_open: bool = True
+) -> pd.DataFrame:
+    """
+    保留交易時段內的資料，並新增 'session'、'trading_day'、'session_id' 欄位。
+
+    Args:
+        df: 索引為 DatetimeIndex 的 DataFrame。
+        calendar: 交易時段設定。
+        require_session_open: 見 classify_sessions。
+
+    Returns:
+        篩選後依時間排序的 DataFrame。
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("Index 必須是 DatetimeIndex")
+
+    session, trading_day = classify_sessions(index_to_ns(df.index), calendar, require_session_open)
+    keep = session != SESSION_OUTSIDE
+
+    result = df.loc[keep].copy()
+    result['session'] = session[keep]
+    result['trading_day'] = trading_day[keep].astype('datetime64[D]').astype('datetime64[ns]')
+    result['session_id'] = session_ids(session[keep], trading_day[keep])
+    if not result.index.is_monotonic_increasing:
+        result = result.sort_index(kind='stable')
+    return result